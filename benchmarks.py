@@ -0,0 +1,413 @@
+# -*- coding: utf-8 -*-
+"""Замеры производительности: создание поля, расстановка мин, соседи ячеек, открытие ячеек,
+проверка победы, отрисовка, запуск игры и общая партия по сети.
+
+Пример запуска:
+    python benchmarks.py --repeat 5
+    python benchmarks.py --boards 1m 16m --benchmarks field plant flood --json
+    xvfb-run python benchmarks.py --benchmarks render
+
+Каждый замер выполняется repeat раз на полях с seed, seed + 1, ..., подготовка (создание поля,
+расстановка мин) в замер не входит. Результаты можно сохранить как опорные (--save-baseline)
+и сравнивать с ними следующие запуски (--baseline): если какой-то замер медленнее опорного больше,
+чем на --tolerance, программа завершается с кодом 1.
+Отрисовка на холсте и время до первого кадра окна замеряются только при наличии дисплея
+(например, виртуального Xvfb), иначе замеры пропускаются. Запуск замеряется в отдельных процессах
+интерпретатора: импорт модуля игры (python -X importtime) и время от запуска процесса до первого кадра окна.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+from entities import Field, GameEngine, Move, Start
+from renderer import BitmapRenderer, Renderer, render_bitmap
+from server import Client, GameServer, Role
+
+# Размеры полей: ширина, высота, количество мин
+BOARDS = {
+    'beginner': (9, 9, 10),
+    'expert': (30, 16, 99),
+    '10k': (100, 100, 2000),
+    '1m': (1000, 1000, 200000),
+    '16m': (4000, 4000, 3200000),
+}
+
+# Замеряемые способы расстановки мин
+STARTS = {
+    'safe': Start.SAFE,
+    'no-guess': Start.NO_GUESS,
+}
+
+CALLS = 10000  # Количество вызовов в одном замере быстрых операций (соседи ячейки, проверка победы)
+VIEW_SIZE = 640  # Размер видимой области в пикселях при замере отрисовки
+SERVER_SPECTATORS = 200  # Зрителей в замере общей партии
+SERVER_MOVES = 2000  # Ходов в замере общей партии, каждый отдельным сообщением
+SERVER_MAX_CELLS = 10000  # Поля больше этого замер общей партии пропускает: копия поля у каждого зрителя
+GAME_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'minesweeper.py')
+
+
+def measure(setup, run, repeat, seed=0):
+    """Замерить время выполнения
+    :param setup: callable - подготовка, получает seed, возвращает данные для run. В замер не входит
+    :param run: callable - замеряемое действие, получает результат setup
+    :param repeat: int - количество замеров, у замера i seed + i
+    :param seed: int - seed первого замера
+    :return: dict - среднее, минимальное и максимальное время одного замера в секундах
+    """
+    times = []
+    for n in range(repeat):
+        data = setup(seed + n)
+        started = time.perf_counter()
+        run(data)
+        times.append(time.perf_counter() - started)
+    return summarize(times)
+
+
+def summarize(times):
+    """
+    :param times: list of float - время замеров в секундах
+    :return: dict - среднее, минимальное и максимальное время
+    """
+    return {
+        'mean': sum(times) / len(times),
+        'min': min(times),
+        'max': max(times),
+    }
+
+
+def create_engine(width, height, bombs, seed):
+    """Создать партию и заложить мины вокруг первого хода в центр поля
+    :return: GameEngine
+    """
+    engine = GameEngine(width=width, height=height, bombs=bombs, seed=seed, start=Start.SAFE)
+    engine.plant_bombs(width // 2, height // 2)
+    return engine
+
+
+def benchmark_generation(width, height, bombs, start, repeat, seed=0):
+    """Замерить время расстановки мин при первом ходе в центр поля
+    :param width: int - ширина поля
+    :param height: int - высота поля
+    :param bombs: int - количество мин
+    :param start: int - способ расстановки мин (Start)
+    :param repeat: int - количество полей, у поля i seed + i
+    :param seed: int - seed первого поля
+    :return: dict - среднее, минимальное и максимальное время генерации одного поля в секундах
+    """
+    return measure(lambda n: GameEngine(width=width, height=height, bombs=bombs, seed=n, start=start),
+                   lambda engine: engine.plant_bombs(width // 2, height // 2), repeat, seed)
+
+
+def benchmark_field(width, height, bombs, repeat, seed=0):
+    """Замерить создание пустого поля"""
+    return measure(lambda n: None, lambda data: Field(width=width, height=height), repeat, seed)
+
+
+def benchmark_plant(width, height, bombs, repeat, seed=0):
+    """Замерить Field.plant_random_bombs"""
+    return measure(lambda n: (Field(width=width, height=height), n),
+                   lambda data: data[0].plant_random_bombs(bombs=bombs, seed=data[1]), repeat, seed)
+
+
+def benchmark_adjacent(width, height, bombs, repeat, seed=0):
+    """Замерить CALLS вызовов Field.get_adjacent_cells для случайных ячеек"""
+    field = Field(width=width, height=height)
+
+    def setup(n):
+        rnd = random.Random(n)
+        return [(rnd.randrange(width), rnd.randrange(height)) for _ in range(CALLS)]
+
+    def run(cells):
+        get_adjacent_cells = field.get_adjacent_cells
+        for x, y in cells:
+            get_adjacent_cells(x, y)
+
+    return measure(setup, run, repeat, seed)
+
+
+def benchmark_reveal(width, height, bombs, repeat, seed=0):
+    """Замерить ход игрока: открытие ячейки в центре поля вместе с пустой областью и проверкой исхода"""
+    return measure(lambda n: create_engine(width, height, bombs, n),
+                   lambda engine: engine.reveal(width // 2, height // 2), repeat, seed)
+
+
+def benchmark_flood(width, height, bombs, repeat, seed=0):
+    """Замерить худший случай открытия: заливка всего поля без мин"""
+    return measure(lambda n: Field(width=width, height=height), lambda field: field.reveal(0, 0), repeat, seed)
+
+
+def benchmark_is_win(width, height, bombs, repeat, seed=0):
+    """Замерить CALLS проверок победы на поле после первого хода"""
+    def setup(n):
+        engine = create_engine(width, height, bombs, n)
+        engine.reveal(width // 2, height // 2)
+        return engine.field
+
+    def run(field):
+        is_win = field.is_win
+        for _ in range(CALLS):
+            is_win()
+
+    return measure(setup, run, repeat, seed)
+
+
+def benchmark_bitmap(width, height, bombs, repeat, seed=0):
+    """Замерить отрисовку видимой области поля картинкой (render_bitmap) по пикселю на ячейку"""
+    view = (0, 0, min(width, VIEW_SIZE), min(height, VIEW_SIZE))
+
+    def setup(n):
+        engine = create_engine(width, height, bombs, n)
+        engine.reveal(width // 2, height // 2)
+        return engine.field
+
+    return measure(setup, lambda field: render_bitmap(field, view, 1), repeat, seed)
+
+
+def benchmark_render(width, height, bombs, repeat, seed=0, renderer_class=Renderer):
+    """Замерить отрисовку на холсте Tk: новое поле и перерисовку после первого хода.
+    Нужен дисплей, без него замер пропускается
+    :param renderer_class: type - отрисовщик (Renderer или BitmapRenderer)
+    :return: dict - результат замера или None, если дисплея нет
+    """
+    try:
+        import Tkinter
+    except ImportError:
+        import tkinter as Tkinter
+    try:
+        root = Tkinter.Tk()
+    except Tkinter.TclError:
+        return None
+    try:
+        canvas = Tkinter.Canvas(root, width=VIEW_SIZE, height=VIEW_SIZE)
+        canvas.pack()
+        root.update()
+        renderer = renderer_class(canvas, max(renderer_class.MIN_CELL_SIZE, VIEW_SIZE // max(width, height)))
+
+        def run(engine):
+            renderer.reset(engine.field)
+            renderer.mark_dirty(engine.reveal(width // 2, height // 2))
+            renderer.flush()
+            root.update()  # Дождаться, пока Tk нарисует холст
+
+        return measure(lambda n: create_engine(width, height, bombs, n), run, repeat, seed)
+    finally:
+        root.destroy()
+
+
+def benchmark_render_bitmap(width, height, bombs, repeat, seed=0):
+    """Замерить отрисовку на холсте Tk картинкой (BitmapRenderer), как рисуются большие поля.
+    Нужен дисплей, без него замер пропускается
+    :return: dict - результат замера или None, если дисплея нет
+    """
+    return benchmark_render(width, height, bombs, repeat, seed, renderer_class=BitmapRenderer)
+
+
+def benchmark_import(width, height, bombs, repeat, seed=0):
+    """Замерить импорт модуля игры по python -X importtime в новом процессе. От поля не зависит
+    :return: dict - результат замера или None, если замер не удался
+    """
+    times = []
+    for _ in range(repeat):
+        process = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import minesweeper'],
+                                 cwd=os.path.dirname(GAME_SCRIPT), stdout=subprocess.DEVNULL,
+                                 stderr=subprocess.PIPE, universal_newlines=True)
+        # Строки вида "import time: собственное | суммарное | модуль", время в микросекундах
+        lines = [line.split('|') for line in process.stderr.splitlines() if line.startswith('import time:')]
+        total = [int(parts[1]) for parts in lines if len(parts) == 3 and parts[2].strip() == 'minesweeper']
+        if process.returncode or not total:
+            return None
+        times.append(total[0] / 1e6)
+    return summarize(times)
+
+
+def benchmark_startup(width, height, bombs, repeat, seed=0):
+    """Замерить время от запуска процесса игры до первого кадра окна.
+    Нужен дисплей, без него замер пропускается
+    :return: dict - результат замера или None, если окно не открылось
+    """
+    command = [sys.executable, GAME_SCRIPT, '--width', str(width), '--height', str(height), '--bombs', str(bombs),
+               '--first-frame']
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        process = subprocess.Popen(command, cwd=os.path.dirname(GAME_SCRIPT), stdout=subprocess.PIPE,
+                                   stderr=subprocess.DEVNULL, universal_newlines=True)
+        line = process.stdout.readline()  # Игра выводит строку сразу после первого кадра
+        times.append(time.perf_counter() - started)
+        process.stdout.close()
+        if process.wait() or not line:
+            return None
+    return summarize(times)
+
+
+def benchmark_server(width, height, bombs, repeat, seed=0):
+    """Замерить общую партию по сети: игрок отправляет SERVER_MOVES ходов по одному в сообщении,
+    SERVER_SPECTATORS зрителей получают изменения. Сервер и все клиенты работают в одном процессе
+    через loopback, поэтому в замер входит и работа клиентов. Ходов в секунду - SERVER_MOVES / время
+    :return: dict - время от первого хода до применения сервером последнего или None для больших полей
+    """
+    if width * height > SERVER_MAX_CELLS:
+        return None
+    return summarize([asyncio.run(_play_server_game(width, height, bombs, seed + n)) for n in range(repeat)])
+
+
+async def _play_server_game(width, height, bombs, seed):
+    """Сыграть общую партию для benchmark_server
+    :return: float - время от первого хода до применения сервером последнего в секундах
+    """
+    async def follow(client):
+        while await client.receive() is not None:
+            pass
+
+    game_server = GameServer(GameEngine(width=width, height=height, bombs=bombs, seed=seed, start=Start.SAFE))
+    port = await game_server.start()
+    spectators = [await Client.connect('127.0.0.1', port, Role.SPECTATOR) for _ in range(SERVER_SPECTATORS)]
+    followers = [asyncio.ensure_future(follow(client)) for client in spectators]
+    player = await Client.connect('127.0.0.1', port)
+    rnd = random.Random(seed)
+    started = time.perf_counter()
+    for _ in range(SERVER_MOVES):
+        player.send_moves([(Move.FLAG, rnd.randrange(width), rnd.randrange(height))])
+        await player.writer.drain()
+        await asyncio.sleep(0)  # Ходы приходят серверу по одному, а не пачкой после цикла
+    while game_server.received < SERVER_MOVES:
+        await asyncio.sleep(0.001)
+    elapsed = time.perf_counter() - started
+    await player.close()
+    await game_server.close()
+    await asyncio.gather(*followers)
+    for client in spectators:
+        await client.close()
+    return elapsed
+
+
+# Замеры, не зависящие от размера поля: выполняются один раз, а не для каждого поля
+BOARDLESS = {'import'}
+
+# Замеры по названию: функция (ширина, высота, количество мин, repeat, seed) -> результат
+BENCHMARKS = {
+    'field': benchmark_field,
+    'plant': benchmark_plant,
+    'adjacent': benchmark_adjacent,
+    'reveal': benchmark_reveal,
+    'flood': benchmark_flood,
+    'is-win': benchmark_is_win,
+    'bitmap': benchmark_bitmap,
+    'render': benchmark_render,
+    'render-bitmap': benchmark_render_bitmap,
+    'import': benchmark_import,
+    'startup': benchmark_startup,
+    'server': benchmark_server,
+}
+
+
+def machine_info():
+    """Описание машины, на которой получены результаты. Сохраняется вместе с опорными результатами:
+    сравнивать имеет смысл только замеры с одной машины
+    :return: dict
+    """
+    return {
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpus': os.cpu_count(),
+        'python': platform.python_version(),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Сравнить результаты с опорными. Сравнивается минимальное время, оно меньше всего зависит от помех
+    :param results: dict - результаты замеров по названиям
+    :param baseline: dict - опорные результаты по названиям
+    :param tolerance: float - допустимое замедление, доля от опорного времени
+    :return: dict - отношение времени к опорному для замеров, которые медленнее допустимого
+    """
+    regressions = {}
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result['min'] / baseline[name]['min'] if baseline[name]['min'] else 1.0
+        if ratio > 1 + tolerance:
+            regressions[name] = ratio
+    return regressions
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Замеры производительности сапёра")
+    parser.add_argument('--boards', nargs='+', choices=sorted(BOARDS), default=['beginner', 'expert', '10k'],
+                        help="размеры полей")
+    parser.add_argument('--benchmarks', nargs='+', choices=sorted(BENCHMARKS) + ['generate'],
+                        default=['generate'] + sorted(BENCHMARKS), help="замеры")
+    parser.add_argument('--starts', nargs='+', choices=sorted(STARTS), default=['safe', 'no-guess'],
+                        help="способы расстановки мин в замере generate")
+    parser.add_argument('--repeat', type=int, default=5, help="количество замеров каждого вида")
+    parser.add_argument('--seed', type=int, default=0, help="seed первого замера")
+    parser.add_argument('--json', action='store_true', help="вывести результат в формате JSON")
+    parser.add_argument('--baseline', help="файл с опорными результатами для сравнения")
+    parser.add_argument('--save-baseline', help="сохранить результаты как опорные в файл")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="допустимое замедление относительно опорных результатов (0.25 - на 25%%)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = {}
+    skipped = []
+
+    def report(name, result):
+        if result is None:
+            skipped.append(name)
+        else:
+            results[name] = result
+        if not args.json:
+            if result is None:
+                print("{:<28} пропущен".format(name))
+            else:
+                print("{:<28} {mean:8.4f} с (мин. {min:.4f}, макс. {max:.4f})".format(name, **result))
+
+    for number, board in enumerate(args.boards):
+        width, height, bombs = BOARDS[board]
+        for benchmark in args.benchmarks:
+            if benchmark in BOARDLESS:
+                if not number:
+                    report(benchmark, BENCHMARKS[benchmark](width, height, bombs, args.repeat, args.seed))
+            elif benchmark == 'generate':
+                for start in args.starts:
+                    if start == 'no-guess' and width * height > 10000:
+                        continue  # Поля без угадывания таких размеров генерируются слишком долго
+                    name = 'generate/{}/{}'.format(board, start)
+                    report(name, benchmark_generation(width, height, bombs, STARTS[start], args.repeat, args.seed))
+            else:
+                name = '{}/{}'.format(benchmark, board)
+                report(name, BENCHMARKS[benchmark](width, height, bombs, args.repeat, args.seed))
+
+    regressions = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if 'results' not in baseline:  # Опорные результаты без описания машины
+            baseline = {'machine': None, 'results': baseline}
+        if baseline['machine'] != machine_info():
+            sys.stderr.write("Опорные результаты получены на другой машине: {}\n".format(baseline['machine']))
+        regressions = compare(results, baseline['results'], args.tolerance)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({'machine': machine_info(), 'results': results}, f, indent=2, sort_keys=True)
+
+    if args.json:
+        print(json.dumps({'results': results, 'skipped': skipped, 'regressions': regressions}, sort_keys=True))
+    else:
+        for name, ratio in sorted(regressions.items()):
+            print("Замедление {}: в {:.2f} раза медленнее опорного".format(name, ratio))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
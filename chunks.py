@@ -0,0 +1,336 @@
+# -*- coding: utf-8 -*-
+"""Бесконечное (или очень большое) поле из кусков.
+
+Поле делится на квадратные куски CHUNK_SIZE x CHUNK_SIZE. Мины куска определяются только seed поля
+и координатами куска, поэтому кусок создаётся, когда его ячейки открывают или показывают, и может
+быть в любой момент выброшен и создан заново. Значения ячеек (количество соседних мин) считаются по
+маскам мин самого куска и восьми соседних, поэтому на границах кусков они согласованы.
+
+Загруженные куски хранятся в LRU-кэше ограниченного размера. Куски, в которых игрок что-то изменил
+(открыл ячейки, поставил флаги), при вытеснении из кэша сохраняются на диск и загружаются оттуда
+при следующем обращении. Хранятся только состояния ячеек, значения всегда считаются заново.
+"""
+import os
+import random
+import shutil
+import tempfile
+from collections import OrderedDict
+
+from entities import State
+
+CHUNK_SIZE = 64
+# На бесконечном поле с малой плотностью мин пустые области могут не кончаться, и заливка никогда
+# не остановится. При такой плотности пустые ячейки (без мин вокруг) не образуют бесконечных областей
+MIN_INFINITE_DENSITY = 0.15
+
+_MINE_VALUE = 0xFF  # Значение ячейки с миной в байтах куска (-1 со знаком)
+
+
+class Chunk(object):
+    """Загруженный кусок поля"""
+
+    def __init__(self, states, values, modified=False):
+        """
+        :param states: bytearray - состояния ячеек по строкам (State), ячейки вне поля - State.BORDER
+        :param values: bytes - значения ячеек по строкам, мина - _MINE_VALUE
+        :param modified: bool - отличаются ли состояния от только что созданного куска
+        """
+        self.states = states
+        self.values = values
+        self.modified = modified
+
+
+class ChunkedField(object):
+    """Поле из кусков, создаваемых по seed.
+    Ячейки адресуются координатами (x, y), на бесконечном поле они могут быть отрицательными
+    """
+
+    def __init__(self, seed, density=0.2, width=None, height=None, safe=None, cache_size=256, spill_dir=None):
+        """
+        :param seed: int - seed поля, по нему и координатам куска создаются мины куска
+        :param density: float - доля ячеек с минами
+        :param width: int - ширина поля или None для бесконечного поля
+        :param height: int - высота поля или None для бесконечного поля
+        :param safe: tuple of int - ячейка первого хода: в ней и её соседях мин нет
+        :param cache_size: int - наибольшее количество загруженных кусков
+        :param spill_dir: str - каталог для изменённых кусков, по умолчанию временный (удаляется в close)
+        """
+        if (width is None or height is None) and density < MIN_INFINITE_DENSITY:
+            raise ValueError("Плотность мин бесконечного поля должна быть не меньше %s" % MIN_INFINITE_DENSITY)
+        assert 0 <= density < 1, "Плотность мин должна быть от 0 до 1"
+        assert cache_size >= 1, "В кэше должен помещаться хотя бы один кусок"
+        self.seed = seed
+        self.density = density
+        self.width = width
+        self.height = height
+        self.safe = safe
+        self.cache_size = cache_size
+        self._own_spill_dir = spill_dir is None
+        self.spill_dir = tempfile.mkdtemp(prefix='minesweeper-') if spill_dir is None else spill_dir
+        self._chunks = OrderedDict()  # (cx, cy) -> Chunk, в порядке последнего обращения
+        self._mines = OrderedDict()  # (cx, cy) -> маска мин куска, кэш для подсчёта значений соседей
+        self._spilled = set()  # Куски, сохранённые на диск
+        self._opened = 0  # Открыто ячеек (вместе с открытыми минами)
+        self._exploded = 0  # Открыто ячеек с минами
+        self._flags = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Удалить временный каталог с сохранёнными кусками"""
+        if self._own_spill_dir:
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+        self._chunks.clear()
+        self._spilled.clear()
+
+    @property
+    def loaded_chunks(self):
+        """Количество загруженных кусков"""
+        return len(self._chunks)
+
+    @property
+    def spilled_chunks(self):
+        """Количество кусков, сохранённых на диск"""
+        return len(self._spilled)
+
+    def contains(self, x, y):
+        """Проверка, что ячейка принадлежит полю
+        :param x: int - координата по X
+        :param y: int - координата по Y
+        :return: bool
+        """
+        return (self.width is None or 0 <= x < self.width) and (self.height is None or 0 <= y < self.height)
+
+    def _chunk_bounds(self, cx, cy):
+        """Размер части куска, которая лежит в поле
+        :return: tuple of int - (ширина, высота), у куска за пределами поля нули
+        """
+        width = height = CHUNK_SIZE
+        if self.width is not None:
+            width = max(0, min(CHUNK_SIZE, self.width - cx * CHUNK_SIZE))
+        if self.height is not None:
+            height = max(0, min(CHUNK_SIZE, self.height - cy * CHUNK_SIZE))
+        if cx < 0 and self.width is not None or cy < 0 and self.height is not None:
+            return 0, 0
+        return width, height
+
+    def _get_mines(self, cx, cy):
+        """Маска мин куска: по байту на ячейку, 1 - мина. Зависит только от seed и координат куска
+        :return: bytes
+        """
+        key = (cx, cy)
+        mask = self._mines.get(key)
+        if mask is not None:
+            self._mines.move_to_end(key)
+            return mask
+        width, height = self._chunk_bounds(cx, cy)
+        mines = bytearray(CHUNK_SIZE * CHUNK_SIZE)
+        if width and height:
+            rnd = random.Random('{}:{}:{}'.format(self.seed, cx, cy))  # Строковый seed воспроизводим всегда
+            for position in rnd.sample(range(width * height), int(round(width * height * self.density))):
+                mines[position // width * CHUNK_SIZE + position % width] = 1
+            if self.safe is not None:
+                safe_x, safe_y = self.safe
+                for y in range(safe_y - 1, safe_y + 2):
+                    for x in range(safe_x - 1, safe_x + 2):
+                        if (x // CHUNK_SIZE, y // CHUNK_SIZE) == key:
+                            mines[y % CHUNK_SIZE * CHUNK_SIZE + x % CHUNK_SIZE] = 0
+        mask = bytes(mines)
+        self._mines[key] = mask
+        if len(self._mines) > 4 * self.cache_size:  # Маски соседей нужны чаще самих кусков
+            self._mines.popitem(last=False)
+        return mask
+
+    def _create_values(self, cx, cy):
+        """Посчитать значения ячеек куска по маскам мин его и восьми соседних кусков.
+        Маски раскладываются в маску с рамкой в одну ячейку, количество соседних мин получается суммой
+        восьми её сдвигов в длинном целом (не больше 8 в байте, поэтому переносов между байтами нет)
+        :return: bytes - значения ячеек по строкам
+        """
+        size = CHUNK_SIZE
+        stride = size + 2
+        padded = bytearray(stride * stride)
+        # Для сдвига куска-соседа: строки или столбцы, которые попадают в рамку, и куда они кладутся
+        parts = {-1: (size - 1, size, 0), 0: (0, size, 1), 1: (0, 1, size + 1)}
+        for dy, (y0, y1, to_y) in parts.items():
+            for dx, (x0, x1, to_x) in parts.items():
+                mines = self._get_mines(cx + dx, cy + dy)
+                for row in range(y0, y1):
+                    start = (to_y + row - y0) * stride + to_x
+                    padded[start:start + x1 - x0] = mines[row * size + x0:row * size + x1]
+        # Строки куска вместе со столбцами рамки между ними (рамка потом отбрасывается), до последней ячейки куска:
+        # со сдвигом на нижнего правого соседа срез заканчивается ровно в конце маски с рамкой
+        length = (size - 1) * stride + size
+        counts = 0
+        for dy in (-1, 0, 1):
+            for dx in (-1, 0, 1):
+                if dx or dy:
+                    start = (1 + dy) * stride + 1 + dx
+                    counts += int.from_bytes(padded[start:start + length], 'big')
+        mines = int.from_bytes(padded[stride + 1:stride + 1 + length], 'big') * _MINE_VALUE
+        data = (counts | mines).to_bytes(length, 'big')
+        return b''.join(data[row * stride:row * stride + size] for row in range(size))
+
+    def _spill_path(self, key):
+        return os.path.join(self.spill_dir, '{}_{}.chunk'.format(*key))
+
+    def _get_chunk(self, cx, cy):
+        """Получить кусок: из кэша, с диска или создать по seed. Лишние куски вытесняются из кэша
+        :return: Chunk
+        """
+        key = (cx, cy)
+        chunk = self._chunks.get(key)
+        if chunk is not None:
+            self._chunks.move_to_end(key)
+            return chunk
+        values = self._create_values(cx, cy)
+        if key in self._spilled:
+            with open(self._spill_path(key), 'rb') as f:
+                chunk = Chunk(bytearray(f.read()), values, modified=True)
+        else:
+            width, height = self._chunk_bounds(cx, cy)
+            states = bytearray([State.BORDER]) * (CHUNK_SIZE * CHUNK_SIZE)
+            for row in range(height):
+                states[row * CHUNK_SIZE:row * CHUNK_SIZE + width] = bytes(width)
+            chunk = Chunk(states, values)
+        self._chunks[key] = chunk
+        while len(self._chunks) > self.cache_size:
+            self._evict()
+        return chunk
+
+    def _evict(self):
+        """Вытеснить кусок, к которому дольше всего не обращались. Изменённый кусок сохраняется на диск"""
+        key, chunk = self._chunks.popitem(last=False)
+        if chunk.modified:
+            with open(self._spill_path(key), 'wb') as f:
+                f.write(chunk.states)
+            self._spilled.add(key)
+
+    def get_state(self, x, y):
+        """Состояние ячейки (State), для ячеек вне поля State.BORDER"""
+        if not self.contains(x, y):
+            return State.BORDER
+        chunk = self._get_chunk(x // CHUNK_SIZE, y // CHUNK_SIZE)
+        return chunk.states[y % CHUNK_SIZE * CHUNK_SIZE + x % CHUNK_SIZE]
+
+    def get_value(self, x, y):
+        """Значение ячейки: количество соседних мин или -1, если в ячейке мина"""
+        value = self._get_chunk(x // CHUNK_SIZE, y // CHUNK_SIZE).values[y % CHUNK_SIZE * CHUNK_SIZE + x % CHUNK_SIZE]
+        return -1 if value == _MINE_VALUE else value
+
+    def _set_state(self, x, y, state):
+        chunk = self._get_chunk(x // CHUNK_SIZE, y // CHUNK_SIZE)
+        chunk.states[y % CHUNK_SIZE * CHUNK_SIZE + x % CHUNK_SIZE] = state
+        chunk.modified = True
+
+    def reveal(self, x, y):
+        """Открыть ячейку и пустую область вокруг неё, в том числе через границы кусков
+        :param x: int - координата по X
+        :param y: int - координата по Y
+        :return: list of tuple - координаты открытых ячеек
+        """
+        return self.reveal_cells([(x, y)])
+
+    def reveal_cells(self, cells):
+        """Открыть несколько ячеек одной заливкой. Заливка идёт по кускам: кусок берётся из кэша один раз,
+        область внутри него открывается по локальным номерам ячеек, а ячейки соседних кусков
+        откладываются до обработки этих кусков
+        :param cells: iterable of tuple - координаты ячеек
+        :return: list of tuple - координаты открытых ячеек
+        """
+        size = CHUNK_SIZE
+        pending = OrderedDict()  # (cx, cy) -> номера ячеек куска (y * CHUNK_SIZE + x), которые нужно открыть
+        for x, y in cells:
+            if self.contains(x, y):
+                pending.setdefault((x // size, y // size), []).append(y % size * size + x % size)
+        opened = []
+        while pending:
+            (cx, cy), stack = pending.popitem(last=False)
+            chunk = self._get_chunk(cx, cy)
+            states, values = chunk.states, chunk.values
+            left, top = cx * size, cy * size
+            while stack:
+                position = stack.pop()
+                if states[position] != State.CLOSE:
+                    continue
+                states[position] = State.OPEN
+                chunk.modified = True
+                y, x = divmod(position, size)
+                opened.append((left + x, top + y))
+                value = values[position]
+                if value == _MINE_VALUE:
+                    self._exploded += 1
+                if value != 0:
+                    continue
+                for ny in (y - 1, y, y + 1):
+                    for nx in (x - 1, x, x + 1):
+                        if 0 <= nx < size and 0 <= ny < size:
+                            if states[ny * size + nx] == State.CLOSE:
+                                stack.append(ny * size + nx)
+                        elif self.contains(left + nx, top + ny):
+                            key = ((left + nx) // size, (top + ny) // size)
+                            pending.setdefault(key, []).append(ny % size * size + nx % size)
+        self._opened += len(opened)
+        return opened
+
+    def toggle_flag(self, x, y):
+        """Поставить флаг на закрытую ячейку или снять его
+        :return: list of tuple - координаты изменившихся ячеек
+        """
+        state = self.get_state(x, y)
+        if state == State.CLOSE:
+            self._set_state(x, y, State.FLAG)
+            self._flags += 1
+        elif state == State.FLAG:
+            self._set_state(x, y, State.CLOSE)
+            self._flags -= 1
+        else:
+            return []
+        return [(x, y)]
+
+    def chord(self, x, y):
+        """Аккорд: открыть закрытых соседей открытого числа, вокруг которого стоит столько же флагов
+        :return: list of tuple - координаты открытых ячеек
+        """
+        if self.get_state(x, y) != State.OPEN or self.get_value(x, y) <= 0:
+            return []
+        adjacent = [(nx, ny) for ny in (y - 1, y, y + 1) for nx in (x - 1, x, x + 1) if (nx, ny) != (x, y)]
+        states = [self.get_state(nx, ny) for nx, ny in adjacent]
+        if states.count(State.FLAG) != self.get_value(x, y):
+            return []
+        return self.reveal_cells([cell for cell, state in zip(adjacent, states) if state == State.CLOSE])
+
+    def is_lose(self):
+        """Проверка поражения: открыта хотя бы одна ячейка с миной"""
+        return self._exploded > 0
+
+    def stats(self):
+        """
+        :return: dict - количество открытых ячеек без мин, открытых мин и флагов
+        """
+        return {'opened': self._opened - self._exploded, 'exploded': self._exploded, 'flags': self._flags}
+
+    def view(self, x0, y0, x1, y1):
+        """Получить прямоугольник поля для отрисовки. Куски, попавшие в него, создаются
+        :param x0: int - левая граница (входит)
+        :param y0: int - верхняя граница (входит)
+        :param x1: int - правая граница (не входит)
+        :param y1: int - нижняя граница (не входит)
+        :return: tuple of bytes - состояния и значения ячеек по строкам (значение мины - 0xFF)
+        """
+        states, values = [], []
+        for y in range(y0, y1):
+            cy, row = y // CHUNK_SIZE, y % CHUNK_SIZE * CHUNK_SIZE
+            x = x0
+            while x < x1:
+                end = min(x1, (x // CHUNK_SIZE + 1) * CHUNK_SIZE)
+                chunk = self._get_chunk(x // CHUNK_SIZE, cy)
+                start = row + x % CHUNK_SIZE
+                states.append(bytes(chunk.states[start:start + end - x]))
+                values.append(chunk.values[start:start + end - x])
+                x = end
+        return b''.join(states), b''.join(values)
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""Игра в терминале, без Tk.
+
+Поле выводится текстом, ходы читаются из стандартного ввода по одному в строке:
+    o X Y - открыть ячейку
+    f X Y - поставить или снять флаг
+    c X Y - аккорд: открыть соседей ячейки, если вокруг неё стоит нужное количество флагов
+    q - выйти
+
+На бесконечном поле (--infinite, chunks.ChunkedField) координаты могут быть отрицательными, ячейка (0, 0)
+и её соседи без мин. Выводится часть поля VIEW_WIDTH x VIEW_HEIGHT вокруг последнего хода.
+
+Пример запуска:
+    python minesweeper.py --console --preset expert
+    printf 'o 4 4\\nq\\n' | python minesweeper.py --console
+    python minesweeper.py --console --infinite --density 0.2
+
+Модуль не импортирует Tk, поэтому запускается без дисплея и быстрее окна игры.
+"""
+import random
+import sys
+
+from entities import GameEngine, Move, Start, State, Status
+
+# Символы ячеек: закрытая ячейка, флаг, пустая открытая ячейка, мина, цифра - количество мин рядом
+_CLOSED_CHAR_TABLE = bytes(ord('F') if b == State.FLAG else ord('#') for b in range(256))
+_OPEN_CHAR_TABLE = bytes(ord('*') if b == 0xFF else ord('.') if b == 0 else ord(str(b)) if b < 10 else ord('?')
+                         for b in range(256))
+# Байт 0xFF для открытых ячеек и для мин, 0 для остальных
+_OPEN_MASK_TABLE = bytes(0xFF if b == State.OPEN else 0 for b in range(256))
+_BOMB_MASK_TABLE = bytes(0xFF if b == 0xFF else 0 for b in range(256))
+
+VIEW_WIDTH = 60  # Размер выводимой части бесконечного поля
+VIEW_HEIGHT = 24
+
+COMMANDS = {
+    'o': Move.REVEAL,
+    'f': Move.FLAG,
+    'c': Move.CHORD,
+}
+
+
+def render_row(states, values, bombs_visible=False):
+    """Строка поля текстом. Собирается операциями над байтами, без цикла по ячейкам
+    :param states: bytes - состояния ячеек строки
+    :param values: bytes - значения ячеек строки, мина - 0xFF
+    :param bombs_visible: bool - показать мины в закрытых ячейках (после проигрыша)
+    :return: str
+    """
+    mask = int.from_bytes(states.translate(_OPEN_MASK_TABLE), 'big')
+    if bombs_visible:  # Мины показываются как открытые ячейки
+        mask |= int.from_bytes(values.translate(_BOMB_MASK_TABLE), 'big')
+    chars = ((int.from_bytes(values.translate(_OPEN_CHAR_TABLE), 'big') & mask) |
+             (int.from_bytes(states.translate(_CLOSED_CHAR_TABLE), 'big') & ~mask))
+    return chars.to_bytes(len(states), 'big').decode('ascii')
+
+
+def render_text(field, bombs_visible=False):
+    """Поле текстом
+    :param field: Field - поле
+    :param bombs_visible: bool - показать мины в закрытых ячейках (после проигрыша)
+    :return: str - строки поля
+    """
+    states, values, stride, width = field.states, field.values.tobytes(), field.stride, field.width
+    lines = []
+    for y in range(field.height):
+        row = (y + 1) * stride + 1
+        lines.append('{:>4} {}'.format(y, render_row(bytes(states[row:row + width]), values[row:row + width],
+                                                     bombs_visible)))
+    return '\n'.join(lines) + '\n'
+
+
+def render_view(field, x, y, bombs_visible=False):
+    """Часть бесконечного поля вокруг ячейки текстом
+    :param field: ChunkedField - поле
+    :param x: int - координата по X центра
+    :param y: int - координата по Y центра
+    :param bombs_visible: bool - показать мины в закрытых ячейках
+    :return: str - строки поля
+    """
+    x0, y0 = x - VIEW_WIDTH // 2, y - VIEW_HEIGHT // 2
+    states, values = field.view(x0, y0, x0 + VIEW_WIDTH, y0 + VIEW_HEIGHT)
+    lines = ['X от {} до {}'.format(x0, x0 + VIEW_WIDTH - 1)]
+    for n in range(VIEW_HEIGHT):
+        row = n * VIEW_WIDTH
+        lines.append('{:>4} {}'.format(y0 + n, render_row(states[row:row + VIEW_WIDTH], values[row:row + VIEW_WIDTH],
+                                                          bombs_visible)))
+    return '\n'.join(lines) + '\n'
+
+
+def parse_command(line):
+    """Разобрать ход
+    :param line: str - строка ввода
+    :return: tuple - (вид хода Move, x, y), None для выхода
+    :raise ValueError: если строка не ход
+    """
+    parts = line.split()
+    if parts and parts[0] == 'q':
+        return None
+    if len(parts) != 3 or parts[0] not in COMMANDS or not all(part.lstrip('-').isdigit() for part in parts[1:]):
+        raise ValueError("Ход: o X Y, f X Y, c X Y или q")
+    return COMMANDS[parts[0]], int(parts[1]), int(parts[2])
+
+
+def play(width, height, bombs, seed=None, stdin=None, stdout=None):
+    """Сыграть партию в терминале
+    :param width: int - ширина поля
+    :param height: int - высота поля
+    :param bombs: int - количество мин
+    :param seed: int - seed партии, по умолчанию случайный
+    :param stdin: file - откуда читать ходы, по умолчанию sys.stdin
+    :param stdout: file - куда выводить поле, по умолчанию sys.stdout
+    :return: int - исход партии (Status)
+    """
+    stdin = sys.stdin if stdin is None else stdin
+    stdout = sys.stdout if stdout is None else stdout
+    seed = random.randrange(2 ** 32) if seed is None else seed
+    engine = GameEngine(width=width, height=height, bombs=bombs, seed=seed, start=Start.SAFE)
+    moves = {
+        Move.REVEAL: engine.reveal,
+        Move.FLAG: engine.toggle_flag,
+        Move.CHORD: engine.chord,
+    }
+    stdout.write(render_text(engine.field))
+    stdout.flush()
+    for line in stdin:
+        try:
+            command = parse_command(line)
+        except ValueError as e:
+            stdout.write('{}\n'.format(e))
+            continue
+        if command is None:
+            break
+        move, x, y = command
+        if not (0 <= x < width and 0 <= y < height):
+            stdout.write("Ячейка за пределами поля\n")
+            continue
+        moves[move](x, y)
+        stdout.write(render_text(engine.field, bombs_visible=engine.status == Status.LOSE))
+        if engine.is_over():
+            stdout.write("Победа!\n" if engine.status == Status.WIN else "Поражение\n")
+            break
+        stdout.flush()
+    stdout.flush()
+    return engine.status
+
+
+def play_infinite(seed=None, density=0.2, stdin=None, stdout=None):
+    """Сыграть на бесконечном поле в терминале. Партия идёт до первой открытой мины или до выхода
+    :param seed: int - seed поля, по умолчанию случайный
+    :param density: float - доля ячеек с минами
+    :param stdin: file - откуда читать ходы, по умолчанию sys.stdin
+    :param stdout: file - куда выводить поле, по умолчанию sys.stdout
+    :return: int - количество открытых ячеек
+    """
+    stdin = sys.stdin if stdin is None else stdin
+    stdout = sys.stdout if stdout is None else stdout
+    from chunks import ChunkedField  # Только для бесконечного поля
+    seed = random.randrange(2 ** 32) if seed is None else seed
+    with ChunkedField(seed, density=density, safe=(0, 0)) as field:
+        moves = {
+            Move.REVEAL: field.reveal,
+            Move.FLAG: field.toggle_flag,
+            Move.CHORD: field.chord,
+        }
+        stdout.write(render_view(field, 0, 0))
+        stdout.flush()
+        for line in stdin:
+            try:
+                command = parse_command(line)
+            except ValueError as e:
+                stdout.write('{}\n'.format(e))
+                continue
+            if command is None:
+                break
+            move, x, y = command
+            moves[move](x, y)
+            stdout.write(render_view(field, x, y, bombs_visible=field.is_lose()))
+            if field.is_lose():
+                stdout.write("Поражение\n")
+                break
+            stdout.flush()
+        opened = field.stats()['opened']
+        stdout.write("Открыто ячеек: {}\n".format(opened))
+        stdout.flush()
+        return opened
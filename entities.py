@@ -1,6 +1,21 @@
 # -*- coding: utf-8 -*-
 """Объекты игры - ячейка, поле"""
 import random
+import re
+from array import array
+from bisect import bisect_right
+from functools import lru_cache
+
+
+# Текущая версия генератора расстановки мин, см. Field.plant_random_bombs
+GENERATOR_VERSION = 2
+
+# Стандартные размеры полей: ширина, высота, количество мин
+PRESETS = {
+    'beginner': (9, 9, 10),
+    'intermediate': (16, 16, 40),
+    'expert': (30, 16, 99),
+}
 
 
 class Colors(object):
@@ -11,6 +26,9 @@ class Colors(object):
     OPENED_CELL_WITH_BOMB = '#ff5722'
     FLAG_POLYGON = '#d35400'
     FLAG_LINE = '#000000'
+    HINT = '#7ed6df'
+    # Цвета открытых ячеек по значению (0-8) при отрисовке поля картинкой, где цифры не помещаются
+    NUMBERS = ('#badc58', '#4b7bec', '#20bf6b', '#eb3b5a', '#3c40c6', '#a5442a', '#0fb9b1', '#2d3436', '#778ca3')
 
 
 class State(object):
@@ -18,20 +36,91 @@ class State(object):
     CLOSE = 0
     OPEN = 1
     FLAG = 2
+    BORDER = 3  # Служебное состояние ячеек рамки вокруг поля, игроку не видны
+
+
+# Если мин больше чем 1/8 от числа ячеек, значения соседей считаются сразу для всего поля
+_DENSE_PLANTING_RATIO = 8
+# Таблицы для bytes.translate: байт 1 в ячейках с миной и байт 0xFF в ячейках поля без рамки
+_BOMB_MASK_TABLE = bytes(1 if b == 0xFF else 0 for b in range(256))
+_INTERIOR_MASK_TABLE = bytes(0 if b == State.BORDER else 0xFF for b in range(256))
+# Таблицы для заливки: байт 1 для нулевых байтов и замена закрытого состояния на открытое
+_ZERO_MASK_TABLE = bytes(1 if b == 0 else 0 for b in range(256))
+_OPEN_CLOSED_TABLE = bytes(State.OPEN if b == State.CLOSE else b for b in range(256))
+_CLOSED_RUN_PATTERN = re.compile(re.escape(bytes([State.CLOSE])) + b'+')
+# Начиная с этого количества открытых ячеек заливка переключается на построчный алгоритм
+_SCANLINE_REVEAL_THRESHOLD = 4096
+# Таблицы для пересчёта счётчиков по буферам: байт 1 для открытых ячеек и для флагов
+_OPEN_MASK_TABLE = bytes(1 if b == State.OPEN else 0 for b in range(256))
+_FLAG_MASK_TABLE = bytes(1 if b == State.FLAG else 0 for b in range(256))
+# Символы значений ячеек для вывода поля: 'x' - мина, цифра - количество мин рядом
+_VALUE_CHAR_TABLE = bytes(ord('x') if b == 0xFF else ord(str(b)) if b < 10 else ord('?') for b in range(256))
+
+
+def _count_cells(values, states):
+    """Посчитать счётчики поля по байтам ячеек. Считается операциями над байтами, без цикла по ячейкам
+    :param values: bytes - значения ячеек, мина - 0xFF
+    :param states: bytes - состояния тех же ячеек
+    :return: tuple - (мины, открытые ячейки, открытые мины, флаги, флаги на минах)
+    """
+    bombs = values.count(b'\xff')
+    opened = states.count(State.OPEN)
+    flags = states.count(State.FLAG)
+    exploded = correct_flags = 0
+    if bombs and (opened or flags):
+        # Ячейки, где есть и мина, и открытие (флаг): пересечение масок в длинных целых по байту на ячейку
+        size = len(states)
+        bomb_mask = int.from_bytes(values.translate(_BOMB_MASK_TABLE), 'little')
+        opened_mask = int.from_bytes(states.translate(_OPEN_MASK_TABLE), 'little')
+        flag_mask = int.from_bytes(states.translate(_FLAG_MASK_TABLE), 'little')
+        exploded = (bomb_mask & opened_mask).to_bytes(size, 'little').count(1)
+        correct_flags = (bomb_mask & flag_mask).to_bytes(size, 'little').count(1)
+    return bombs, opened, exploded, flags, correct_flags
 
 
 class Cell(object):
-    """Класс ячейки игрового поля"""
+    """Класс ячейки игрового поля.
+    Ячейка не хранит данные сама - это лёгкое представление над буферами поля,
+    поэтому объекты ячеек создаются только по запросу и их не нужно держать в памяти.
+    """
+    __slots__ = ('_field', '_index')
 
-    def __init__(self, x, y):
+    def __init__(self, field, index):
         """Инициализация ячейки
-        :param x: int - координата ячейки по оси X
-        :param y: int - координата ячейки по оси Y
+        :param field: Field - поле, которому принадлежит ячейка
+        :param index: int - индекс ячейки в буферах поля
         """
-        self.x = x
-        self.y = y
-        self.value = 0  # Значение показывает количетсво бомб по соседству. -1 означает, что в ячейке бомба
-        self.state = State.CLOSE  # Состояние ячейки (закрыта, открыта, помечена флагом)
+        self._field = field
+        self._index = index
+
+    @property
+    def index(self):
+        """Индекс ячейки в буферах поля"""
+        return self._index
+
+    @property
+    def x(self):
+        """Координата ячейки по оси X"""
+        return self._index % self._field.stride - 1
+
+    @property
+    def y(self):
+        """Координата ячейки по оси Y"""
+        return self._index // self._field.stride - 1
+
+    @property
+    def value(self):
+        """Значение показывает количетсво бомб по соседству. -1 означает, что в ячейке бомба"""
+        return self._field._values[self._index]
+
+    @value.setter
+    def value(self, value):
+        self._field._set_value(self._index, value)
+
+    @property
+    def state(self):
+        """Состояние ячейки (закрыта, открыта, помечена флагом)"""
+        return self._field._states[self._index]
 
     def has_bomb(self):
         """Метод для проверки наличия бомбы в ячейке
@@ -52,15 +141,24 @@ class Cell(object):
 
     def set_flag(self):
         """Установить флаг"""
-        self.state = State.FLAG
+        self._field._set_state(self._index, State.FLAG)
 
     def remove_flag(self):
         """Снять флаг"""
-        self.state = State.CLOSE
+        self._field._set_state(self._index, State.CLOSE)
 
     def open(self):
         """Открыть ячейку"""
-        self.state = State.OPEN
+        self._field._set_state(self._index, State.OPEN)
+
+    def __eq__(self, other):
+        return isinstance(other, Cell) and self._field is other._field and self._index == other._index
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash((id(self._field), self._index))
 
     def __str__(self):
         return self.__repr__()
@@ -69,43 +167,237 @@ class Cell(object):
         return "<Cell x={} y={}>".format(self.x, self.y)
 
 
+@lru_cache(maxsize=None)
+def get_neighbor_offsets(stride):
+    """Построить таблицу смещений соседних ячеек для поля с рамкой.
+    Таблица строится один раз для каждой ширины поля и переиспользуется всеми полями этого размера
+    :param stride: int - длина строки буфера поля (ширина поля + 2 ячейки рамки)
+    :return: tuple of int - смещения индексов восьми соседних ячеек
+    """
+    return (-stride - 1, -stride, -stride + 1,
+            -1, 1,
+            stride - 1, stride, stride + 1)
+
+
 class Field(object):
-    def __init__(self, width=10, height=10):
-        """Метод инициализации игрового поля
+    def __init__(self, width=10, height=10, values=None, states=None):
+        """Метод инициализации игрового поля.
+        Значения и состояния ячеек хранятся в плоских типизированных буферах по одному байту на ячейку,
+        объекты Cell создаются только при обращении к ячейкам.
+        Поле окружено рамкой толщиной в одну ячейку с состоянием State.BORDER,
+        поэтому у любой ячейки поля ровно восемь соседей по постоянным смещениям индекса
+        и при обходе соседей не нужны проверки границ.
+        Поле может работать поверх готовых буферов (например, memoryview над файлом, открытым через mmap),
+        тогда они не копируются, а счётчики поля пересчитываются по ним.
         :param width: int - ширина поля
         :param height: int - высота поля
+        :param values: изменяемый буфер значений ячеек вместе с рамкой в формате 'b' (array или memoryview)
+        :param states: изменяемый буфер состояний ячеек вместе с рамкой в формате 'B' (bytearray или memoryview)
         """
         self.width = width
         self.height = height
-        # Список ячеек поля
-        self._cell_list = [Cell(x=n % self.width, y=int(n / self.width)) for n in range(self.height * self.width)]
+        self.stride = self.width + 2  # Длина строки буфера вместе с рамкой
+        size = self.stride * (self.height + 2)
+        self.neighbor_offsets = get_neighbor_offsets(self.stride)
+        # Счётчики состояния поля, обновляются при каждом изменении ячеек
+        self._bombs = 0  # Заложено мин
+        self._opened = 0  # Открыто ячеек (вместе с открытыми минами)
+        self._exploded = 0  # Открыто ячеек с минами
+        self._flags = 0  # Установлено флагов
+        self._correct_flags = 0  # Флагов на ячейках с минами
+        # Seed и версия генератора случайной расстановки мин, None - мины не расставлялись случайно
+        self.seed = None
+        self.generator = None
+        if values is not None and states is not None:
+            assert len(values) == size and len(states) == size, "Размер буферов не совпадает с размером поля"
+            self._values = values
+            self._states = states
+            self._recount()
+            return
+        self._values = array('b', bytes(size))  # Значения ячеек (-1 - бомба)
+        self._states = bytearray(size)  # Состояния ячеек (State.CLOSE == 0)
+        # Помечаем рамку: первую и последнюю строки, первый и последний столбцы
+        self._states[:self.stride] = bytes([State.BORDER]) * self.stride
+        self._states[-self.stride:] = bytes([State.BORDER]) * self.stride
+        self._states[::self.stride] = bytes([State.BORDER]) * (self.height + 2)
+        self._states[self.stride - 1::self.stride] = bytes([State.BORDER]) * (self.height + 2)
 
     def __str__(self):
-        s = '  ' + ''.join([str(n) for n in range(self.width)]) + '\n'
+        values, stride = self._values.tobytes(), self.stride
+        lines = ['  ' + ''.join([str(n) for n in range(self.width)])]
         for y in range(self.height):
-            s += str(y) + ' '
-            for x in range(self.width):
-                s += 'x' if self.get_cell(x, y).has_bomb() else str(self.get_cell(x, y).value)
-            s += '\n'
-        return s
+            row = (y + 1) * stride + 1
+            lines.append(str(y) + ' ' + values[row:row + self.width].translate(_VALUE_CHAR_TABLE).decode('ascii'))
+        return '\n'.join(lines) + '\n'
 
-    def get_cell(self, x, y):
-        """Получить ячейку по координатам
+    def _recount(self):
+        """Пересчитать счётчики поля по буферам"""
+        (self._bombs, self._opened, self._exploded, self._flags,
+         self._correct_flags) = _count_cells(self._values.tobytes(), bytes(self._states))
+
+    @property
+    def values(self):
+        """Буфер значений ячеек по индексам (вместе с рамкой). Только для чтения,
+        изменять ячейки нужно через методы поля и ячеек, чтобы не сбить счётчики
+        """
+        return self._values
+
+    @property
+    def states(self):
+        """Буфер состояний ячеек по индексам (вместе с рамкой). Только для чтения"""
+        return self._states
+
+    def _set_state(self, index, state):
+        """Изменить состояние ячейки с обновлением счётчиков поля
+        :param index: int - индекс ячейки
+        :param state: int - новое состояние ячейки
+        """
+        old_state = self._states[index]
+        if old_state == state:
+            return
+        has_bomb = self._values[index] == -1
+        if old_state == State.OPEN:
+            self._opened -= 1
+            self._exploded -= has_bomb
+        elif old_state == State.FLAG:
+            self._flags -= 1
+            self._correct_flags -= has_bomb
+        if state == State.OPEN:
+            self._opened += 1
+            self._exploded += has_bomb
+        elif state == State.FLAG:
+            self._flags += 1
+            self._correct_flags += has_bomb
+        self._states[index] = state
+
+    def _set_value(self, index, value):
+        """Изменить значение ячейки с обновлением счётчиков поля
+        :param index: int - индекс ячейки
+        :param value: int - новое значение ячейки (-1 - мина)
+        """
+        delta = (value == -1) - (self._values[index] == -1)
+        if delta:
+            self._bombs += delta
+            state = self._states[index]
+            if state == State.FLAG:
+                self._correct_flags += delta
+            elif state == State.OPEN:
+                self._exploded += delta
+        self._values[index] = value
+
+    def set_cells(self, indexes, states, values):
+        """Изменить состояния и значения ячеек с обновлением счётчиков.
+        Нужно копиям поля, которые получают изменения ячеек извне (например, клиенту сетевой партии).
+        Счётчики пересчитываются по старым и новым байтам изменённых ячеек, без проверок каждой ячейки
+        :param indexes: sequence of int - индексы ячеек, без повторов
+        :param states: bytes - новые состояния ячеек
+        :param values: bytes - новые значения ячеек, мина - 0xFF
+        """
+        cell_states, cell_values = self._states, memoryview(self._values).cast('B')
+        old = _count_cells(bytes(map(cell_values.__getitem__, indexes)), bytes(map(cell_states.__getitem__, indexes)))
+        new = _count_cells(values, states)
+        for index, state, value in zip(indexes, states, values):
+            cell_states[index] = state
+            cell_values[index] = value
+        cell_values.release()
+        self._bombs += new[0] - old[0]
+        self._opened += new[1] - old[1]
+        self._exploded += new[2] - old[2]
+        self._flags += new[3] - old[3]
+        self._correct_flags += new[4] - old[4]
+
+    def stats(self):
+        """Получить состояние поля. Значения берутся из счётчиков, поэтому метод работает за O(1)
+        :return: dict - словарь со счётчиками:
+            cells - количество ячеек поля,
+            bombs - количество мин,
+            opened - количество открытых ячеек без мин,
+            exploded - количество открытых ячеек с минами,
+            closed - количество неоткрытых ячеек (вместе с флагами),
+            flags - количество флагов,
+            correct_flags - количество флагов на минах,
+            wrong_flags - количество флагов на ячейках без мин
+        """
+        cells = self.width * self.height
+        return {
+            'cells': cells,
+            'bombs': self._bombs,
+            'opened': self._opened - self._exploded,
+            'exploded': self._exploded,
+            'closed': cells - self._opened,
+            'flags': self._flags,
+            'correct_flags': self._correct_flags,
+            'wrong_flags': self._flags - self._correct_flags,
+        }
+
+    def is_win(self):
+        """Проверка победы: на всех оставшихся закрытых ячейках стоят флажки и в каждой находится мина
+        :return: bool
+        """
+        return not self._exploded and self.width * self.height - self._opened == self._correct_flags
+
+    def is_lose(self):
+        """Проверка поражения: открыта хотя бы одна ячейка с миной
+        :return: bool
+        """
+        return self._exploded > 0
+
+    def get_index(self, x, y):
+        """Получить индекс ячейки в буферах поля по координатам
         :param x: int - координата ячейки по X
         :param y: int - координата ячейки по Y
-        :return: Cell - объект ячейки или None
+        :return: int - индекс ячейки
         """
         assert x >= 0, "X должен быть больше или равен 0"
         assert y >= 0, "Y должен быть больше или равен 0"
         assert x < self.width, "X должен быть меньше %s" % self.width
         assert y < self.height, "Y должен быть меньше %s" % self.height
-        return self._cell_list[y * self.width + x]
+        return (y + 1) * self.stride + x + 1
+
+    def get_coordinates(self, index):
+        """Получить координаты ячейки по её индексу в буферах поля
+        :param index: int - индекс ячейки
+        :return: tuple of int - координаты (x, y)
+        """
+        return index % self.stride - 1, index // self.stride - 1
+
+    def get_cell(self, x, y):
+        """Получить ячейку по координатам
+        :param x: int - координата ячейки по X
+        :param y: int - координата ячейки по Y
+        :return: Cell - объект ячейки или None
+        """
+        return Cell(self, self.get_index(x, y))
+
+    def get_cell_by_index(self, index):
+        """Получить ячейку по её индексу в буферах поля
+        :param index: int - индекс ячейки
+        :return: Cell - объект ячейки
+        """
+        return Cell(self, index)
+
+    def get_cells_indexes(self):
+        """Получить индексы всех ячеек поля (без рамки) в порядке обхода по строкам
+        :return: iterator of int - индексы ячеек
+        """
+        stride = self.stride
+        for row in range(stride + 1, stride * (self.height + 1), stride):
+            for index in range(row, row + self.width):
+                yield index
 
     def get_copy_cells_list(self):
         """Метод для получения копии списка всех ячеек
         :return: list of Cell - копия списка с объектами ячеек
         """
-        return self._cell_list[:]
+        return [Cell(self, index) for index in self.get_cells_indexes()]
+
+    def get_adjacent_indexes(self, index):
+        """Получить индексы соседних ячеек без ячеек рамки
+        :param index: int - индекс ячейки
+        :return: list of int - индексы соседних ячеек
+        """
+        states = self._states
+        return [index + offset for offset in self.neighbor_offsets if states[index + offset] != State.BORDER]
 
     def get_adjacent_cells(self, x, y):
         """Метод для получения соседних ячеек
@@ -113,18 +405,7 @@ class Field(object):
         :param y: int - координата по Y
         :return: list of Cell - список из объектов ячеек
         """
-        # Подготовить список из кортежей с координатами соседних ячеек
-        cells_coordinates = [{'y': j, 'x': i} for j in range(y - 1, y + 2) for i in range(x - 1, x + 2)]
-        # Убрать то, что находится за пределами игрового поля
-        cells_coordinates = filter(
-            lambda c: (self.height > c['x'] >= 0) and (self.width > c['y'] >= 0),
-            cells_coordinates)
-        # Убрать саму ячейку для которой найдены смежные ячейки
-        cells_coordinates = filter(
-            lambda c: not (c['x'] == x and c['y'] == y),
-            cells_coordinates)
-        cells = [self.get_cell(**coordinates) for coordinates in cells_coordinates]
-        return cells
+        return [Cell(self, index) for index in self.get_adjacent_indexes(self.get_index(x, y))]
 
     def get_adjacent_closed_cells(self, x, y):
         """Метод получения соседних закрытых ячеек
@@ -132,32 +413,391 @@ class Field(object):
         :param y: int - координата y
         :return: list of Cell - список из объектов класса ячейки
         """
-        cells = filter(lambda c: c.state is State.CLOSE, self.get_adjacent_cells(x, y))
+        cells = filter(lambda c: c.state == State.CLOSE, self.get_adjacent_cells(x, y))
         return cells
 
+    def reveal(self, x, y):
+        """Открыть ячейку, а если рядом с ней нет мин, то и всю пустую область вокруг неё.
+        Заливка выполняется итеративно по индексам ячеек, поэтому не упирается в предел рекурсии.
+        Небольшие области открываются обходом со стеком, а если область оказалась большой,
+        оставшаяся часть открывается построчно (см. _reveal_scanline).
+        Ячейки с флагами не открываются.
+        :param x: int - координата по X
+        :param y: int - координата по Y
+        :return: list of int - индексы открытых ячеек (пустой список, если ячейка уже открыта или с флагом)
+        """
+        return self.reveal_indexes([self.get_index(x, y)])
+
+    def reveal_indexes(self, indexes):
+        """Открыть несколько ячеек одной заливкой: пустые ячейки среди них сразу становятся начальными
+        точками общей заливки, поэтому каждая ячейка области проверяется один раз
+        :param indexes: iterable of int - индексы ячеек
+        :return: list of int - индексы открытых ячеек
+        """
+        states, values = self._states, self._values
+        close, open_ = State.CLOSE, State.OPEN
+        opened, stack = [], []
+        for index in indexes:
+            if states[index] != close:  # Уже открыта или с флагом
+                continue
+            states[index] = open_
+            opened.append(index)
+            if values[index] == 0:
+                stack.append(index)
+            elif values[index] == -1:
+                self._exploded += 1
+        offsets = self.neighbor_offsets
+        pop, push, add = stack.pop, stack.append, opened.append
+        while stack:
+            if len(opened) > _SCANLINE_REVEAL_THRESHOLD:
+                self._reveal_scanline(stack, opened)
+                break
+            index = pop()
+            for offset in offsets:
+                adjacent = index + offset
+                if states[adjacent] == close:  # Рамка и флаги имеют другие состояния и не открываются
+                    states[adjacent] = open_
+                    add(adjacent)
+                    if values[adjacent] == 0:
+                        push(adjacent)
+        self._opened += len(opened)  # Заливка не доходит до мин: рядом с пустыми ячейками их нет
+        return opened
+
+    def _reveal_scanline(self, seeds, opened):
+        """Построчная заливка большой пустой области.
+        Работает с отрезками строк вместо отдельных ячеек: поиск границ отрезков и открытие ячеек
+        выполняются операциями над байтовыми буферами, без цикла Python по каждой ячейке.
+        :param seeds: list of int - индексы открытых пустых ячеек, соседи которых ещё не обработаны
+        :param opened: list of int - список открытых ячеек, дополняется на месте
+        """
+        states, stride = self._states, self.stride
+        # Маска закрытых пустых ячеек, в которые ещё может зайти заливка
+        # Буферы копируются в bytes: поверх mmap они memoryview, у которого нет translate и count
+        expandable = (int.from_bytes(self._values.tobytes().translate(_ZERO_MASK_TABLE), 'little') &
+                      int.from_bytes(bytes(states).translate(_ZERO_MASK_TABLE), 'little'))
+        mask = bytearray(expandable.to_bytes(len(states), 'little'))
+        runs = [(index, index + 1) for index in seeds]  # Отрезки пустых ячеек, соседей которых нужно открыть
+        while runs:
+            left, right = runs.pop()
+            for start in (left - stride - 1, left - 1, left + stride - 1):
+                end = start + right - left + 2
+                # Найти в строке новые отрезки пустых ячеек, касающиеся текущего отрезка
+                position = mask.find(1, start, end)
+                while position != -1:
+                    run_left = mask.rfind(0, 0, position) + 1  # Рамка в маске нулевая, отрезок не выйдет из строки
+                    run_right = mask.find(0, position)
+                    mask[run_left:run_right] = bytes(run_right - run_left)
+                    runs.append((run_left, run_right))
+                    position = mask.find(1, run_right, end) if run_right < end else -1
+                # Открыть закрытые ячейки строки вокруг отрезка
+                segment = bytes(states[start:end])
+                closed = segment.count(State.CLOSE)
+                if not closed:
+                    continue
+                states[start:end] = segment.translate(_OPEN_CLOSED_TABLE)
+                if closed == end - start:
+                    opened.extend(range(start, end))
+                    continue
+                for match in _CLOSED_RUN_PATTERN.finditer(segment):
+                    opened.extend(range(start + match.start(), start + match.end()))
+
     def get_cells_with_bombs(self):
         """Получение ячеек с бомбами
         :return: list of Cell - список с объектами ячеек
         """
-        cells_with_bombs = filter(lambda c: c.has_bomb(), self._cell_list)
-        return cells_with_bombs
+        return [Cell(self, index) for index in self.get_bombs_indexes()]
+
+    def get_bombs_indexes(self):
+        """Получение индексов ячеек с бомбами
+        :return: list of int - индексы ячеек
+        """
+        return [index for index, value in enumerate(self._values) if value == -1]
 
     def get_closed_cells(self):
         """Получение закрытых ячеек
         :return: list of Cell - список с объектами ячеек
         """
-        closed_cells = filter(lambda c: c.state != State.OPEN, self._cell_list)
-        return closed_cells
-
-    def plant_random_bombs(self, bombs=10, seed=None):
-        """Метод для закладки мин в поле"""
-        if seed:  # Установка числа для инициализации случайных последовательностей
-            random.seed(seed)  # Необходимо для тестирования метода
-        cells = self.get_copy_cells_list()  # Копируем все ячейки в отдельный список
-        random.shuffle(cells)  # Перемешиваем
-        # Для каждой ячейки в срезе длиной равной количеству бомб
-        for cell in cells[:bombs]:
-            cell.plant_bomb()  # Закладываем бомбу
-            for adjacent_cell in self.get_adjacent_cells(cell.x, cell.y):  # Для соседних ячеек
-                if not adjacent_cell.has_bomb():  # Если в них нет бомб
-                    adjacent_cell.value += 1  # Увеличиваем значение
+        return [Cell(self, index) for index, state in enumerate(self._states)
+                if state != State.OPEN and state != State.BORDER]
+
+    def plant_random_bombs(self, bombs=10, seed=None, generator=None, exclude=()):
+        """Метод для закладки мин в поле.
+        Позиции мин выбираются без перемешивания всего поля, после чего значения соседних ячеек
+        вычисляются одним проходом по заложенным минам.
+        Для одинаковых seed и версии генератора расстановка всегда одинакова:
+        - версия 1 повторяет перемешивание random.shuffle из Python 2.7 (так были получены
+          расстановки в тестах), требует O(размер поля) времени;
+        - версия 2 (по умолчанию) выбирает позиции через random.Random.sample за O(количество мин).
+        :param bombs: int - количество мин
+        :param seed: int - число для инициализации генератора случайных чисел (необходимо для тестирования)
+        :param generator: int - версия генератора расстановки, по умолчанию GENERATOR_VERSION
+        :param exclude: iterable of int - индексы ячеек, в которые мины не закладываются
+        """
+        generator = GENERATOR_VERSION if generator is None else generator
+        width = self.width
+        excluded = sorted(set((index // self.stride - 1) * width + index % self.stride - 1 for index in exclude))
+        cells_count = width * self.height - len(excluded)
+        assert 0 <= bombs <= cells_count, "Количество мин должно быть от 0 до %s" % cells_count
+        rnd = random.Random(seed)
+        if generator == 1:
+            positions = list(range(cells_count))
+            for i in reversed(range(1, cells_count)):  # Алгоритм random.shuffle из Python 2.7
+                j = int(rnd.random() * (i + 1))
+                positions[i], positions[j] = positions[j], positions[i]
+            positions = positions[:bombs]
+        elif generator == 2:
+            positions = rnd.sample(range(cells_count), bombs)
+        else:
+            raise ValueError("Неизвестная версия генератора: %s" % generator)
+        if excluded:
+            # Позиции выбирались среди ячеек без исключённых, сдвигаем их на пропущенные ячейки.
+            # Перед исключённой ячейкой excluded[n] стоят excluded[n] - n обычных ячеек, поэтому позиция
+            # сдвигается на количество исключённых ячеек с таким порогом не больше неё
+            thresholds = [skipped - n for n, skipped in enumerate(excluded)]
+            positions = [position + bisect_right(thresholds, position) for position in positions]
+        self.seed = seed
+        self.generator = generator
+        self._plant_bombs(positions)
+
+    def plant_bombs(self, indexes):
+        """Заложить мины в указанные ячейки и пересчитать значения соседних ячеек
+        :param indexes: iterable of int - индексы ячеек
+        """
+        stride, width = self.stride, self.width
+        self._plant_bombs([(index // stride - 1) * width + index % stride - 1 for index in indexes])
+
+    def move_bomb(self, source, target):
+        """Перенести мину из одной ячейки в другую с пересчётом значений соседей
+        :param source: int - индекс ячейки с миной
+        :param target: int - индекс ячейки без мины
+        """
+        values, states = self._values, self._states
+        assert values[source] == -1 and values[target] != -1, "Мина переносится из ячейки с миной в пустую"
+        for index, delta in ((source, -1), (target, 1)):
+            count = 0
+            for offset in self.neighbor_offsets:
+                adjacent = index + offset
+                if values[adjacent] == -1:
+                    count += 1
+                elif states[adjacent] != State.BORDER:
+                    values[adjacent] += delta
+            self._set_value(index, count if delta < 0 else -1)
+
+    def _plant_bombs(self, positions):
+        """Заложить мины в ячейки и пересчитать значения соседних ячеек
+        :param positions: list of int - номера ячеек в порядке обхода по строкам (без учёта рамки)
+        """
+        width, stride = self.width, self.stride
+        values, states = self._values, self._states
+        indexes = [(p // width + 1) * stride + p % width + 1 for p in positions]
+        indexes = [index for index in indexes if values[index] != -1]  # Повторно мины не закладываются
+        for index in indexes:
+            values[index] = -1
+        self._bombs += len(indexes)
+        if self._flags or self._opened:  # Мины под уже открытыми ячейками или флагами меняют счётчики
+            for index in indexes:
+                if states[index] == State.FLAG:
+                    self._correct_flags += 1
+                elif states[index] == State.OPEN:
+                    self._exploded += 1
+        if len(indexes) * _DENSE_PLANTING_RATIO < len(values):
+            # Мин мало - дешевле увеличить значения соседей каждой мины
+            border = State.BORDER
+            for index in indexes:
+                for offset in self.neighbor_offsets:
+                    adjacent = index + offset
+                    if values[adjacent] != -1 and states[adjacent] != border:
+                        values[adjacent] += 1
+            return
+        # Мин много - считаем все значения одним проходом сумм сдвинутых масок.
+        # Маска мин хранится в длинном целом по байту на ячейку, сумма восьми сдвигов даёт количество
+        # соседних мин в каждом байте (не больше 8, поэтому переносов между байтами не бывает).
+        size = len(values)
+        shift = stride + 1  # Сдвиг, при котором все смещения соседей становятся неотрицательными
+        mask = int.from_bytes(values.tobytes().translate(_BOMB_MASK_TABLE), 'little')
+        counts = 0
+        for offset in self.neighbor_offsets:
+            counts += mask << ((offset + shift) * 8)
+        counts = counts >> (shift * 8)
+        bombs = mask * 0xFF  # Байты 0xFF (-1) в ячейках с минами
+        interior = int.from_bytes(bytes(states).translate(_INTERIOR_MASK_TABLE), 'little')
+        counts = (counts | bombs) & interior
+        values[:] = array('b', counts.to_bytes(size + shift, 'little')[:size])
+
+
+class Status(object):
+    """Класс состояний игры"""
+    PLAY = 0
+    WIN = 1
+    LOSE = 2
+
+
+class Move(object):
+    """Класс видов ходов в истории партии"""
+    REVEAL = 0
+    FLAG = 1
+    CHORD = 2
+
+
+class Start(object):
+    """Класс способов расстановки мин"""
+    RANDOM = 0  # Мины закладываются сразу, первый ход может попасть на мину
+    SAFE = 1  # Мины закладываются при первом открытии, открытая ячейка и её соседи остаются без мин
+    NO_GUESS = 2  # Как SAFE, и от первого хода поле решается без угадывания
+
+
+class GameEngine(object):
+    """Правила игры без интерфейса: открытие ячеек, флаги, аккорды и определение исхода.
+    Используется окном игры и для пакетного моделирования партий без дисплея
+    """
+
+    def __init__(self, width=10, height=10, bombs=10, seed=None, generator=None, start=Start.RANDOM, field=None,
+                 history=(), log=None):
+        """Инициализация игры
+        :param width: int - ширина поля
+        :param height: int - высота поля
+        :param bombs: int - количество мин
+        :param seed: int - число для инициализации генератора расстановки мин
+        :param generator: int - версия генератора расстановки мин
+        :param start: int - способ расстановки мин (Start)
+        :param field: Field - готовое поле для продолжения партии (например, загруженное из файла)
+        :param history: iterable of tuple - ходы, которые привели к готовому полю
+        :param log: MoveLog - журнал ходов (replay.MoveLog), в который записывается партия
+        """
+        self.bombs = bombs
+        self.seed = seed
+        self.generator = generator
+        self.start = start
+        self.status = Status.PLAY
+        self.history = list(history)  # Сделанные ходы: (Move, x, y)
+        self.moves = len(self.history)  # Количество сделанных ходов
+        self.log = None
+        if field is not None:
+            self.field = field
+            self.planted = bombs == 0 or field.stats()['bombs'] > 0
+            self._update_status()
+        else:
+            self.field = Field(width=width, height=height)
+            self.planted = False  # Заложены ли мины. При безопасном старте - только после первого открытия
+            if start == Start.RANDOM:
+                self.plant_bombs()
+        if log is not None:
+            self.set_log(log)
+
+    def set_log(self, log):
+        """Подключить журнал ходов: записать в него начало партии и уже сделанные ходы
+        :param log: MoveLog - журнал ходов (replay.MoveLog)
+        """
+        self.log = log
+        log.start_game(self)
+        for move, x, y in self.history:
+            log.record(move, x, y)
+
+    def plant_bombs(self, x=None, y=None):
+        """Заложить мины. Если передана ячейка первого хода, она и её соседи остаются без мин
+        (на слишком плотном поле - только сама ячейка)
+        :param x: int - координата по X ячейки первого хода
+        :param y: int - координата по Y ячейки первого хода
+        """
+        field = self.field
+        exclude = []
+        if x is not None:
+            index = field.get_index(x, y)
+            exclude = [index] + field.get_adjacent_indexes(index)
+            free = field.width * field.height - self.bombs
+            if len(exclude) > free:
+                exclude = exclude[:min(1, free)]
+        if self.start == Start.NO_GUESS and exclude:
+            from solver import plant_no_guess_bombs  # Решатель сам зависит от объектов игры
+            plant_no_guess_bombs(field, self.bombs, exclude[0], seed=self.seed, generator=self.generator,
+                                 exclude=exclude)
+        else:
+            field.plant_random_bombs(bombs=self.bombs, seed=self.seed, generator=self.generator, exclude=exclude)
+        self.planted = True
+
+    def is_over(self):
+        """Проверка окончания игры
+        :return: bool
+        """
+        return self.status != Status.PLAY
+
+    def reveal(self, x, y):
+        """Открыть ячейку (и пустую область вокруг неё)
+        :param x: int - координата по X
+        :param y: int - координата по Y
+        :return: list of int - индексы изменившихся ячеек
+        """
+        # Открытая ячейка и ячейка с флагом не открываются, такой ход не записывается
+        if self.is_over() or self.field.states[self.field.get_index(x, y)] != State.CLOSE:
+            return []
+        if not self.planted:
+            self.plant_bombs(x, y)
+        self._record(Move.REVEAL, x, y)
+        changed = self.field.reveal(x, y)
+        self._update_status()
+        return changed
+
+    def toggle_flag(self, x, y):
+        """Поставить флаг на закрытую ячейку или снять его. В открытые ячейки флаг не ставится
+        :param x: int - координата по X
+        :param y: int - координата по Y
+        :return: list of int - индексы изменившихся ячеек
+        """
+        if self.is_over():
+            return []
+        cell = self.field.get_cell(x, y)
+        if cell.state == State.CLOSE:
+            cell.set_flag()
+        elif cell.state == State.FLAG:
+            cell.remove_flag()
+        else:
+            return []
+        self._record(Move.FLAG, x, y)
+        self._update_status()
+        return [cell.index]
+
+    def chord(self, x, y):
+        """Аккорд: если у открытой ячейки с числом стоит столько же флагов по соседству,
+        открыть все остальные закрытые соседние ячейки
+        :param x: int - координата по X
+        :param y: int - координата по Y
+        :return: list of int - индексы изменившихся ячеек
+        """
+        if self.is_over():
+            return []
+        field = self.field
+        states, values = field.states, field.values
+        index = field.get_index(x, y)
+        if states[index] != State.OPEN or values[index] <= 0:
+            return []
+        adjacent = field.get_adjacent_indexes(index)
+        if [states[i] for i in adjacent].count(State.FLAG) != values[index]:
+            return []
+        self._record(Move.CHORD, x, y)
+        # Все закрытые соседи открываются одной заливкой, пустые среди них сразу её продолжают
+        changed = field.reveal_indexes([i for i in adjacent if states[i] == State.CLOSE])
+        self._update_status()
+        return changed
+
+    def _record(self, move, x, y):
+        """Записать ход в историю партии
+        :param move: int - вид хода (Move)
+        :param x: int - координата по X
+        :param y: int - координата по Y
+        """
+        self.history.append((move, x, y))
+        self.moves += 1
+        if self.log is not None:
+            self.log.record(move, x, y)
+
+    def _update_status(self):
+        """Определить исход игры по счётчикам поля"""
+        if self.field.is_lose():
+            self.status = Status.LOSE
+        elif self.field.is_win():
+            self.status = Status.WIN
+        else:
+            return
+        if self.log is not None:
+            self.log.end_game(self)
+            self.log = None  # Партия окончена, ходов больше не будет
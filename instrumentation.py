@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""Замеры горячих участков игры во время работы.
+
+Замеры включаются явно: Instrumentation.enable подменяет перечисленные методы классов обёртками,
+которые считают вызовы и время, а disable возвращает исходные методы. Пока замеры выключены,
+обёрток нет вовсе, поэтому игра работает с той же скоростью, что и без этого модуля.
+
+Задержка хода - время от начала хода (метод с latency='start') до конца перерисовки
+(метод с latency='end'). В режиме записи в файл после каждого хода дописывается строка JSON
+с задержкой и временем методов за этот ход.
+"""
+import json
+import time
+from functools import wraps
+
+
+class Probe(object):
+    """Счётчики одного метода"""
+
+    def __init__(self, name):
+        """
+        :param name: str - название замера
+        """
+        self.name = name
+        self.calls = 0
+        self.total = 0.0  # Суммарное время, с
+        self.max = 0.0  # Наибольшее время одного вызова, с
+        self.last = 0.0  # Время последнего вызова, с
+        self.cells = 0  # Количество изменённых ячеек, если метод возвращает их список
+
+    def as_dict(self):
+        """
+        :return: dict - счётчики
+        """
+        return {'calls': self.calls, 'total': self.total, 'max': self.max, 'last': self.last, 'cells': self.cells}
+
+
+class Instrumentation(object):
+    """Замеры методов и задержки ходов"""
+
+    def __init__(self, dump_path=None):
+        """
+        :param dump_path: str - файл, в который после каждого хода дописывается строка JSON с замерами
+        """
+        self.dump_path = dump_path
+        self.enabled = False
+        self.probes = {}
+        self.moves = 0
+        self.last_latency = 0.0  # Задержка последнего хода, с
+        self.max_latency = 0.0
+        self.last_cells = 0  # Количество ячеек, изменённых последним ходом
+        self._patched = []  # (владелец, имя, исходный атрибут из __dict__ владельца)
+        self._move_started = None
+        self._move_times = {}  # Время методов за текущий ход
+        self._dump_file = None
+
+    def enable(self, targets):
+        """Включить замеры
+        :param targets: iterable of tuple - (класс или объект, имя метода, вид задержки: None, 'start' или 'end')
+        """
+        if self.enabled:
+            return
+        for owner, name, latency in targets:
+            original = vars(owner).get(name)  # None, если метод унаследован или это объект
+            probe_name = '{}.{}'.format(owner.__name__ if isinstance(owner, type) else type(owner).__name__, name)
+            setattr(owner, name, self._wrap(getattr(owner, name), probe_name, latency))
+            self._patched.append((owner, name, original))
+        if self.dump_path:
+            self._dump_file = open(self.dump_path, 'a')
+        self.enabled = True
+
+    def disable(self):
+        """Выключить замеры и вернуть исходные методы. Накопленные счётчики сохраняются"""
+        for owner, name, original in reversed(self._patched):
+            if original is None:
+                delattr(owner, name)  # Метод снова берётся из класса (базового класса)
+            else:
+                setattr(owner, name, original)
+        self._patched = []
+        if self._dump_file is not None:
+            self._dump_file.write(json.dumps(self.snapshot(), sort_keys=True) + '\n')
+            self._dump_file.close()
+            self._dump_file = None
+        self._move_started = None
+        self.enabled = False
+
+    def _wrap(self, function, name, latency):
+        """Обернуть метод замером
+        :param function: callable - исходный метод
+        :param name: str - название замера
+        :param latency: str - вид задержки: None, 'start' или 'end'
+        :return: callable
+        """
+        probe = self.probes.setdefault(name, Probe(name))
+        perf_counter = time.perf_counter
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            started = perf_counter()
+            if latency == 'start':
+                self._move_started = started
+                self._move_times = {}
+                self.last_cells = 0
+            result = function(*args, **kwargs)
+            finished = perf_counter()
+            elapsed = finished - started
+            probe.calls += 1
+            probe.total += elapsed
+            probe.last = elapsed
+            probe.max = max(probe.max, elapsed)
+            if isinstance(result, list):
+                probe.cells += len(result)
+                if latency == 'start':
+                    self.last_cells += len(result)
+                    if not result:  # Ход ничего не изменил, перерисовки после него не будет
+                        self._move_started = None
+            if self._move_started is not None:
+                self._move_times[name] = self._move_times.get(name, 0.0) + elapsed
+                if latency == 'end':
+                    self._end_move(finished)
+            return result
+
+        return wrapper
+
+    def _end_move(self, finished):
+        """Завершить замер задержки хода
+        :param finished: float - время окончания перерисовки
+        """
+        self.last_latency = finished - self._move_started
+        self.max_latency = max(self.max_latency, self.last_latency)
+        self.moves += 1
+        self._move_started = None
+        if self._dump_file is not None:
+            self._dump_file.write(json.dumps({'latency': self.last_latency, 'cells': self.last_cells,
+                                              'times': self._move_times}, sort_keys=True) + '\n')
+
+    def snapshot(self):
+        """
+        :return: dict - все счётчики
+        """
+        return {
+            'moves': self.moves,
+            'last_latency': self.last_latency,
+            'max_latency': self.max_latency,
+            'probes': {name: probe.as_dict() for name, probe in self.probes.items()},
+        }
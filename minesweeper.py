@@ -1,151 +1,449 @@
 # -*- coding: utf-8 -*-
-import sys, os
-try:
-    import Tkinter
-except ModuleNotFoundError:
-    import tkinter as Tkinter
-from entities import Field, State, Colors
+import time
+
+STARTED = time.perf_counter()  # Время запуска, от него считается время до первого кадра. Замер идёт до импортов
+
+import argparse
+import sys, os, random
+from entities import PRESETS, Field, GameEngine, Start, Status
+
+# Модули Tk и модули, нужные только окну игры, импортируются при создании окна (load_gui):
+# игре в терминале и импорту модуля они не нужны
+Tkinter = filedialog = messagebox = simpledialog = None
+Instrumentation = BaseRenderer = BitmapRenderer = Renderer = MoveLog = Replayer = iter_records = Solver = storage = None
+
+
+def load_gui():
+    """Импортировать модули Tk и модули окна игры: отрисовку, решатель, журнал ходов, сохранение и замеры"""
+    global Tkinter, filedialog, messagebox, simpledialog
+    global Instrumentation, BaseRenderer, BitmapRenderer, Renderer, MoveLog, Replayer, iter_records, Solver, storage
+    if Tkinter is not None:
+        return
+    try:
+        import Tkinter
+        import tkFileDialog as filedialog
+        import tkMessageBox as messagebox
+        import tkSimpleDialog as simpledialog
+    except ModuleNotFoundError:
+        import tkinter as Tkinter
+        from tkinter import filedialog, messagebox, simpledialog
+    from instrumentation import Instrumentation
+    from renderer import BaseRenderer, BitmapRenderer, Renderer
+    from replay import MoveLog, Replayer, iter_records
+    from solver import Solver
+    import storage
 
 
 class Game(object):
-    SCREEN_SIZE = 400
-    COLS = 10
-    CELL_SIZE = SCREEN_SIZE / COLS
-    BOMBS_COUNT = 10
+    SCREEN_SIZE = 640  # Наибольший размер холста в пикселях, большее поле прокручивается
+    CELL_SIZE = 40  # Размер ячейки, если поле помещается на холст целиком
+    MAX_CELLS = 16000000  # Наибольшее количество ячеек поля
+    BITMAP_CELLS = 250000  # Поля больше этого рисуются картинкой, а не элементами canvas
+    # Названия стандартных размеров полей в меню
+    PRESET_LABELS = [
+        ('beginner', "Новичок: 9 x 9, 10 мин"),
+        ('intermediate', "Любитель: 16 x 16, 40 мин"),
+        ('expert', "Профессионал: 30 x 16, 99 мин"),
+    ]
+    FILE_EXTENSION = '.msw'
+    FILE_TYPES = [("Партии сапёра", '*.msw')]
+    LOG_PATH = os.path.join(os.path.expanduser('~'), 'minesweeper.mswl')  # Журнал ходов партий по умолчанию
+    LOG_TYPES = [("Журналы партий", '*.mswl')]
+    REPLAY_DELAY = 300  # Пауза между ходами при воспроизведении, мс
+    OVERLAY_DELAY = 500  # Период обновления строки замеров, мс
+    # Биты event.state зажатых клавиш мыши: нажатие второй клавиши при зажатой первой - аккорд
+    LEFT_BUTTON_MASK = 0x0100
+    RIGHT_BUTTON_MASK = 0x0400
 
-    game_over = False
-    field = None
+    engine = None
+    solver = None  # Решатель создаётся при первой подсказке в партии
+    replayer = None  # Воспроизведение журнала, пока оно идёт, ходы игрока не принимаются
+    renderer = None
+    _replay_scheduled = None
+    _overlay_scheduled = None
 
-    def __init__(self, master):
+    def __init__(self, master, width=9, height=9, bombs=10, profile=None, log_path=None):
         """Инициализация игры
         :param master: Tk - Объект главного окна
+        :param width: int - ширина поля
+        :param height: int - высота поля
+        :param bombs: int - количество мин
+        :param profile: str - файл, в который пишутся замеры каждого хода. Если указан, замеры включены сразу
+        :param log_path: str - журнал, в который дописываются ходы партий. Если указан, журнал включён сразу,
+            иначе его можно включить в меню (журнал LOG_PATH)
         """
-        master.resizable(0, 0)  # Запрещаем ресайз окна
-
-        # Создаём канвас
-        self.canvas = Tkinter.Canvas(master, width=self.SCREEN_SIZE, height=self.SCREEN_SIZE)
-        self.canvas.pack()
+        load_gui()
+        self.master = master
+        self.width, self.height, self.bombs = width, height, bombs
+        self.log = None  # Журнал ходов, пока он не включён - None
+        self.log_path = log_path or self.LOG_PATH
+        self.instrumentation = Instrumentation(dump_path=profile)
+        # Создаём канвас с полосами прокрутки. Окно может быть меньше поля, рисуется только видимая часть
+        frame = Tkinter.Frame(master)
+        frame.pack(fill=Tkinter.BOTH, expand=True)
+        self.canvas = Tkinter.Canvas(frame, width=0, height=0, highlightthickness=0)
+        x_scroll = Tkinter.Scrollbar(frame, orient=Tkinter.HORIZONTAL, command=lambda *args: self.renderer.xview(*args))
+        y_scroll = Tkinter.Scrollbar(frame, orient=Tkinter.VERTICAL, command=lambda *args: self.renderer.yview(*args))
+        self.canvas.config(xscrollcommand=x_scroll.set, yscrollcommand=y_scroll.set)
+        self.canvas.grid(row=0, column=0, sticky='nsew')
+        y_scroll.grid(row=0, column=1, sticky='ns')
+        x_scroll.grid(row=1, column=0, sticky='ew')
+        frame.rowconfigure(0, weight=1)
+        frame.columnconfigure(0, weight=1)
 
         # Добавляем обработчики для нажатий на клавиши мыши
         self.canvas.bind('<Button-1>', self.click_left_button)  # Левая клавиша
+        self.canvas.bind('<Button-2>', self.click_middle_button)  # Средняя клавиша (колесо)
         self.canvas.bind('<Button-3>', self.click_right_button)  # Правая клавища
+        # Прокрутка колесом (Shift - по горизонтали) и масштаб (Ctrl + колесо)
+        self.canvas.bind('<Configure>', lambda event: self.renderer.update_viewport())
+        self.canvas.bind('<MouseWheel>', self.scroll)
+        self.canvas.bind('<Shift-MouseWheel>', self.scroll)
+        self.canvas.bind('<Control-MouseWheel>', self.scroll)
+        for button in (4, 5):  # В X11 колесо мыши приходит как нажатия кнопок 4 и 5
+            self.canvas.bind('<Button-%s>' % button, self.scroll)
+            self.canvas.bind('<Shift-Button-%s>' % button, self.scroll)
+            self.canvas.bind('<Control-Button-%s>' % button, self.scroll)
 
         # Добавление надписи с информацией о состоянии игры
         self.label = Tkinter.Label(master)
         self.label.pack()
+        # Строка замеров, видна только когда замеры включены
+        self.overlay = Tkinter.Label(master, anchor='w', font=('Courier', 9))
 
         # Создание меню
         self.menu = Tkinter.Menu(master)
         self.menu.add_command(label="Начать заново", command=self.game_restart)
+        self.menu.add_command(label="Сохранить", command=self.game_save)
+        self.menu.add_command(label="Открыть", command=self.game_load)
+        self.menu.add_command(label="Повтор", command=self.game_replay)
+        self.menu.add_command(label="Подсказка", command=self.show_hint)
+        self.no_guess = Tkinter.BooleanVar(master, value=False)  # Поля, которые решаются без угадывания
+        self.menu.add_checkbutton(label="Без угадывания", variable=self.no_guess, command=self.game_restart)
+        # Размер поля: стандартные размеры и свой
+        self.preset = Tkinter.StringVar(master, value=self.find_preset(width, height, bombs))
+        size_menu = Tkinter.Menu(self.menu, tearoff=False)
+        for name, label in self.PRESET_LABELS:
+            size_menu.add_radiobutton(label=label, value=name, variable=self.preset,
+                                      command=lambda name=name: self.set_board_size(*PRESETS[name]))
+        size_menu.add_radiobutton(label="Другой...", value='', variable=self.preset, command=self.ask_board_size)
+        self.menu.add_cascade(label="Размер", menu=size_menu)
+        self.profiling = Tkinter.BooleanVar(master, value=False)
+        self.menu.add_checkbutton(label="Замеры", variable=self.profiling, command=self.toggle_instrumentation)
+        self.logging = Tkinter.BooleanVar(master, value=False)
+        self.menu.add_checkbutton(label="Журнал", variable=self.logging, command=self.toggle_log)
         master.config(menu=self.menu)  # Добавляем меню в окно приложения
 
+        if log_path:
+            self.logging.set(True)
+            self.open_log()
         self.game_restart()
+        if profile:
+            self.profiling.set(True)
+            self.toggle_instrumentation()
+
+    @staticmethod
+    def find_preset(width, height, bombs):
+        """Найти стандартный размер поля
+        :param width: int - ширина поля
+        :param height: int - высота поля
+        :param bombs: int - количество мин
+        :return: str - название размера из PRESETS или пустая строка, если размер свой
+        """
+        for name, board in PRESETS.items():
+            if board == (width, height, bombs):
+                return name
+        return ''
+
+    @classmethod
+    def check_board_size(cls, width, height, bombs):
+        """Проверить размер поля
+        :param width: int - ширина поля
+        :param height: int - высота поля
+        :param bombs: int - количество мин
+        :return: str - описание ошибки или None, если размер допустим
+        """
+        if width < 1 or height < 1 or width * height > cls.MAX_CELLS:
+            return "Поле должно содержать от 1 до {} ячеек".format(cls.MAX_CELLS)
+        if not 0 <= bombs < width * height:
+            return "Количество мин должно быть от 0 до {}".format(width * height - 1)
+        return None
+
+    def set_board_size(self, width, height, bombs):
+        """Метод смены размера поля, начинается новая партия
+        :param width: int - ширина поля
+        :param height: int - высота поля
+        :param bombs: int - количество мин
+        """
+        self.width, self.height, self.bombs = width, height, bombs
+        self.preset.set(self.find_preset(width, height, bombs))
+        self.game_restart()
+
+    def ask_board_size(self):
+        """Метод выбора своего размера поля"""
+        width = simpledialog.askinteger("Размер поля", "Ширина:", initialvalue=self.width, minvalue=1)
+        height = width and simpledialog.askinteger("Размер поля", "Высота:", initialvalue=self.height, minvalue=1)
+        bombs = height and simpledialog.askinteger("Размер поля", "Количество мин:", initialvalue=self.bombs,
+                                                   minvalue=0)
+        error = bombs is not None and self.check_board_size(width, height, bombs)
+        if error:
+            messagebox.showerror("Размер поля", error)
+        if bombs is None or error:  # Отмена или ошибка, размер не меняется
+            self.preset.set(self.find_preset(self.width, self.height, self.bombs))
+            return
+        self.set_board_size(width, height, bombs)
+
+    @property
+    def field(self):
+        """Игровое поле текущей партии"""
+        return self.engine.field
+
+    @property
+    def game_over(self):
+        """Закончена ли текущая партия"""
+        return self.engine.is_over()
 
     def game_restart(self):
         """Метод сброса игровых данных на начальные"""
-        self.game_over = False
+        self.stop_replay()
         self.label.config(text="")
-        self.field = Field(width=self.COLS, height=self.COLS)  # Создаём поле с заложенными минами
-        self.field.plant_random_bombs(bombs=self.BOMBS_COUNT)
-        print(self.field)
+        # Создаём поле, мины закладываются при первом открытии ячейки, поэтому первый ход всегда безопасен
+        start = Start.NO_GUESS if self.no_guess.get() else Start.SAFE
+        seed = random.randrange(2 ** 32)  # По seed и журналу ходов партию можно воспроизвести
+        self.engine = GameEngine(width=self.width, height=self.height, bombs=self.bombs, seed=seed, start=start,
+                                 log=self.log)
+        self.solver = None
         self.draw_grid()  # Рисуем игровое поле
+        self.update_status()
+
+    def game_save(self):
+        """Метод сохранения текущей партии в файл"""
+        path = filedialog.asksaveasfilename(defaultextension=self.FILE_EXTENSION, filetypes=self.FILE_TYPES)
+        if path:
+            storage.save(path, self.engine)
+
+    def game_load(self):
+        """Метод загрузки партии из файла"""
+        path = filedialog.askopenfilename(filetypes=self.FILE_TYPES)
+        if not path:
+            return
+        try:
+            engine = storage.load(path)
+        except (ValueError, OSError) as e:
+            messagebox.showerror("Открыть", "Не удалось загрузить партию: {}".format(e))
+            return
+        self.stop_replay()
+        self.engine = engine
+        self.attach_log()
+        self.solver = None
+        self.draw_grid()
+        self.check_game_over()
+
+    def game_replay(self):
+        """Метод воспроизведения партий из журнала ходов: ходы показываются по одному с паузой"""
+        path = filedialog.askopenfilename(filetypes=self.LOG_TYPES)
+        if not path:
+            return
+        self.stop_replay()
+        if self.log is not None:
+            self.log.flush()  # Журнал может быть тем же файлом, в который пишутся партии
+        self.replayer = Replayer(iter_records(path))
+        self.replay_next_game()
+
+    def replay_next_game(self):
+        """Метод перехода к следующей партии журнала"""
+        try:
+            engine = self.replayer.next_game()
+        except (ValueError, OSError) as e:  # Журнал читается по мере воспроизведения, ошибки видны только здесь
+            self.replay_failed(e)
+            return
+        if engine is None:
+            self.stop_replay()
+            self.label.config(text="Воспроизведение окончено")
+            return
+        self.engine = self.replayer.engine
+        self.solver = None
+        self.draw_grid()
+        self.update_status()
+        self._replay_scheduled = self.master.after(self.REPLAY_DELAY, self.replay_step)
+
+    def replay_step(self):
+        """Метод воспроизведения следующего хода"""
+        try:
+            changed = self.replayer.step()
+        except (ValueError, OSError) as e:
+            self.replay_failed(e)
+            return
+        if changed is None:  # Ходы партии закончились, после паузы переходим к следующей
+            self._replay_scheduled = self.master.after(self.REPLAY_DELAY * 5, self.replay_next_game)
+            return
+        self.update_solver(changed)
+        self.draw_cells(changed)
+        self.check_game_over()
+        self._replay_scheduled = self.master.after(self.REPLAY_DELAY, self.replay_step)
+
+    def replay_failed(self, error):
+        """Метод остановки воспроизведения при ошибке чтения журнала
+        :param error: Exception - ошибка
+        """
+        self.stop_replay()
+        messagebox.showerror("Повтор", "Не удалось воспроизвести журнал: {}".format(error))
+
+    def stop_replay(self):
+        """Метод остановки воспроизведения"""
+        if self._replay_scheduled is not None:
+            self.master.after_cancel(self._replay_scheduled)
+            self._replay_scheduled = None
+        self.replayer = None
 
     def draw_grid(self):
-        """Метод для отрисовки сетки"""
-        self.canvas.delete('all')
-        self.canvas.create_rectangle(0, 0, self.SCREEN_SIZE, self.SCREEN_SIZE, fill=Colors.CLOSED_CELL)
-        for i in range(1, self.COLS):
-            self.canvas.create_line(0, i * self.CELL_SIZE, self.SCREEN_SIZE, i * self.CELL_SIZE)
-            self.canvas.create_line(i * self.CELL_SIZE, 0, i * self.CELL_SIZE, self.SCREEN_SIZE)
+        """Метод для отрисовки сетки и закрытых ячеек нового поля.
+        Способ отрисовки выбирается по размеру поля. Если он не меняется, отрисовщик и его элементы
+        переиспользуются, а размер холста меняется, только если новое поле занимает другую площадь
+        """
+        width, height = self.field.width, self.field.height
+        renderer_class = BitmapRenderer if width * height > self.BITMAP_CELLS else Renderer
+        if not isinstance(self.renderer, renderer_class):
+            self.renderer = renderer_class(self.canvas, self.CELL_SIZE)
+        cell_size = self.renderer.fit_cell_size(min(self.CELL_SIZE, self.SCREEN_SIZE // max(width, height)))
+        canvas_size = (min(width * cell_size + 1, self.SCREEN_SIZE), min(height * cell_size + 1, self.SCREEN_SIZE))
+        if canvas_size != (int(self.canvas.cget('width')), int(self.canvas.cget('height'))):
+            self.canvas.config(width=canvas_size[0], height=canvas_size[1])
+        self.renderer.reset(self.field, cell_size)
 
     def draw_bombs(self):
         """Метод отрисовки бомб на canvas"""
-        for cell in self.field.get_cells_with_bombs():
-            # Определить цвет ячейки
-            cell_background = Colors.OPENED_CELL_WITH_BOMB if cell.state == State.OPEN else Colors.OPENED_CELL
-            # Нарисовать открытую ячейку
-            self.canvas.create_rectangle(cell.x * self.CELL_SIZE + 1, cell.y * self.CELL_SIZE + 1,
-                                         cell.x * self.CELL_SIZE + self.CELL_SIZE,
-                                         cell.y * self.CELL_SIZE + self.CELL_SIZE,
-                                         fill=cell_background, width=0)
-            # Нарисовать бомбу
-            self.canvas.create_oval(cell.x * self.CELL_SIZE + self.CELL_SIZE / 10 * 2,
-                                    cell.y * self.CELL_SIZE + self.CELL_SIZE / 10 * 2,
-                                    cell.x * self.CELL_SIZE + self.CELL_SIZE / 10 * 8,
-                                    cell.y * self.CELL_SIZE + self.CELL_SIZE / 10 * 8,
-                                    fill=Colors.BOMB, width=1)
-            self.canvas.create_line(cell.x * self.CELL_SIZE + self.CELL_SIZE / 2,
-                                    cell.y * self.CELL_SIZE + self.CELL_SIZE / 10,
-                                    cell.x * self.CELL_SIZE + self.CELL_SIZE / 2,
-                                    cell.y * self.CELL_SIZE + self.CELL_SIZE / 10 * 9,
-                                    fill=Colors.BOMB, width=self.CELL_SIZE / 15)
-            self.canvas.create_line(cell.x * self.CELL_SIZE + self.CELL_SIZE / 10,
-                                    cell.y * self.CELL_SIZE + self.CELL_SIZE / 2,
-                                    cell.x * self.CELL_SIZE + self.CELL_SIZE / 10 * 9,
-                                    cell.y * self.CELL_SIZE + self.CELL_SIZE / 2,
-                                    fill=Colors.BOMB, width=self.CELL_SIZE / 15)
-            self.canvas.create_line(cell.x * self.CELL_SIZE + self.CELL_SIZE / 10 * 2,
-                                    cell.y * self.CELL_SIZE + self.CELL_SIZE / 10 * 2,
-                                    cell.x * self.CELL_SIZE + self.CELL_SIZE / 10 * 8,
-                                    cell.y * self.CELL_SIZE + self.CELL_SIZE / 10 * 8,
-                                    fill=Colors.BOMB, width=self.CELL_SIZE / 15)
-            self.canvas.create_line(cell.x * self.CELL_SIZE + self.CELL_SIZE / 10 * 8,
-                                    cell.y * self.CELL_SIZE + self.CELL_SIZE / 10 * 2,
-                                    cell.x * self.CELL_SIZE + self.CELL_SIZE / 10 * 2,
-                                    cell.y * self.CELL_SIZE + self.CELL_SIZE / 10 * 8,
-                                    fill=Colors.BOMB, width=self.CELL_SIZE / 15)
-
-    def draw_opened_cell(self, cell):
-        """Метод отрисовки открытой ячейки
-        :param cell: Cell - объект ячейки
-        """
-        # Рисуем пустую ячейку
-        self.canvas.create_rectangle(cell.x * self.CELL_SIZE + 1,
-                                     cell.y * self.CELL_SIZE + 1,
-                                     cell.x * self.CELL_SIZE + self.CELL_SIZE,
-                                     cell.y * self.CELL_SIZE + self.CELL_SIZE,
-                                     fill=Colors.OPENED_CELL, width=0)
-        if cell.value > 0:  # Если рядом с ячейкой лежит мина, то нарисовать значение ячейки
-            self.canvas.create_text(int(cell.x * self.CELL_SIZE + self.CELL_SIZE / 2),
-                                    int(cell.y * self.CELL_SIZE + self.CELL_SIZE / 2),
-                                    text=str(cell.value), font=('Arial', int(self.CELL_SIZE / 2)))
-
-    def draw_closed_cell(self, cell):
-        """Метод отрисовки закрытой ячейки
-        :param cell: Cell - объект ячейки
-        """
-        self.canvas.create_rectangle(cell.x * self.CELL_SIZE + 1, cell.y * self.CELL_SIZE + 1,
-                                     cell.x * self.CELL_SIZE + self.CELL_SIZE, cell.y * self.CELL_SIZE + self.CELL_SIZE,
-                                     fill=Colors.CLOSED_CELL, width=0)
-
-    def draw_flag(self, cell):
-        """Метод рисования флага в ячейке
-        :param cell: Cell - объект ячейки
-        """
-        self.canvas.create_polygon(cell.x * self.CELL_SIZE + self.CELL_SIZE / 10 * 2,
-                                   cell.y * self.CELL_SIZE + self.CELL_SIZE / 10 * 4,
-                                   cell.x * self.CELL_SIZE + self.CELL_SIZE / 10 * 7,
-                                   cell.y * self.CELL_SIZE + self.CELL_SIZE / 10 * 2,
-                                   cell.x * self.CELL_SIZE + self.CELL_SIZE / 10 * 7,
-                                   cell.y * self.CELL_SIZE + self.CELL_SIZE / 10 * 6,
-                                   fill=Colors.FLAG_POLYGON, outline=Colors.FLAG_POLYGON)
-        self.canvas.create_line(cell.x * self.CELL_SIZE + self.CELL_SIZE / 10 * 7,
-                                cell.y * self.CELL_SIZE + self.CELL_SIZE / 10 * 2,
-                                cell.x * self.CELL_SIZE + self.CELL_SIZE / 10 * 7,
-                                cell.y * self.CELL_SIZE + self.CELL_SIZE / 10 * 8,
-                                fill=Colors.FLAG_LINE, width=self.CELL_SIZE / 20)
+        self.renderer.show_bombs()
+
+    def draw_cells(self, indexes):
+        """Метод перерисовки изменившихся ячеек.
+        Ячейки перерисовываются в соответствии с их состоянием одним пакетом, когда Tk освободится
+        :param indexes: iterable of int - индексы ячеек
+        """
+        self.renderer.mark_dirty(indexes)
 
     def open_cell(self, x, y):
-        """Рекурсивный метод открытия пустых ячеек
+        """Метод открытия ячейки вместе с пустой областью вокруг неё.
+        Сначала поле открывает все ячейки, затем открытые ячейки отрисовываются одним пакетом
         :param x: int - координаты по X
         :param y: int - координаты по Y
         """
-        cell = self.field.get_cell(x, y)
-        cell.open()
-        self.draw_opened_cell(cell)
-        if cell.value == 0:  # Только если ячейка не находится рядом с бомбой
-            for adjacent_cell in self.field.get_adjacent_closed_cells(x, y):
-                self.open_cell(adjacent_cell.x, adjacent_cell.y)  # Рекурсивно открываем соседние ячейки
+        changed = self.engine.reveal(x, y)
+        self.update_solver(changed)
+        self.renderer.set_hints([])
+        self.draw_cells(changed)
+
+    def chord_cell(self, x, y):
+        """Метод аккорда: открыть всех соседей без флагов у числа, вокруг которого уже стоят все флаги.
+        Изменившиеся ячейки отрисовываются одним пакетом
+        :param x: int - координаты по X
+        :param y: int - координаты по Y
+        """
+        changed = self.engine.chord(x, y)
+        if not changed:
+            return
+        self.update_solver(changed)
+        self.renderer.set_hints([])
+        self.draw_cells(changed)
+
+    def open_log(self):
+        """Открыть журнал ходов. Если файл не открывается, журнал остаётся выключенным"""
+        try:
+            self.log = MoveLog(self.log_path)
+        except OSError as e:
+            self.log = None
+            self.logging.set(False)
+            messagebox.showerror("Журнал", "Не удалось открыть журнал {}: {}".format(self.log_path, e))
+
+    def close_log(self):
+        """Закрыть журнал ходов. Текущая партия дальше не записывается"""
+        if self.log is None:
+            return
+        if self.engine is not None and self.engine.log is self.log:
+            self.engine.log = None
+        self.log.close()
+        self.log = None
+
+    def attach_log(self):
+        """Записывать в журнал текущую партию вместе с уже сделанными ходами. Партии без seed
+        в журнал не пишутся: их поле по журналу не восстановить
+        """
+        engine = self.engine
+        if self.log is not None and engine.log is None and engine.seed is not None and not engine.is_over():
+            engine.set_log(self.log)
+
+    def toggle_log(self):
+        """Включить или выключить журнал ходов (меню "Журнал")"""
+        if self.logging.get():
+            self.open_log()
+            if self.log is not None:
+                self.attach_log()
+        else:
+            self.close_log()
+
+    def update_solver(self, changed):
+        """Сообщить решателю об изменившихся ячейках, если он уже создан
+        :param changed: list of int - индексы изменившихся ячеек
+        """
+        if self.solver is not None:
+            self.solver.update(changed)
+
+    def show_hint(self):
+        """Метод подсветки подсказки: ячеек, в которых точно нет мин.
+        Если таких нет, подсвечивается ячейка с наименьшей вероятностью мины
+        """
+        if self.game_over:
+            return
+        if self.solver is None:
+            self.solver = Solver(self.field)
+        solution = self.solver.solve()
+        hints = solution.safe
+        if not hints and solution.probabilities:
+            best = min(solution.probabilities, key=solution.probabilities.get)
+            if solution.probabilities[best] <= solution.interior_probability:
+                hints = [best]
+        self.renderer.set_hints(hints)
+
+    def instrumented_methods(self):
+        """Методы, которые замеряются при включённых замерах
+        :return: list of tuple - (класс, имя метода, вид задержки для Instrumentation.enable)
+        """
+        return [
+            (GameEngine, 'reveal', 'start'),
+            (GameEngine, 'chord', 'start'),
+            (GameEngine, 'toggle_flag', 'start'),
+            (Field, 'reveal_indexes', None),
+            (Field, 'is_win', None),
+            (Solver, 'update', None),
+            (Game, 'draw_grid', None),
+            (Game, 'draw_cells', None),
+            (Game, 'draw_bombs', None),
+            (BaseRenderer, 'update_viewport', None),
+            (BaseRenderer, 'flush', 'end'),
+            (Renderer, '_place', None),
+            (BitmapRenderer, '_blit', None),
+        ]
+
+    def toggle_instrumentation(self):
+        """Метод включения и выключения замеров и строки с ними"""
+        if self.profiling.get():
+            self.instrumentation.enable(self.instrumented_methods())
+            self.overlay.pack(fill=Tkinter.X)
+            self.update_overlay()
+        else:
+            self.instrumentation.disable()
+            self.overlay.pack_forget()
+            if self._overlay_scheduled is not None:
+                self.master.after_cancel(self._overlay_scheduled)
+                self._overlay_scheduled = None
+
+    def update_overlay(self):
+        """Метод обновления строки замеров: задержка последнего хода, открытые им ячейки, элементы холста"""
+        instrumentation = self.instrumentation
+        self.overlay.config(text="Ход: {:.1f} мс (макс. {:.1f}), ячеек: {}, элементов холста: {}, ходов: {}".format(
+            instrumentation.last_latency * 1000, instrumentation.max_latency * 1000, instrumentation.last_cells,
+            len(self.canvas.find_all()), instrumentation.moves))
+        self._overlay_scheduled = self.master.after(self.OVERLAY_DELAY, self.update_overlay)
 
     def is_win(self):
         """Метод для проверки окончания игры.
@@ -153,54 +451,93 @@ class Game(object):
         и в каждой находится мина.
         :return: bool - если игрок выиграл True, если игрок проиграл False
         """
-        return all([c.has_flag() and c.has_bomb() for c in self.field.get_closed_cells()])
+        return self.engine.status == Status.WIN
+
+    def scroll(self, event):
+        """Метод для обработки колеса мыши: прокрутка поля или изменение масштаба с зажатым Ctrl
+        :param event: Объект события
+        """
+        up = event.num == 4 or getattr(event, 'delta', 0) > 0
+        if event.state & 0x0004:  # Ctrl
+            self.renderer.zoom(1.25 if up else 0.8, event.x, event.y)
+        elif event.state & 0x0001:  # Shift
+            self.renderer.xview('scroll', -1 if up else 1, 'units')
+        else:
+            self.renderer.yview('scroll', -1 if up else 1, 'units')
+
+    def update_status(self):
+        """Метод обновления надписи с количеством оставшихся мин"""
+        # Мины при безопасном старте закладываются только после первого открытия, поэтому количество - из настроек партии
+        self.label.config(text="Осталось мин: {}".format(self.engine.bombs - self.field.stats()['flags']))
 
     def you_lose(self):
         """Метод вызывается, если игрок проиграл"""
         self.draw_bombs()
         self.label.config(text="Вы проиграли")
-        self.game_over = True
 
     def you_win(self):
         """Метод вызывается, если игрок выиграл"""
         self.label.config(text="Вы выиграли")
-        self.game_over = True
+
+    def check_game_over(self):
+        """Метод проверки исхода игры после хода"""
+        if self.engine.status == Status.LOSE:  # Если открыта ячейка с бомбой, то игрок сразу проигрывает
+            self.you_lose()
+        elif self.is_win():  # Иначе необходимо проверить победил игрок или нет
+            self.you_win()
+        else:
+            self.update_status()
 
     def click_left_button(self, event):
         """Метод для обработки клавиши открытия ячейки.
+        Если при этом зажата правая клавиша, делается аккорд
         :param event: Объект события
         """
-        if self.game_over:  # Если игра закончена, то нажатия клавишь не обрабатываются
+        if self.game_over or self.replayer:  # Если игра закончена или воспроизводится, нажатия не обрабатываются
             return
 
-        x, y = int(event.x / self.CELL_SIZE), int(event.y / self.CELL_SIZE)  # Определить на какую ячейку кликнули
-        self.open_cell(x, y)
+        coordinates = self.renderer.cell_at(event.x, event.y)  # Определить на какую ячейку кликнули
+        if coordinates is None:  # Клик мимо поля
+            return
+        x, y = coordinates
+        if event.state & self.RIGHT_BUTTON_MASK:
+            self.chord_cell(x, y)
+        else:
+            self.open_cell(x, y)
+        self.check_game_over()
 
-        if self.field.get_cell(x, y).has_bomb():  # Если ячейка с бомбой, то игрок сразу проигрывает
-            self.you_lose()
-        elif self.is_win():  # Если ячейка была пустой, необходимо проверить победил игрок или нет
-            self.you_win()
+    def click_middle_button(self, event):
+        """Метод для обработки клавиши аккорда
+        :param event: Объект события
+        """
+        if self.game_over or self.replayer:  # Если игра закончена или воспроизводится, нажатия не обрабатываются
+            return
+
+        coordinates = self.renderer.cell_at(event.x, event.y)  # Определить на какую ячейку кликнули
+        if coordinates is None:  # Клик мимо поля
+            return
+        self.chord_cell(*coordinates)
+        self.check_game_over()
 
     def click_right_button(self, event):
         """Метод для обработки нажатия клавиши для установки или снятия флага
         В методе происходит проверка на то, что ячейка ещё закрыта. В открытые ячейки нельзя установить флаг.
         Если флаг установлен, то он снимается, но ячейка остаётся закрытой.
+        Если при этом зажата левая клавиша, делается аккорд
         :param event: Объект события
         """
-        if self.game_over:  # Если игра закончена, то нажатия клавишь не обрабатываются
+        if self.game_over or self.replayer:  # Если игра закончена или воспроизводится, нажатия не обрабатываются
             return
 
-        x, y = int(event.x / self.CELL_SIZE), int(event.y / self.CELL_SIZE)  # Определить на какую ячейку кликнули
-        cell = self.field.get_cell(x, y)  # Из поля достать ячейку по координатам
-
-        if cell.state is State.CLOSE:  # Если ячейка закрыта
-            cell.set_flag()
-            self.draw_flag(cell)  # Нарисовать флажок
-            if self.is_win():  # Логика проверки на завершение игры
-                self.you_win()
-        elif cell.state is State.FLAG:  # Если на ячейке был установлен флажок
-            cell.remove_flag()
-            self.draw_closed_cell(cell)  # Нарисовать закрытую ячейку
+        coordinates = self.renderer.cell_at(event.x, event.y)  # Определить на какую ячейку кликнули
+        if coordinates is None:  # Клик мимо поля
+            return
+        x, y = coordinates
+        if event.state & self.LEFT_BUTTON_MASK:
+            self.chord_cell(x, y)
+        else:
+            self.draw_cells(self.engine.toggle_flag(x, y))  # Нарисовать флажок или закрытую ячейку
+        self.check_game_over()
 
 
 def resource_path(relative_path):
@@ -211,12 +548,59 @@ def resource_path(relative_path):
     return os.path.join(base_path, relative_path)
 
 
-def main():
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Сапёр")
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='beginner', help="стандартный размер поля")
+    parser.add_argument('--width', type=int, help="ширина поля, по умолчанию из --preset")
+    parser.add_argument('--height', type=int, help="высота поля, по умолчанию из --preset")
+    parser.add_argument('--bombs', type=int, help="количество мин, по умолчанию из --preset")
+    parser.add_argument('--profile', metavar='PATH', help="включить замеры и записывать их в файл после каждого хода")
+    parser.add_argument('--log', nargs='?', const=Game.LOG_PATH, metavar='PATH',
+                        help="дописывать ходы партий в журнал (по умолчанию %s)" % Game.LOG_PATH.replace('%', '%%'))
+    parser.add_argument('--console', action='store_true', help="играть в терминале, без окна (см. console.py)")
+    parser.add_argument('--seed', type=int, help="seed партии в терминале, по умолчанию случайный")
+    parser.add_argument('--infinite', action='store_true', help="бесконечное поле в терминале (вместе с --console)")
+    parser.add_argument('--density', type=float, default=0.2, help="доля мин на бесконечном поле")
+    parser.add_argument('--first-frame', action='store_true',
+                        help="вывести время от импорта до первого кадра окна в секундах и выйти")
+    args = parser.parse_args(argv)
+    width, height, bombs = PRESETS[args.preset]
+    args.width = width if args.width is None else args.width
+    args.height = height if args.height is None else args.height
+    args.bombs = bombs if args.bombs is None else args.bombs
+    error = Game.check_board_size(args.width, args.height, args.bombs)
+    if error:
+        parser.error(error)
+    if args.infinite:
+        from chunks import MIN_INFINITE_DENSITY
+        if not MIN_INFINITE_DENSITY <= args.density < 1:
+            parser.error("Доля мин на бесконечном поле должна быть от {} до 1".format(MIN_INFINITE_DENSITY))
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.console:
+        import console
+        if args.infinite:
+            console.play_infinite(seed=args.seed, density=args.density)
+        else:
+            console.play(args.width, args.height, args.bombs, seed=args.seed)
+        return
+    load_gui()
     root = Tkinter.Tk()
     root.title("Minesweeper")
     root.iconbitmap(resource_path("icon.ico"))
-    Game(root)
-    root.mainloop()
+    game = Game(root, width=args.width, height=args.height, bombs=args.bombs, profile=args.profile,
+                log_path=args.log)
+    if args.first_frame:
+        root.update()  # Дождаться, пока Tk нарисует окно
+        print("{:.4f}".format(time.perf_counter() - STARTED))
+        root.destroy()
+    else:
+        root.mainloop()
+    game.close_log()
+    game.instrumentation.disable()
 
 
 if __name__ == '__main__':
@@ -1,4 +1,13 @@
 # -*- mode: python ; coding: utf-8 -*-
+# Сборка по умолчанию - один файл, который при каждом запуске распаковывается во временный каталог.
+# Профиль --onedir собирает каталог с программой: распаковки нет, поэтому игра запускается быстрее.
+#     pyinstaller minesweeper.spec
+#     pyinstaller minesweeper.spec -- --onedir
+import argparse
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--onedir', action='store_true', help="собрать каталог вместо одного файла")
+options = parser.parse_args()
 
 
 a = Analysis(
@@ -10,7 +19,8 @@ a = Analysis(
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    # Модули, которые окно игры не импортирует: сервер, моделирование партий, замеры производительности
+    excludes=['server', 'simulate', 'benchmarks', 'tests', 'asyncio', 'multiprocessing', 'unittest'],
     noarchive=False,
     optimize=0,
 )
@@ -19,14 +29,15 @@ pyz = PYZ(a.pure)
 exe = EXE(
     pyz,
     a.scripts,
-    a.binaries,
-    a.datas,
+    [] if options.onedir else a.binaries,  # В каталоге библиотеки и данные лежат рядом с программой
+    [] if options.onedir else a.datas,
     [],
+    exclude_binaries=options.onedir,
     name='minesweeper',
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
+    upx=not options.onedir,  # Сжатые UPX библиотеки распаковываются при каждой загрузке и замедляют запуск
     upx_exclude=[],
     runtime_tmpdir=None,
     console=False,
@@ -37,3 +48,14 @@ exe = EXE(
     entitlements_file=None,
     icon=['icon.ico'],
 )
+
+if options.onedir:
+    coll = COLLECT(
+        exe,
+        a.binaries,
+        a.datas,
+        strip=False,
+        upx=False,
+        upx_exclude=[],
+        name='minesweeper',
+    )
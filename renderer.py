@@ -0,0 +1,539 @@
+# -*- coding: utf-8 -*-
+"""Отрисовка игрового поля на Canvas.
+
+Способ отрисовки выбирается по размеру поля:
+- Renderer - элементы canvas для каждой видимой ячейки, с цифрами, флагами и минами;
+- BitmapRenderer - видимая часть поля одной картинкой PhotoImage, по цвету на ячейку.
+  Подходит для полей в миллионы ячеек, где ячейки мельче цифр, а элементов canvas было бы слишком много.
+"""
+from functools import lru_cache
+
+from entities import State, Colors
+
+
+class CellGeometry(object):
+    """Координаты элементов ячейки относительно её левого верхнего угла.
+    Вычисляются один раз для каждого размера ячейки, при отрисовке к ним только прибавляется сдвиг ячейки.
+    Размер ячейки целый, поэтому все координаты, шрифт и толщины линий - целые пиксели
+    """
+
+    def __init__(self, cell_size):
+        """Инициализация геометрии
+        :param cell_size: int - размер ячейки в пикселях
+        """
+        s = cell_size
+        self.cell_size = s
+        self.rectangle = (1, 1, s, s)
+        self.text = (s // 2, s // 2)
+        self.font = ('Arial', max(1, s // 2))
+        self.bomb_oval = (s * 2 // 10, s * 2 // 10, s * 8 // 10, s * 8 // 10)
+        self.bomb_lines = (
+            (s // 2, s // 10, s // 2, s * 9 // 10),
+            (s // 10, s // 2, s * 9 // 10, s // 2),
+            (s * 2 // 10, s * 2 // 10, s * 8 // 10, s * 8 // 10),
+            (s * 8 // 10, s * 2 // 10, s * 2 // 10, s * 8 // 10),
+        )
+        self.bomb_line_width = max(1, s // 15)
+        self.flag_polygon = (s * 2 // 10, s * 4 // 10, s * 7 // 10, s * 2 // 10, s * 7 // 10, s * 6 // 10)
+        self.flag_line = (s * 7 // 10, s * 2 // 10, s * 7 // 10, s * 8 // 10)
+        self.flag_line_width = max(1, s // 20)
+
+    def move(self, coordinates, x, y):
+        """Сдвинуть координаты элемента в ячейку поля
+        :param coordinates: tuple of int - координаты вида (x1, y1, x2, y2, ...) относительно ячейки
+        :param x: int - координата ячейки по X
+        :param y: int - координата ячейки по Y
+        :return: list of int - координаты на canvas
+        """
+        dx, dy = x * self.cell_size, y * self.cell_size
+        return [c + (dy if i % 2 else dx) for i, c in enumerate(coordinates)]
+
+
+@lru_cache(maxsize=16)
+def get_geometry(cell_size):
+    """Получить геометрию ячейки для размера. Результат кэшируется
+    :param cell_size: int - размер ячейки в пикселях
+    :return: CellGeometry
+    """
+    return CellGeometry(cell_size)
+
+
+class BaseRenderer(object):
+    """Общая часть отрисовщиков: масштаб, прокрутка, видимая область и отложенная перерисовка.
+    Изменённые ячейки накапливаются и перерисовываются одним вызовом after_idle.
+    Наследники реализуют _clear, _show_view и _redraw
+    """
+    MIN_CELL_SIZE = 8
+    MAX_CELL_SIZE = 96
+
+    def __init__(self, canvas, cell_size):
+        """Инициализация отрисовщика
+        :param canvas: Canvas - холст для рисования
+        :param cell_size: int - размер ячейки в пикселях
+        """
+        self.canvas = canvas
+        self.cell_size = self.fit_cell_size(cell_size)
+        self.field = None
+        self.bombs_visible = False
+        self._hints = set()  # Закрытые ячейки, подсвеченные подсказкой
+        self._view = (0, 0, 0, 0)  # Видимые ячейки: x0, y0, x1, y1 (правая и нижняя границы не входят)
+        self._dirty = set()
+        self._flush_scheduled = None
+
+    @classmethod
+    def fit_cell_size(cls, cell_size):
+        """Ограничить размер ячейки пределами отрисовщика
+        :param cell_size: int - желаемый размер ячейки в пикселях
+        :return: int
+        """
+        return max(cls.MIN_CELL_SIZE, min(cls.MAX_CELL_SIZE, int(cell_size)))
+
+    def reset(self, field, cell_size=None):
+        """Начать отрисовку нового поля.
+        Элементы холста, созданные для предыдущего поля, переиспользуются
+        :param field: Field - игровое поле
+        :param cell_size: int - новый размер ячейки в пикселях, по умолчанию остаётся прежним
+        """
+        canvas = self.canvas
+        if self._flush_scheduled is not None:
+            canvas.after_cancel(self._flush_scheduled)
+            self._flush_scheduled = None
+        if cell_size is not None:
+            self.cell_size = self.fit_cell_size(cell_size)
+        self.field = field
+        self.bombs_visible = False
+        self._hints = set()
+        self._dirty = set()
+        self._clear()
+        self._view = (0, 0, 0, 0)
+        self._resize_board()
+        canvas.xview_moveto(0)
+        canvas.yview_moveto(0)
+        self.update_viewport()
+
+    def _resize_board(self):
+        """Обновить область прокрутки под текущий размер ячеек"""
+        size = self.cell_size
+        self.canvas.config(scrollregion=(0, 0, self.field.width * size + 1, self.field.height * size + 1))
+
+    def set_cell_size(self, cell_size, x=0, y=0):
+        """Изменить масштаб. Точка холста под указателем остаётся на месте
+        :param cell_size: int - новый размер ячейки в пикселях
+        :param x: int - координата указателя в окне холста по X
+        :param y: int - координата указателя в окне холста по Y
+        """
+        cell_size = self.fit_cell_size(cell_size)
+        canvas, old_size = self.canvas, self.cell_size
+        if cell_size == old_size or self.field is None:
+            return
+        # Положение точки под указателем в координатах поля
+        board_x, board_y = (canvas.canvasx(x)) / old_size, (canvas.canvasy(y)) / old_size
+        self.cell_size = cell_size
+        self._clear()
+        self._view = (0, 0, 0, 0)
+        self._resize_board()
+        width, height = self.field.width * cell_size + 1, self.field.height * cell_size + 1
+        canvas.xview_moveto((board_x * cell_size - x) / width)
+        canvas.yview_moveto((board_y * cell_size - y) / height)
+        self.update_viewport()
+
+    def zoom(self, factor, x=0, y=0):
+        """Изменить масштаб в factor раз
+        :param factor: float - множитель размера ячейки
+        :param x: int - координата указателя в окне холста по X
+        :param y: int - координата указателя в окне холста по Y
+        """
+        size = self.cell_size
+        new_size = int(round(size * factor))
+        if new_size == size:  # Мелкие ячейки всё равно меняются хотя бы на пиксель
+            new_size = size + (1 if factor > 1 else -1)
+        self.set_cell_size(new_size, x, y)
+
+    def xview(self, *args):
+        """Прокрутка по горизонтали, используется как команда полосы прокрутки"""
+        self.canvas.xview(*args)
+        self.update_viewport()
+
+    def yview(self, *args):
+        """Прокрутка по вертикали, используется как команда полосы прокрутки"""
+        self.canvas.yview(*args)
+        self.update_viewport()
+
+    def cell_at(self, x, y):
+        """Определить ячейку под точкой окна холста
+        :param x: int - координата точки в окне по X
+        :param y: int - координата точки в окне по Y
+        :return: tuple of int - координаты ячейки или None, если точка вне поля
+        """
+        size = self.cell_size
+        cell_x, cell_y = int(self.canvas.canvasx(x) // size), int(self.canvas.canvasy(y) // size)
+        if 0 <= cell_x < self.field.width and 0 <= cell_y < self.field.height:
+            return cell_x, cell_y
+        return None
+
+    def update_viewport(self):
+        """Привести отрисовку в соответствие с видимой областью холста"""
+        if self.field is None:
+            return
+        canvas, size, field = self.canvas, self.cell_size, self.field
+        left, top = canvas.canvasx(0), canvas.canvasy(0)
+        x0, y0 = max(0, int(left // size)), max(0, int(top // size))
+        x1 = min(field.width, int((left + canvas.winfo_width()) // size) + 1)
+        y1 = min(field.height, int((top + canvas.winfo_height()) // size) + 1)
+        if (x0, y0, x1, y1) == self._view:
+            return
+        old_view, self._view = self._view, (x0, y0, x1, y1)
+        self._show_view(old_view)
+
+    def mark_dirty(self, indexes):
+        """Отметить ячейки для перерисовки. Перерисовка произойдёт один раз, когда Tk освободится
+        :param indexes: iterable of int - индексы изменённых ячеек
+        """
+        self._dirty.update(indexes)
+        if self._dirty and self._flush_scheduled is None:
+            self._flush_scheduled = self.canvas.after_idle(self.flush)
+
+    def show_bombs(self):
+        """Показать все мины поля"""
+        raise NotImplementedError
+
+    def set_hints(self, indexes):
+        """Подсветить ячейки подсказки, предыдущая подсказка снимается
+        :param indexes: iterable of int - индексы ячеек
+        """
+        old_hints, self._hints = self._hints, set(indexes)
+        self.mark_dirty(old_hints | self._hints)
+
+    def flush(self):
+        """Перерисовать все отмеченные ячейки. Невидимые ячейки пропускаются:
+        они будут нарисованы по текущему состоянию поля, когда появятся в видимой области
+        """
+        self._flush_scheduled = None
+        dirty, self._dirty = self._dirty, set()
+        self._redraw(dirty)
+
+    def _clear(self):
+        """Убрать с холста отрисовку ячеек перед сменой поля или масштаба"""
+        raise NotImplementedError
+
+    def _show_view(self, old_view):
+        """Отрисовать изменившуюся видимую область (она уже записана в _view)
+        :param old_view: tuple of int - предыдущая видимая область
+        """
+        raise NotImplementedError
+
+    def _redraw(self, indexes):
+        """Перерисовать изменённые ячейки
+        :param indexes: set of int - индексы ячеек
+        """
+        raise NotImplementedError
+
+
+class Renderer(BaseRenderer):
+    """Отрисовщик поля элементами canvas с отсечением по видимой области.
+    Элементы canvas есть только у ячеек, попадающих в видимую часть холста. Ячейки, ушедшие из видимой
+    области при прокрутке или масштабировании, отдают свои элементы в пул, откуда их забирают
+    появившиеся ячейки, поэтому стоимость отрисовки зависит от размера окна, а не поля.
+    Пулы сохраняются и при смене поля, так что новая партия не создаёт элементы заново.
+    """
+
+    def __init__(self, canvas, cell_size):
+        """Инициализация отрисовщика
+        :param canvas: Canvas - холст для рисования
+        :param cell_size: int - размер ячейки в пикселях
+        """
+        super(Renderer, self).__init__(canvas, cell_size)
+        self._background = None  # Фон поля, промежутки между ячейками образуют сетку
+        self._cells = {}  # Индекс видимой ячейки -> (фон, текст)
+        self._flags = {}  # Индекс видимой ячейки -> элементы флага
+        self._bombs = {}  # Индекс видимой ячейки -> элементы мины
+        self._free_cells, self._free_flags, self._free_bombs = [], [], []  # Пулы свободных элементов
+
+    @property
+    def geometry(self):
+        """Геометрия ячейки текущего размера"""
+        return get_geometry(self.cell_size)
+
+    def _clear(self):
+        if self._background is None:  # Холст мог использоваться другим отрисовщиком
+            self.canvas.delete('all')
+            self._background = self.canvas.create_rectangle(0, 0, 0, 0, fill=Colors.FLAG_LINE, width=0)
+        for index in list(self._cells):  # Все элементы нужно переставить, проще отдать их в пул
+            self._release(index)
+
+    def _resize_board(self):
+        """Обновить размер фона и область прокрутки под текущий размер ячеек"""
+        super(Renderer, self)._resize_board()
+        size = self.cell_size
+        self.canvas.coords(self._background, 0, 0, self.field.width * size + 1, self.field.height * size + 1)
+
+    def _show_view(self, old_view):
+        field = self.field
+        x0, y0, x1, y1 = self._view
+        old_x0, old_y0, old_x1, old_y1 = old_view
+        for index in list(self._cells):  # Освободить элементы ушедших из видимой области ячеек
+            x, y = field.get_coordinates(index)
+            if not (x0 <= x < x1 and y0 <= y < y1):
+                self._release(index)
+        for y in range(y0, y1):
+            row = field.get_index(0, y)
+            for x in range(x0, x1):
+                if old_y0 <= y < old_y1 and old_x0 <= x < old_x1:
+                    continue  # Ячейка уже была видна
+                self._place(row + x, x, y)
+
+    def show_bombs(self):
+        self.bombs_visible = True
+        self.mark_dirty(list(self._cells))
+
+    def _redraw(self, indexes):
+        cells = self._cells
+        for index in indexes:
+            if index in cells:
+                self._draw_cell(index)
+
+    def _place(self, index, x, y):
+        """Выдать видимой ячейке элементы из пула (или создать новые) и нарисовать её
+        :param index: int - индекс ячейки
+        :param x: int - координата ячейки по X
+        :param y: int - координата ячейки по Y
+        """
+        canvas, geometry = self.canvas, self.geometry
+        if self._free_cells:
+            background, text = self._free_cells.pop()
+            canvas.coords(background, *geometry.move(geometry.rectangle, x, y))
+            canvas.coords(text, *geometry.move(geometry.text, x, y))
+            canvas.itemconfig(background, state='normal')
+            canvas.itemconfig(text, state='normal', font=geometry.font)
+        else:
+            background = canvas.create_rectangle(*geometry.move(geometry.rectangle, x, y),
+                                                 fill=Colors.CLOSED_CELL, width=0)
+            text = canvas.create_text(*geometry.move(geometry.text, x, y), text='', font=geometry.font)
+        self._cells[index] = (background, text)
+        self._draw_cell(index)
+
+    def _release(self, index):
+        """Вернуть элементы ячейки, ушедшей из видимой области, в пулы
+        :param index: int - индекс ячейки
+        """
+        background, text = self._cells.pop(index)
+        self.canvas.itemconfig(background, state='hidden')
+        self.canvas.itemconfig(text, state='hidden')
+        self._free_cells.append((background, text))
+        self._set_visible(self._flags, self._free_flags, index, False, None)
+        self._set_visible(self._bombs, self._free_bombs, index, False, None)
+
+    def _draw_cell(self, index):
+        """Привести элементы ячейки в соответствие с её состоянием
+        :param index: int - индекс ячейки
+        """
+        canvas, field = self.canvas, self.field
+        background, text = self._cells[index]
+        cell = field.get_cell_by_index(index)
+        state, value = cell.state, cell.value
+        bomb_visible = value == -1 and (state == State.OPEN or self.bombs_visible)
+        if state == State.OPEN:
+            fill = Colors.OPENED_CELL_WITH_BOMB if value == -1 else Colors.OPENED_CELL
+        elif bomb_visible:
+            fill = Colors.OPENED_CELL
+        else:
+            fill = Colors.HINT if index in self._hints else Colors.CLOSED_CELL
+        canvas.itemconfig(background, fill=fill)
+        canvas.itemconfig(text, text=str(value) if state == State.OPEN and value > 0 else '')
+        self._set_visible(self._flags, self._free_flags, index, state == State.FLAG and not bomb_visible,
+                          self._flag_shapes)
+        self._set_visible(self._bombs, self._free_bombs, index, bomb_visible, self._bomb_shapes)
+
+    def _set_visible(self, items, pool, index, visible, shapes):
+        """Показать или убрать значок (флаг или мину) в ячейке.
+        Элементы значков берутся из пула и возвращаются в него скрытыми
+        :param items: dict - видимые значки по индексам ячеек
+        :param pool: list - пул свободных значков
+        :param index: int - индекс ячейки
+        :param visible: bool - должен ли значок быть виден
+        :param shapes: callable - функция, возвращающая описание элементов значка для ячейки
+        """
+        canvas = self.canvas
+        if not visible:
+            if index in items:
+                glyph = items.pop(index)
+                for item in glyph:
+                    canvas.itemconfig(item, state='hidden')
+                pool.append(glyph)
+            return
+        if index in items:
+            return
+        x, y = self.field.get_coordinates(index)
+        if pool:
+            glyph = pool.pop()
+            for item, (kind, coordinates, options) in zip(glyph, shapes(x, y)):
+                canvas.coords(item, *coordinates)
+                canvas.itemconfig(item, state='normal', **options)
+        else:
+            glyph = [getattr(canvas, 'create_' + kind)(*coordinates, **options)
+                     for kind, coordinates, options in shapes(x, y)]
+        items[index] = glyph
+
+    def _flag_shapes(self, x, y):
+        """Описание элементов флага в ячейке
+        :return: list of tuple - (вид элемента, координаты, параметры)
+        """
+        geometry = self.geometry
+        return [
+            ('polygon', geometry.move(geometry.flag_polygon, x, y),
+             {'fill': Colors.FLAG_POLYGON, 'outline': Colors.FLAG_POLYGON}),
+            ('line', geometry.move(geometry.flag_line, x, y),
+             {'fill': Colors.FLAG_LINE, 'width': geometry.flag_line_width}),
+        ]
+
+    def _bomb_shapes(self, x, y):
+        """Описание элементов мины в ячейке
+        :return: list of tuple - (вид элемента, координаты, параметры)
+        """
+        geometry = self.geometry
+        shapes = [('oval', geometry.move(geometry.bomb_oval, x, y), {'fill': Colors.BOMB, 'width': 1})]
+        for line in geometry.bomb_lines:
+            shapes.append(('line', geometry.move(line, x, y),
+                           {'fill': Colors.BOMB, 'width': geometry.bomb_line_width}))
+        return shapes
+
+
+# Код ячейки для картинки: состояние в старшем полубайте, значение + 1 (мина - 0) в младшем
+_VALUE_TO_NIBBLE = bytes(0 if b == 0xFF else b + 1 if b < 9 else 0 for b in range(256))
+_HINT_CODE = 0x40  # Состояния занимают коды 0x00-0x3F, подсказка получает отдельный код
+_GRID_MIN_CELL_SIZE = 4  # Сетка между ячейками рисуется, начиная с этого размера ячейки
+
+
+def _get_palette(bombs_visible):
+    """Построить таблицы перевода кода ячейки в цвет
+    :param bombs_visible: bool - показывать ли мины в закрытых ячейках
+    :return: list of bytes - таблицы для bytes.translate по каналам R, G, B
+    """
+    colors = []
+    for code in range(256):
+        state, value = code >> 4, (code & 0x0F) - 1
+        if code == _HINT_CODE:
+            color = Colors.HINT
+        elif state == State.OPEN:
+            color = Colors.OPENED_CELL_WITH_BOMB if value == -1 else Colors.NUMBERS[value % len(Colors.NUMBERS)]
+        elif value == -1 and bombs_visible:
+            color = Colors.BOMB
+        elif state == State.FLAG:
+            color = Colors.FLAG_POLYGON
+        else:
+            color = Colors.CLOSED_CELL
+        colors.append(color)
+    return [bytes(int(color[1 + 2 * channel:3 + 2 * channel], 16) for color in colors) for channel in range(3)]
+
+
+_PALETTES = {False: _get_palette(False), True: _get_palette(True)}
+_GRID_COLOR = bytes(int(Colors.FLAG_LINE[1 + 2 * channel:3 + 2 * channel], 16) for channel in range(3))
+
+
+def render_bitmap(field, view, cell_size, hints=(), bombs_visible=False):
+    """Нарисовать часть поля картинкой в формате PPM (P6).
+    Ячейки переводятся в цвета через bytes.translate и раскладываются по пикселям срезами,
+    без цикла по ячейкам, поэтому время зависит от количества строк, а не ячеек
+    :param field: Field - игровое поле
+    :param view: tuple of int - ячейки x0, y0, x1, y1 (правая и нижняя границы не входят)
+    :param cell_size: int - размер ячейки в пикселях
+    :param hints: iterable of int - индексы ячеек подсказки
+    :param bombs_visible: bool - показывать ли мины в закрытых ячейках
+    :return: bytes
+    """
+    x0, y0, x1, y1 = view
+    width, height = x1 - x0, y1 - y0
+    states, values = field.states, field.values
+    rows = [field.get_index(x0, y) for y in range(y0, y1)]
+    cells = width * height
+    state_codes = b''.join(bytes(states[row:row + width]) for row in rows)
+    value_codes = b''.join(values[row:row + width].tobytes() for row in rows).translate(_VALUE_TO_NIBBLE)
+    # Состояние и значение меньше 16, сдвиг состояния не выходит за свой байт
+    codes = bytearray(((int.from_bytes(state_codes, 'big') << 4) | int.from_bytes(value_codes, 'big'))
+                      .to_bytes(cells, 'big'))
+    for index in hints:
+        x, y = field.get_coordinates(index)
+        if x0 <= x < x1 and y0 <= y < y1 and codes[(y - y0) * width + x - x0] >> 4 == State.CLOSE:
+            codes[(y - y0) * width + x - x0] = _HINT_CODE
+    channels = [codes.translate(table) for table in _PALETTES[bool(bombs_visible)]]
+    grid = cell_size >= _GRID_MIN_CELL_SIZE
+    # Пиксели всех ячеек в одну строку: cell_size пикселей по 3 байта на ячейку
+    pixel = cell_size * 3
+    line = bytearray(cells * pixel)
+    for offset in range(cell_size):
+        for channel in range(3):
+            if grid and offset == 0:
+                line[channel::pixel] = _GRID_COLOR[channel:channel + 1] * cells
+            else:
+                line[offset * 3 + channel::pixel] = channels[channel]
+    row_size = width * pixel
+    grid_line = _GRID_COLOR * (width * cell_size)
+    body = []
+    for y in range(height):
+        row = bytes(line[y * row_size:(y + 1) * row_size])
+        if grid:
+            body.append(grid_line)
+            body.append(row * (cell_size - 1))
+        else:
+            body.append(row * cell_size)
+    header = 'P6 {} {} 255\n'.format(width * cell_size, height * cell_size).encode('ascii')
+    return header + b''.join(body)
+
+
+class BitmapRenderer(BaseRenderer):
+    """Отрисовщик поля одной картинкой на видимую область.
+    На холсте всего один элемент - изображение, которое целиком перерисовывается render_bitmap
+    при прокрутке и одним пакетом после изменений ячеек. Цифры заменены цветами Colors.NUMBERS
+    """
+    MIN_CELL_SIZE = 1
+    MAX_CELL_SIZE = 16
+
+    image_factory = None  # Функция создания изображения, по умолчанию Tkinter.PhotoImage
+
+    def __init__(self, canvas, cell_size):
+        """Инициализация отрисовщика
+        :param canvas: Canvas - холст для рисования
+        :param cell_size: int - размер ячейки в пикселях
+        """
+        super(BitmapRenderer, self).__init__(canvas, cell_size)
+        self.image = None
+        self._item = None
+
+    def _clear(self):
+        if self.image is None:  # Холст мог использоваться другим отрисовщиком
+            factory = self.image_factory
+            if factory is None:
+                try:
+                    from Tkinter import PhotoImage
+                except ImportError:
+                    from tkinter import PhotoImage
+                factory = PhotoImage
+            self.canvas.delete('all')
+            self.image = factory(master=self.canvas)
+            self._item = self.canvas.create_image(0, 0, image=self.image, anchor='nw')
+
+    def _show_view(self, old_view):
+        self._blit()
+
+    def show_bombs(self):
+        self.bombs_visible = True
+        self._blit()
+
+    def _redraw(self, indexes):
+        x0, y0, x1, y1 = self._view
+        field = self.field
+        for index in indexes:
+            x, y = field.get_coordinates(index)
+            if x0 <= x < x1 and y0 <= y < y1:
+                self._blit()
+                return
+
+    def _blit(self):
+        """Перерисовать изображение видимой области"""
+        x0, y0, x1, y1 = self._view
+        size = self.cell_size
+        if x1 <= x0 or y1 <= y0:
+            return
+        data = render_bitmap(self.field, self._view, size, self._hints, self.bombs_visible)
+        self.image.configure(width=(x1 - x0) * size, height=(y1 - y0) * size, data=data, format='PPM')
+        self.canvas.coords(self._item, x0 * size, y0 * size)
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""Журнал ходов и воспроизведение партий.
+
+Журнал - файл только для дописывания: заголовок LOG_MAGIC и версия, затем записи подряд.
+Первый байт записи - её вид:
+- GAME_RECORD - начало партии: размер поля, количество мин, seed, версия генератора и способ расстановки мин.
+  По этим данным поле партии восстанавливается заново, само поле в журнал не пишется;
+- Move.REVEAL, Move.FLAG, Move.CHORD - ход с координатами ячейки;
+- END_RECORD - конец партии: исход и количество ходов, по ним воспроизведение проверяется.
+Записи пишутся через буфер файла, без fsync после каждого хода. Чтение идёт потоком, блоками
+фиксированного размера, поэтому архив любого размера воспроизводится и проверяется в постоянной памяти.
+
+Пример запуска:
+    python replay.py games.mswl
+"""
+import argparse
+import json
+import struct
+import sys
+import time
+
+from entities import GENERATOR_VERSION, GameEngine, Move
+
+LOG_MAGIC = b'MSWL'
+LOG_VERSION = 1
+LOG_HEADER = struct.Struct('<4sB')
+
+GAME_RECORD = 0x80
+END_RECORD = 0x81
+
+# Записи журнала по виду (первому байту)
+RECORDS = {
+    # Вид, ширина, высота, количество мин, seed, версия генератора, способ расстановки мин, флаги
+    GAME_RECORD: struct.Struct('<BIIIqBBB'),
+    # Вид, исход партии, количество ходов
+    END_RECORD: struct.Struct('<BBI'),
+}
+MOVE_RECORD = struct.Struct('<BII')  # Вид хода (Move), координаты X и Y
+for _move in (Move.REVEAL, Move.FLAG, Move.CHORD):
+    RECORDS[_move] = MOVE_RECORD
+
+_HAS_SEED = 1  # Флаг записи партии: seed указан
+_MAX_RECORD_SIZE = max(record.size for record in RECORDS.values())
+
+
+class MoveLog(object):
+    """Запись журнала ходов. Партия подключается к журналу параметром log в GameEngine"""
+
+    def __init__(self, file, buffer_size=1 << 16, header=True):
+        """
+        :param file: str или файловый объект - путь к журналу (открывается на дописывание) или открытый
+            двоичный файл
+        :param buffer_size: int - размер буфера записи в байтах
+        :param header: bool - записать заголовок журнала, если файл пустой. Без заголовка пишутся
+            только записи, например, чтобы потом дописать их в общий журнал через append
+        """
+        self._own_file = isinstance(file, str)
+        self.file = open(file, 'ab', buffering=buffer_size) if self._own_file else file
+        if header and self.file.tell() == 0:
+            self.file.write(LOG_HEADER.pack(LOG_MAGIC, LOG_VERSION))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def start_game(self, engine):
+        """Записать начало партии
+        :param engine: GameEngine - партия
+        """
+        generator = GENERATOR_VERSION if engine.generator is None else engine.generator
+        self.file.write(RECORDS[GAME_RECORD].pack(
+            GAME_RECORD, engine.field.width, engine.field.height, engine.bombs, engine.seed or 0, generator,
+            engine.start, _HAS_SEED if engine.seed is not None else 0))
+
+    def record(self, move, x, y):
+        """Записать ход
+        :param move: int - вид хода (Move)
+        :param x: int - координата по X
+        :param y: int - координата по Y
+        """
+        self.file.write(MOVE_RECORD.pack(move, x, y))
+
+    def end_game(self, engine):
+        """Записать конец партии
+        :param engine: GameEngine - партия
+        """
+        self.file.write(RECORDS[END_RECORD].pack(END_RECORD, engine.status, engine.moves))
+
+    def append(self, data):
+        """Дописать готовые записи (например, журнал серии партий из другого процесса)
+        :param data: bytes - записи без заголовка журнала
+        """
+        self.file.write(data)
+
+    def flush(self):
+        """Сбросить буфер в файл (без fsync)"""
+        self.file.flush()
+
+    def close(self):
+        """Сбросить буфер и закрыть журнал, если он был открыт по пути"""
+        if self._own_file:
+            self.file.close()
+        else:
+            self.file.flush()
+
+
+def iter_records(file, chunk_size=1 << 20):
+    """Прочитать записи журнала потоком
+    :param file: str или файловый объект - путь к журналу или открытый двоичный файл
+    :param chunk_size: int - размер блока чтения в байтах
+    :return: iterator of tuple - записи журнала, первый элемент - вид записи
+    """
+    f = open(file, 'rb') if isinstance(file, str) else file
+    try:
+        header = f.read(LOG_HEADER.size)
+        if len(header) < LOG_HEADER.size or LOG_HEADER.unpack(header)[0] != LOG_MAGIC:
+            raise ValueError("Неизвестный формат журнала")
+        if LOG_HEADER.unpack(header)[1] > LOG_VERSION:
+            raise ValueError("Версия журнала %s не поддерживается" % LOG_HEADER.unpack(header)[1])
+        buffer, offset = b'', 0
+        while True:
+            if len(buffer) - offset < _MAX_RECORD_SIZE:
+                buffer, offset = buffer[offset:], 0
+                while len(buffer) < _MAX_RECORD_SIZE:
+                    chunk = f.read(chunk_size)
+                    if not chunk:
+                        break
+                    buffer += chunk
+                if not buffer:
+                    return
+            record = RECORDS.get(buffer[offset])
+            if record is None:
+                raise ValueError("Неизвестная запись журнала: %s" % buffer[offset])
+            if offset + record.size > len(buffer):
+                raise ValueError("Журнал обрезан")
+            yield record.unpack_from(buffer, offset)
+            offset += record.size
+    finally:
+        if f is not file:
+            f.close()
+
+
+class Replayer(object):
+    """Пошаговое воспроизведение партий из потока записей журнала"""
+
+    # Методы GameEngine по виду записи. Метод ищется у партии при каждом ходе, поэтому замеры (Instrumentation),
+    # которые подменяют методы класса, видят и ходы воспроизведения
+    MOVES = {
+        Move.REVEAL: 'reveal',
+        Move.FLAG: 'toggle_flag',
+        Move.CHORD: 'chord',
+    }
+
+    def __init__(self, records):
+        """
+        :param records: iterable of tuple - записи журнала (например, iter_records)
+        """
+        self._records = iter(records)
+        self._next_game = None  # Запись начала следующей партии, прочитанная во время ходов текущей
+        self.engine = None
+        self.expected = None  # Исход и количество ходов из записи конца партии
+
+    def next_game(self):
+        """Перейти к следующей партии журнала
+        :return: GameEngine - новая партия или None, если журнал закончился
+        """
+        record = self._next_game
+        self._next_game = None
+        while record is None or record[0] != GAME_RECORD:
+            record = next(self._records, None)
+            if record is None:
+                self.engine = None
+                return None
+        _, width, height, bombs, seed, generator, start, flags = record
+        self.engine = GameEngine(width=width, height=height, bombs=bombs, seed=seed if flags & _HAS_SEED else None,
+                                 generator=generator, start=start)
+        self.expected = None
+        return self.engine
+
+    def step(self):
+        """Сделать следующий ход текущей партии
+        :return: list of int - индексы изменившихся ячеек или None, если ходы партии закончились
+        """
+        if self.engine is None or self._next_game is not None:
+            return None
+        for record in self._records:
+            kind = record[0]
+            if kind == GAME_RECORD:
+                self._next_game = record
+                return None
+            if kind == END_RECORD:
+                self.expected = record[1:]
+                continue
+            return getattr(self.engine, self.MOVES[kind])(record[1], record[2])
+        return None
+
+    def is_valid(self):
+        """Совпадает ли воспроизведённая партия с записью конца партии
+        :return: bool или None, если записи конца партии не было
+        """
+        if self.expected is None:
+            return None
+        return (self.engine.status, self.engine.moves) == self.expected
+
+
+def replay(records):
+    """Воспроизвести все партии журнала с максимальной скоростью
+    :param records: iterable of tuple - записи журнала (например, iter_records)
+    :return: iterator of tuple - (партия GameEngine после последнего хода, совпала ли она с записью конца партии)
+    """
+    replayer = Replayer(records)
+    while replayer.next_game() is not None:
+        while replayer.step() is not None:
+            pass
+        yield replayer.engine, replayer.is_valid()
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Воспроизведение и проверка журнала партий сапёра")
+    parser.add_argument('log', help="путь к журналу")
+    parser.add_argument('--json', action='store_true', help="вывести результат в формате JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    started = time.time()
+    games = moves = invalid = unfinished = 0
+    for engine, valid in replay(iter_records(args.log)):
+        games += 1
+        moves += engine.moves
+        invalid += valid is False
+        unfinished += valid is None
+    elapsed = time.time() - started
+    summary = {
+        'games': games,
+        'moves': moves,
+        'invalid': invalid,
+        'unfinished': unfinished,
+        'seconds': elapsed,
+        'moves_per_second': moves / elapsed if elapsed else 0.0,
+    }
+    if args.json:
+        print(json.dumps(summary, sort_keys=True))
+    else:
+        print("Партий: {games}, ходов: {moves}, расхождений: {invalid}, не закончено: {unfinished}".format(**summary))
+        print("Время: {seconds:.2f} с, {moves_per_second:.0f} ходов/с".format(**summary))
+    return 1 if invalid else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
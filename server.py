@@ -0,0 +1,411 @@
+# -*- coding: utf-8 -*-
+"""Сервер общей партии: несколько игроков ходят на одном поле, зрители смотрят.
+
+Сервер на asyncio держит единственную партию GameEngine и применяет к ней ходы в порядке прихода.
+Изменённые ячейки копятся и раз в TICK секунд рассылаются всем клиентам одним сообщением DELTA,
+поэтому частые ходы и сотни зрителей не множат сообщения: на каждый такт одно сообщение,
+собранное один раз и отправленное всем одинаковыми байтами.
+
+Протокол двоичный, каждое сообщение - заголовок FRAME (вид, длина данных) и данные:
+- HELLO (клиент -> сервер) - сигнатура, версия протокола и роль клиента (Role);
+- MOVE (игрок -> сервер) - один или несколько ходов MOVE_RECORD подряд;
+- SNAPSHOT (сервер -> клиент) - состояние поля при подключении: SNAPSHOT_HEADER и сжатые zlib
+  состояния и значения ячеек. Значения закрытых ячеек не передаются, мины клиенту не видны;
+- DELTA (сервер -> клиент) - DELTA_HEADER и изменённые ячейки CELL_RECORD, большие изменения сжимаются zlib.
+
+Пример запуска:
+    python server.py --port 8765 --width 100 --height 100 --bombs 1500
+"""
+import argparse
+import asyncio
+import random
+import struct
+import sys
+import zlib
+from array import array
+
+from entities import Field, GameEngine, Move, Start, State, Status
+from replay import MoveLog
+
+PROTOCOL_MAGIC = b'MSWN'
+PROTOCOL_VERSION = 1
+
+FRAME = struct.Struct('<BI')  # Вид сообщения, длина данных
+
+HELLO = 1
+MOVE = 2
+SNAPSHOT = 3
+DELTA = 4
+
+HELLO_RECORD = struct.Struct('<4sBB')  # Сигнатура, версия протокола, роль
+MOVE_RECORD = struct.Struct('<BII')  # Вид хода (Move), координаты X и Y
+# Ширина, высота, количество мин, исход партии, количество ходов
+SNAPSHOT_HEADER = struct.Struct('<IIIBI')
+# Исход партии, флаги (_COMPRESSED), количество ячеек
+DELTA_HEADER = struct.Struct('<BBI')
+CELL_RECORD = struct.Struct('<IBb')  # Индекс ячейки в буферах поля, состояние, значение
+
+TICK = 0.02  # Период рассылки изменений, с
+MAX_FRAME_SIZE = 1 << 20  # Наибольший размер сообщения клиента
+MAX_WRITE_BUFFER = 16 << 20  # Клиент, не успевающий читать больше этого, отключается
+
+_COMPRESSED = 1  # Флаг DELTA: ячейки сжаты zlib
+_INDEX_SIZE = 4  # Размер индекса ячейки в CELL_RECORD
+_INDEX_TYPECODE = 'I' if array('I').itemsize == _INDEX_SIZE else 'L'  # Тип array для индексов из CELL_RECORD
+_COMPRESS_THRESHOLD = 4096  # Изменения больше этого размера в байтах сжимаются
+# Значения закрытых ячеек (State.CLOSE, State.FLAG) в снимке заменяются нулями
+_OPEN_MASK_TABLE = bytes(0xFF if b == State.OPEN else 0 for b in range(256))
+
+
+class Role(object):
+    """Класс ролей клиента"""
+    PLAYER = 0
+    SPECTATOR = 1
+
+
+class ProtocolError(Exception):
+    """Ошибка протокола: неизвестное или повреждённое сообщение"""
+
+
+def pack_frame(kind, payload):
+    """Собрать сообщение
+    :param kind: int - вид сообщения
+    :param payload: bytes - данные
+    :return: bytes
+    """
+    return FRAME.pack(kind, len(payload)) + payload
+
+
+async def read_frame(reader):
+    """Прочитать сообщение
+    :param reader: asyncio.StreamReader
+    :return: tuple - (вид сообщения, данные) или None, если соединение закрыто
+    """
+    try:
+        header = await reader.readexactly(FRAME.size)
+        kind, size = FRAME.unpack(header)
+        if size > MAX_FRAME_SIZE:
+            raise ProtocolError("Сообщение слишком большое: %s" % size)
+        return kind, await reader.readexactly(size)
+    except asyncio.IncompleteReadError:
+        return None
+
+
+def _visible_values(field):
+    """Значения ячеек поля без рамки, значения закрытых ячеек заменены нулями
+    :param field: Field - поле
+    :return: tuple of bytes - (состояния, значения) по строкам
+    """
+    stride, width = field.stride, field.width
+    rows = range(stride + 1, stride * (field.height + 1), stride)
+    states = b''.join(bytes(field.states[row:row + width]) for row in rows)
+    values = b''.join(field.values[row:row + width].tobytes() for row in rows)
+    mask = int.from_bytes(states.translate(_OPEN_MASK_TABLE), 'big')
+    return states, (int.from_bytes(values, 'big') & mask).to_bytes(len(values), 'big')
+
+
+def encode_snapshot(engine):
+    """Собрать снимок партии для нового клиента
+    :param engine: GameEngine - партия
+    :return: bytes - данные сообщения SNAPSHOT
+    """
+    field = engine.field
+    states, values = _visible_values(field)
+    return (SNAPSHOT_HEADER.pack(field.width, field.height, engine.bombs, engine.status, engine.moves) +
+            zlib.compress(states + values))
+
+
+def decode_snapshot(payload):
+    """Разобрать снимок партии
+    :param payload: bytes - данные сообщения SNAPSHOT
+    :return: tuple - (поле Field с видимыми игроку ячейками, количество мин, исход партии, количество ходов)
+    """
+    width, height, bombs, status, moves = SNAPSHOT_HEADER.unpack_from(payload)
+    data = zlib.decompress(payload[SNAPSHOT_HEADER.size:])
+    cells = width * height
+    if len(data) != 2 * cells:
+        raise ProtocolError("Размер снимка не совпадает с размером поля")
+    stride = width + 2
+    size = stride * (height + 2)
+    states = bytearray([State.BORDER]) * size
+    values = bytearray(size)
+    for y in range(height):
+        row = (y + 1) * stride + 1
+        states[row:row + width] = data[y * width:(y + 1) * width]
+        values[row:row + width] = data[cells + y * width:cells + (y + 1) * width]
+    field_values = array('b')
+    field_values.frombytes(bytes(values))
+    return Field(width=width, height=height, values=field_values, states=states), bombs, status, moves
+
+
+def encode_delta(field, status, indexes):
+    """Собрать изменения ячеек. Передаётся текущее состояние ячеек, поэтому несколько изменений
+    одной ячейки за такт превращаются в одну запись
+    :param field: Field - поле
+    :param status: int - исход партии (Status)
+    :param indexes: iterable of int - индексы изменённых ячеек
+    :return: bytes - данные сообщения DELTA
+    """
+    states, values = field.states, field.values
+    pack = CELL_RECORD.pack
+    # Значение закрытой ячейки не передаётся, чтобы клиент не видел мины
+    cells = b''.join(pack(index, states[index], values[index] if states[index] == State.OPEN else 0)
+                     for index in indexes)
+    count = len(cells) // CELL_RECORD.size
+    if len(cells) > _COMPRESS_THRESHOLD:
+        return DELTA_HEADER.pack(status, _COMPRESSED, count) + zlib.compress(cells, 1)
+    return DELTA_HEADER.pack(status, 0, count) + cells
+
+
+def _delta_cells(payload):
+    """Исход партии и записи ячеек CELL_RECORD из данных сообщения DELTA
+    :param payload: bytes - данные сообщения DELTA
+    :return: tuple - (исход партии, bytes)
+    """
+    status, flags, count = DELTA_HEADER.unpack_from(payload)
+    cells = payload[DELTA_HEADER.size:]
+    if flags & _COMPRESSED:
+        cells = zlib.decompress(cells)
+    if len(cells) != count * CELL_RECORD.size:
+        raise ProtocolError("Размер изменений не совпадает с количеством ячеек")
+    return status, cells
+
+
+def decode_delta(payload):
+    """Разобрать изменения ячеек
+    :param payload: bytes - данные сообщения DELTA
+    :return: tuple - (исход партии, iterator of tuple (индекс, состояние, значение))
+    """
+    status, cells = _delta_cells(payload)
+    return status, CELL_RECORD.iter_unpack(cells)
+
+
+def decode_delta_columns(payload):
+    """Разобрать изменения ячеек по столбцам. Столбцы выделяются срезами байтов с шагом в длину записи,
+    без цикла по записям, и применяются к полю одним вызовом Field.set_cells
+    :param payload: bytes - данные сообщения DELTA
+    :return: tuple - (исход партии, array индексов, bytes состояний, bytes значений)
+    """
+    status, cells = _delta_cells(payload)
+    size = CELL_RECORD.size
+    index_bytes = bytearray(len(cells) // size * _INDEX_SIZE)
+    for n in range(_INDEX_SIZE):  # Байты индекса (little-endian) - первые в записи
+        index_bytes[n::_INDEX_SIZE] = cells[n::size]
+    indexes = array(_INDEX_TYPECODE, bytes(index_bytes))
+    if sys.byteorder == 'big':
+        indexes.byteswap()
+    return status, indexes, cells[_INDEX_SIZE::size], cells[_INDEX_SIZE + 1::size]
+
+
+class GameServer(object):
+    """Сервер одной общей партии"""
+
+    # Имена методов GameEngine по виду записи: метод берётся у партии во время хода, его может подменить Instrumentation
+    MOVES = {
+        Move.REVEAL: 'reveal',
+        Move.FLAG: 'toggle_flag',
+        Move.CHORD: 'chord',
+    }
+
+    def __init__(self, engine, tick=TICK):
+        """
+        :param engine: GameEngine - партия
+        :param tick: float - период рассылки изменений, с
+        """
+        self.engine = engine
+        self.tick = tick
+        self.clients = set()  # StreamWriter подключённых клиентов
+        self.server = None
+        self.received = 0  # Количество принятых ходов, в том числе не изменивших поле
+        self._handlers = set()  # Задачи обслуживания подключений
+        self._changed = set()  # Индексы ячеек, изменённых с последней рассылки
+        self._status = engine.status
+        self._broadcast_scheduled = None  # Отложенная рассылка (asyncio.TimerHandle)
+
+    async def start(self, host='127.0.0.1', port=0):
+        """Начать принимать подключения
+        :param host: str - адрес
+        :param port: int - порт, 0 - любой свободный
+        :return: int - порт сервера
+        """
+        self.server = await asyncio.start_server(self.handle_client, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        """Разослать последние изменения, отключить клиентов и остановить сервер"""
+        self.broadcast()
+        self.server.close()
+        for writer in list(self.clients):
+            writer.close()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+        if self._broadcast_scheduled is not None:  # Ходы, принятые во время отключения, рассылать уже некому
+            self._broadcast_scheduled.cancel()
+            self._broadcast_scheduled = None
+        await self.server.wait_closed()
+
+    def apply_moves(self, payload):
+        """Применить ходы игрока к партии
+        :param payload: bytes - записи MOVE_RECORD подряд
+        """
+        if len(payload) % MOVE_RECORD.size:
+            raise ProtocolError("Повреждённое сообщение с ходами")
+        engine, field = self.engine, self.engine.field
+        self.received += len(payload) // MOVE_RECORD.size
+        for move, x, y in MOVE_RECORD.iter_unpack(payload):
+            if move not in self.MOVES:
+                raise ProtocolError("Неизвестный ход: %s" % move)
+            if x < field.width and y < field.height:  # Ходы мимо поля пропускаются
+                self._changed.update(getattr(engine, self.MOVES[move])(x, y))
+        if (self._changed or engine.status != self._status) and self._broadcast_scheduled is None:
+            self._broadcast_scheduled = asyncio.get_running_loop().call_later(self.tick, self.broadcast)
+
+    def broadcast(self):
+        """Разослать накопленные изменения всем клиентам одним сообщением. Отложенная рассылка, если она есть,
+        отменяется: изменения уже разосланы
+        """
+        if self._broadcast_scheduled is not None:
+            self._broadcast_scheduled.cancel()
+            self._broadcast_scheduled = None
+        if not self._changed and self.engine.status == self._status:
+            return
+        self._status = self.engine.status
+        frame = pack_frame(DELTA, encode_delta(self.engine.field, self._status, self._changed))
+        self._changed = set()
+        for writer in list(self.clients):
+            self.send(writer, frame)
+
+    def send(self, writer, frame):
+        """Отправить сообщение клиенту без ожидания. Клиент, который не успевает читать, отключается:
+        переподключившись, он получит свежий снимок вместо накопившихся изменений
+        :param writer: asyncio.StreamWriter
+        :param frame: bytes - сообщение
+        """
+        if writer.transport.get_write_buffer_size() > MAX_WRITE_BUFFER:
+            self.clients.discard(writer)
+            writer.close()
+            return
+        writer.write(frame)
+
+    async def handle_client(self, reader, writer):
+        """Обслужить подключение клиента"""
+        task = asyncio.current_task()
+        self._handlers.add(task)
+        try:
+            frame = await read_frame(reader)
+            if frame is None or frame[0] != HELLO or len(frame[1]) != HELLO_RECORD.size:
+                return
+            magic, version, role = HELLO_RECORD.unpack(frame[1])
+            if magic != PROTOCOL_MAGIC or version > PROTOCOL_VERSION:
+                return
+            # Снимок включает все изменения, ещё не разосланные, поэтому сначала рассылаем их остальным
+            self.broadcast()
+            writer.write(pack_frame(SNAPSHOT, encode_snapshot(self.engine)))
+            self.clients.add(writer)
+            while True:
+                frame = await read_frame(reader)
+                if frame is None:
+                    return
+                kind, payload = frame
+                if kind != MOVE or role != Role.PLAYER:
+                    raise ProtocolError("Неожиданное сообщение: %s" % kind)
+                self.apply_moves(payload)
+        except (ProtocolError, ConnectionError):
+            pass
+        finally:
+            self.clients.discard(writer)
+            self._handlers.discard(task)
+            writer.close()
+
+
+class Client(object):
+    """Клиент общей партии. Держит копию поля, которую обновляет по сообщениям сервера"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.field = None  # Копия поля: видимые игроку ячейки
+        self.bombs = 0
+        self.status = Status.PLAY
+        self.moves = 0
+
+    @classmethod
+    async def connect(cls, host, port, role=Role.PLAYER):
+        """Подключиться к серверу и получить снимок партии
+        :param host: str - адрес сервера
+        :param port: int - порт сервера
+        :param role: int - роль (Role)
+        :return: Client
+        """
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(pack_frame(HELLO, HELLO_RECORD.pack(PROTOCOL_MAGIC, PROTOCOL_VERSION, role)))
+        client = cls(reader, writer)
+        if await client.receive() is None:
+            raise ProtocolError("Сервер закрыл соединение")
+        return client
+
+    def send_moves(self, moves):
+        """Отправить ходы одним сообщением
+        :param moves: iterable of tuple - (вид хода Move, x, y)
+        """
+        self.writer.write(pack_frame(MOVE, b''.join(MOVE_RECORD.pack(*move) for move in moves)))
+
+    async def receive(self):
+        """Получить одно сообщение сервера и применить его к копии поля
+        :return: list of int - индексы изменённых ячеек (для снимка - пустой список) или None,
+            если соединение закрыто
+        """
+        frame = await read_frame(self.reader)
+        if frame is None:
+            return None
+        kind, payload = frame
+        if kind == SNAPSHOT:
+            self.field, self.bombs, self.status, self.moves = decode_snapshot(payload)
+            return []
+        if kind == DELTA:
+            self.status, indexes, states, values = decode_delta_columns(payload)
+            self.field.set_cells(indexes, states, values)
+            return indexes.tolist()
+        raise ProtocolError("Неизвестное сообщение: %s" % kind)
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Сервер общей партии сапёра")
+    parser.add_argument('--host', default='127.0.0.1', help="адрес")
+    parser.add_argument('--port', type=int, default=8765, help="порт")
+    parser.add_argument('--width', type=int, default=30, help="ширина поля")
+    parser.add_argument('--height', type=int, default=16, help="высота поля")
+    parser.add_argument('--bombs', type=int, default=99, help="количество мин")
+    parser.add_argument('--seed', type=int, help="seed партии, по умолчанию случайный")
+    parser.add_argument('--log', help="дописывать ходы партии в журнал")
+    return parser.parse_args(argv)
+
+
+async def serve(args):
+    seed = random.randrange(2 ** 32) if args.seed is None else args.seed
+    log = MoveLog(args.log) if args.log else None
+    engine = GameEngine(width=args.width, height=args.height, bombs=args.bombs, seed=seed, start=Start.SAFE, log=log)
+    server = GameServer(engine)
+    port = await server.start(args.host, args.port)
+    print("Сервер слушает {}:{}, seed {}".format(args.host, port, seed))
+    try:
+        await server.server.serve_forever()
+    finally:
+        if log is not None:
+            log.close()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""Пакетное моделирование партий без интерфейса.
+
+Пример запуска:
+    python simulate.py --games 1000 --width 30 --height 16 --bombs 99 --strategy simple --workers 4
+
+Партия с номером n всегда играется с seed + n, поэтому результаты не зависят от количества процессов.
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import random
+import struct
+import sys
+import time
+import weakref
+
+from entities import GameEngine, Start, State, Status
+from replay import MoveLog
+from solver import Solver
+
+
+def _flag_remaining_bombs(engine):
+    """Если все закрытые ячейки - мины, пометить их флагами (это завершает партию победой)
+    :param engine: GameEngine - игра
+    :return: bool - True если флаги были расставлены
+    """
+    field = engine.field
+    stats = field.stats()
+    if stats['closed'] != stats['bombs']:
+        return False
+    for cell in field.get_closed_cells():
+        if cell.state == State.CLOSE:
+            engine.toggle_flag(cell.x, cell.y)
+    return True
+
+
+def _random_closed_cell(field, rnd):
+    """Выбрать случайную закрытую ячейку без флага
+    :param field: Field - поле
+    :param rnd: random.Random - генератор случайных чисел
+    :return: Cell - ячейка
+    """
+    for _ in range(64):  # Пока закрытых ячеек много, быстрее угадать случайную
+        cell = field.get_cell(rnd.randrange(field.width), rnd.randrange(field.height))
+        if cell.state == State.CLOSE:
+            return cell
+    return rnd.choice([cell for cell in field.get_closed_cells() if cell.state == State.CLOSE])
+
+
+def random_strategy(engine, rnd):
+    """Стратегия: открывать случайные закрытые ячейки
+    :param engine: GameEngine - игра
+    :param rnd: random.Random - генератор случайных чисел
+    """
+    if not _flag_remaining_bombs(engine):
+        cell = _random_closed_cell(engine.field, rnd)
+        engine.reveal(cell.x, cell.y)
+
+
+def simple_strategy(engine, rnd):
+    """Стратегия: простые выводы по одной ячейке, если выводов нет - случайный ход.
+    Если закрытых соседей у числа столько же, сколько мин рядом - все они мины.
+    Если флагов у числа уже столько же, сколько мин рядом - остальные соседи безопасны (аккорд).
+    :param engine: GameEngine - игра
+    :param rnd: random.Random - генератор случайных чисел
+    """
+    if _flag_remaining_bombs(engine):
+        return
+    field = engine.field
+    for cell in field.get_copy_cells_list():
+        if cell.state != State.OPEN or cell.value <= 0:
+            continue
+        adjacent = field.get_adjacent_cells(cell.x, cell.y)
+        closed = [c for c in adjacent if c.state == State.CLOSE]
+        if not closed:
+            continue
+        flags = len([c for c in adjacent if c.state == State.FLAG])
+        if flags == cell.value:
+            engine.chord(cell.x, cell.y)
+            return
+        if flags + len(closed) == cell.value:
+            for closed_cell in closed:
+                engine.toggle_flag(closed_cell.x, closed_cell.y)
+            return
+    random_strategy(engine, rnd)
+
+
+# Решатели партий для стратегии solver_strategy, живут пока жива партия
+_solvers = weakref.WeakKeyDictionary()
+
+
+def solver_strategy(engine, rnd):
+    """Стратегия: открыть все ячейки, безопасность которых доказывает решатель.
+    Если таких нет - открыть ячейку с наименьшей вероятностью мины
+    :param engine: GameEngine - игра
+    :param rnd: random.Random - генератор случайных чисел
+    """
+    if _flag_remaining_bombs(engine):
+        return
+    field = engine.field
+    solver = _solvers.get(engine)
+    if solver is None:
+        solver = _solvers[engine] = Solver(field)
+    solution = solver.solve()
+    if solution.safe:
+        for index in sorted(solution.safe):
+            solver.update(engine.reveal(*field.get_coordinates(index)))
+        return
+    index = None
+    if solution.probabilities:
+        index = min(sorted(solution.probabilities), key=solution.probabilities.get)
+    if index is None or solution.probabilities[index] > solution.interior_probability:
+        # Ячейка не на границе открытой области: любая закрытая, о которой решатель ничего не знает
+        for _ in range(64):
+            cell = _random_closed_cell(field, rnd)
+            if cell.index not in solution.probabilities and cell.index not in solution.mines:
+                index = cell.index
+                break
+        else:
+            if index is None:
+                # Случайные ячейки оказались минами: первая по порядку закрытая ячейка, о которой
+                # не известно, что в ней мина
+                closed = [cell.index for cell in field.get_closed_cells() if cell.state == State.CLOSE]
+                index = next((i for i in closed if i not in solution.mines), closed[0])
+    solver.update(engine.reveal(*field.get_coordinates(index)))
+
+
+# Доступные стратегии: функция делает один ход в переданной игре
+STRATEGIES = {
+    'random': random_strategy,
+    'simple': simple_strategy,
+    'solver': solver_strategy,
+}
+
+# Способы расстановки мин
+STARTS = {
+    'random': Start.RANDOM,
+    'safe': Start.SAFE,
+    'no-guess': Start.NO_GUESS,
+}
+
+
+def play_game(seed, width, height, bombs, strategy, start=Start.RANDOM, log=None):
+    """Сыграть одну партию
+    :param seed: int - число для расстановки мин и случайных ходов стратегии
+    :param width: int - ширина поля
+    :param height: int - высота поля
+    :param bombs: int - количество мин
+    :param strategy: callable - стратегия
+    :param start: int - способ расстановки мин (Start)
+    :param log: MoveLog - журнал, в который записывается партия
+    :return: tuple - (seed, исход партии, количество ходов, количество открытых ячеек)
+    """
+    engine = GameEngine(width=width, height=height, bombs=bombs, seed=seed, start=start, log=log)
+    rnd = random.Random(seed)
+    while not engine.is_over():
+        strategy(engine, rnd)
+    return seed, engine.status, engine.moves, engine.field.stats()['opened']
+
+
+# Компактная запись результата партии для передачи из процесса: seed, исход, ходы, открытые ячейки
+RESULT_STRUCT = struct.Struct('<qBII')
+
+
+def play_chunk(task):
+    """Сыграть серию партий в процессе-обработчике
+    :param task: tuple - (первый seed, количество партий, ширина, высота, мины, название стратегии,
+        способ расстановки мин, записывать ли журнал ходов)
+    :return: tuple - (упакованные результаты партий (RESULT_STRUCT подряд), записи журнала или None)
+    """
+    first_seed, games, width, height, bombs, strategy_name, start, logged = task
+    strategy = STRATEGIES[strategy_name]
+    pack = RESULT_STRUCT.pack
+    buffer = io.BytesIO() if logged else None
+    log = MoveLog(buffer, header=False) if logged else None
+    results = b''.join(pack(*play_game(seed, width, height, bombs, strategy, start, log))
+                       for seed in range(first_seed, first_seed + games))
+    return results, buffer.getvalue() if logged else None
+
+
+def run_games(seed, games, width, height, bombs, strategy_name, workers=1, chunk_size=64, start=Start.RANDOM,
+              log=None):
+    """Сыграть партии с seed, seed + 1, ..., seed + games - 1.
+    При workers > 1 партии делятся на серии по chunk_size и раздаются пулу процессов,
+    результаты приходят по мере готовности серий (порядок партий не сохраняется).
+    Журнал серии собирается в памяти процесса-обработчика и дописывается в общий журнал целиком.
+    :param seed: int - seed первой партии
+    :param games: int - количество партий
+    :param width: int - ширина поля
+    :param height: int - высота поля
+    :param bombs: int - количество мин
+    :param strategy_name: str - название стратегии из STRATEGIES
+    :param workers: int - количество процессов
+    :param chunk_size: int - количество партий в одной серии
+    :param start: int - способ расстановки мин (Start)
+    :param log: MoveLog - журнал, в который записываются партии
+    :return: iterator of tuple - результаты play_game
+    """
+    tasks = [(first, min(chunk_size, seed + games - first), width, height, bombs, strategy_name, start,
+              log is not None)
+             for first in range(seed, seed + games, chunk_size)]
+    pool = multiprocessing.Pool(workers) if workers > 1 else None
+    try:
+        chunks = pool.imap_unordered(play_chunk, tasks) if pool else map(play_chunk, tasks)
+        for results, records in chunks:
+            if records:
+                log.append(records)
+            for result in RESULT_STRUCT.iter_unpack(results):
+                yield result
+    finally:
+        if pool:
+            pool.terminate()
+            pool.join()
+
+
+def summarize(results, started):
+    """Собрать статистику по результатам партий. Результаты обрабатываются по мере поступления
+    :param results: iterable of tuple - результаты play_game
+    :param started: float - время начала моделирования (time.time())
+    :return: dict - статистика
+    """
+    games = wins = moves = 0
+    for _, status, game_moves, _ in results:
+        games += 1
+        wins += status == Status.WIN
+        moves += game_moves
+    elapsed = time.time() - started
+    return {
+        'games': games,
+        'wins': wins,
+        'losses': games - wins,
+        'win_rate': float(wins) / games if games else 0.0,
+        'avg_moves': float(moves) / games if games else 0.0,
+        'seconds': elapsed,
+        'games_per_second': games / elapsed if elapsed else 0.0,
+    }
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Пакетное моделирование партий сапёра")
+    parser.add_argument('--games', type=int, default=100, help="количество партий")
+    parser.add_argument('--width', type=int, default=9, help="ширина поля")
+    parser.add_argument('--height', type=int, default=9, help="высота поля")
+    parser.add_argument('--bombs', type=int, default=10, help="количество мин")
+    parser.add_argument('--seed', type=int, default=0, help="seed первой партии, у партии i seed + i")
+    parser.add_argument('--strategy', choices=sorted(STRATEGIES), default='simple', help="стратегия игры")
+    parser.add_argument('--start', choices=sorted(STARTS), default='random',
+                        help="расстановка мин: сразу, после первого хода или без угадывания")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="количество процессов (0 - по количеству ядер)")
+    parser.add_argument('--chunk-size', type=int, default=64, help="количество партий в задании процесса")
+    parser.add_argument('--log', help="дописать ходы партий в журнал (см. replay.py)")
+    parser.add_argument('--json', action='store_true', help="вывести результат в формате JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    workers = args.workers or multiprocessing.cpu_count()
+    started = time.time()
+    log = MoveLog(args.log) if args.log else None
+    try:
+        results = run_games(args.seed, args.games, args.width, args.height, args.bombs, args.strategy,
+                            workers=workers, chunk_size=args.chunk_size, start=STARTS[args.start], log=log)
+        summary = summarize(results, started)
+    finally:
+        if log:
+            log.close()
+    summary['workers'] = workers
+    if args.json:
+        print(json.dumps(summary, sort_keys=True))
+    else:
+        print("Партий: {games}, побед: {wins}, поражений: {losses} ({win_rate:.1%})".format(**summary))
+        print("Ходов в среднем: {avg_moves:.1f}".format(**summary))
+        print("Время: {seconds:.2f} с, {games_per_second:.1f} партий/с, процессов: {workers}".format(**summary))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
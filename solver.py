@@ -0,0 +1,608 @@
+# -*- coding: utf-8 -*-
+"""Логический решатель позиции: безопасные ячейки, мины и вероятности мин.
+
+Решатель видит только то, что видит игрок: открытые ячейки, их значения и общее количество мин.
+Флаги игрока не учитываются, решатель ведёт собственный список найденных мин.
+Выводы делаются в три этапа:
+1. по одной ячейке: если мин рядом с числом не осталось - соседи безопасны, если неизвестных соседей
+   столько же, сколько оставшихся мин - все они мины;
+2. по парам ограничений: сравниваются множества неизвестных соседей двух чисел;
+3. точный перебор расстановок на границе открытой области, разбитой на независимые компоненты.
+   Ячейки, которые во всех расстановках компоненты безопасны (или заняты миной), тоже становятся выводами,
+   а по расстановкам с учётом общего количества мин считаются вероятности мин.
+Решатель инкрементальный: после хода пересчитываются только ограничения рядом с изменившимися ячейками,
+а компоненты границы пересобираются и перебираются заново, только если их ограничения изменились.
+Вероятности считаются лениво - при первом обращении к ним в результате решения.
+
+Здесь же генератор полей, которые решаются без угадывания (plant_no_guess_bombs).
+"""
+import math
+import random
+import re
+
+from entities import GENERATOR_VERSION, Field, State
+
+# Таблицы для bytes.translate при поиске границы открытой области: байт 1 в закрытых ячейках (флаги
+# игрока решатель не учитывает), в открытых ячейках и в ячейках со значением от 1 до 8
+_CLOSED_MASK_TABLE = bytes(1 if b in (State.CLOSE, State.FLAG) else 0 for b in range(256))
+_OPEN_MASK_TABLE = bytes(1 if b == State.OPEN else 0 for b in range(256))
+_NUMBER_MASK_TABLE = bytes(1 if 1 <= b <= 8 else 0 for b in range(256))
+
+
+def _log_binomial(n, k):
+    """Натуральный логарифм биномиального коэффициента
+    :param n: int
+    :param k: int
+    :return: float - логарифм или None, если k вне диапазона
+    """
+    if k < 0 or k > n:
+        return None
+    return math.lgamma(n + 1) - math.lgamma(k + 1) - math.lgamma(n - k + 1)
+
+
+def _convolve(first, second):
+    """Свёртка распределений количества мин
+    :param first: dict - количество мин -> количество расстановок
+    :param second: dict - количество мин -> количество расстановок
+    :return: dict
+    """
+    result = {}
+    for a, count_a in first.items():
+        for b, count_b in second.items():
+            result[a + b] = result.get(a + b, 0) + count_a * count_b
+    return result
+
+
+class Solution(object):
+    """Результат решения позиции.
+    safe и mines вычислены сразу, вероятности - при первом обращении
+    """
+    EXACT_COMPONENTS_LIMIT = 10  # При большем количестве компонент они взвешиваются независимо
+
+    def __init__(self, safe, mines, components, solutions, estimates, remaining_mines, unknown_count):
+        """
+        :param safe: set of int - индексы закрытых ячеек, в которых точно нет мин
+        :param mines: set of int - индексы ячеек, в которых точно есть мины
+        :param components: dict - номер компоненты границы -> (ячейки, числа)
+        :param solutions: dict - номер перебранной компоненты -> расстановки мин
+        :param estimates: dict - оценки вероятностей для ячеек слишком больших компонент
+        :param remaining_mines: int - количество мин, положение которых неизвестно
+        :param unknown_count: int - количество закрытых ячеек, о которых ничего не известно
+        """
+        self.safe = safe
+        self.mines = mines
+        self._components = components
+        self._solutions = solutions
+        self._estimates = estimates
+        self._remaining_mines = remaining_mines
+        self._unknown_count = unknown_count
+        self._probabilities = None
+        self._interior_probability = None
+
+    @property
+    def probabilities(self):
+        """Вероятности мин в ячейках границы открытой области: dict индекс -> вероятность"""
+        if self._probabilities is None:
+            self._compute()
+        return self._probabilities
+
+    @property
+    def interior_probability(self):
+        """Вероятность мины в любой закрытой ячейке не на границе открытой области"""
+        if self._probabilities is None:
+            self._compute()
+        return self._interior_probability
+
+    def get_probability(self, index):
+        """Вероятность мины в закрытой ячейке
+        :param index: int - индекс ячейки
+        :return: float
+        """
+        if index in self.mines:
+            return 1.0
+        if index in self.safe:
+            return 0.0
+        return self.probabilities.get(index, self.interior_probability)
+
+    def _compute(self):
+        """Посчитать вероятности по расстановкам компонент"""
+        self._components = [(self._components[number][0], solutions) for number, solutions in self._solutions.items()]
+        probabilities = dict(self._estimates)
+        remaining = self._remaining_mines - int(round(sum(self._estimates.values())))
+        unknown = self._unknown_count - len(self._estimates)
+        interior = unknown - sum(len(cells) for cells, _ in self._components)
+        interior_probability = None
+        # Оценки больших компонент делают количество оставшихся мин приблизительным, точный расчёт с ним
+        # может оказаться противоречивым
+        if not self._estimates and len(self._components) <= self.EXACT_COMPONENTS_LIMIT:
+            interior_probability = self._compute_exact(probabilities, remaining, interior)
+        if interior_probability is None:
+            interior_probability = self._compute_independent(probabilities, remaining, unknown, interior)
+        self._probabilities = probabilities
+        self._interior_probability = min(1.0, max(0.0, interior_probability))
+
+    def _compute_exact(self, probabilities, remaining, interior):
+        """Точное взвешивание: расстановка границы с k минами имеет вес C(interior, remaining - k)
+        :return: float - вероятность мины вне границы или None, если позиция противоречива
+        """
+        distributions = [dict((k, value[0]) for k, value in solutions.items()) for _, solutions in self._components]
+        # Свёртки распределений всех компонент левее и правее текущей
+        prefix = [{0: 1}]
+        for distribution in distributions:
+            prefix.append(_convolve(prefix[-1], distribution))
+        suffix = [{0: 1}]
+        for distribution in reversed(distributions):
+            suffix.append(_convolve(suffix[-1], distribution))
+        suffix.reverse()
+
+        log_weights = dict((k, _log_binomial(interior, remaining - k)) for k in prefix[-1])
+        known = [w for w in log_weights.values() if w is not None]
+        if not known:  # Позиция противоречива (например, неверно указано количество мин)
+            return None
+        top = max(known)
+        weights = dict((k, math.exp(w - top)) for k, w in log_weights.items() if w is not None)
+        total = sum(count * weights.get(k, 0.0) for k, count in prefix[-1].items())
+        interior_mines = sum(count * weights.get(k, 0.0) * (remaining - k) for k, count in prefix[-1].items())
+
+        for n, (cells, solutions) in enumerate(self._components):
+            others = _convolve(prefix[n], suffix[n + 1])
+            numerators = [0.0] * len(cells)
+            for k, (_, per_cell) in solutions.items():
+                weight = sum(count * weights.get(k + other, 0.0) for other, count in others.items())
+                for i, mines in enumerate(per_cell):
+                    numerators[i] += mines * weight
+            for cell, numerator in zip(cells, numerators):
+                probabilities[cell] = numerator / total
+        return interior_mines / total / interior if interior else 0.0
+
+    def _compute_independent(self, probabilities, remaining, unknown, interior):
+        """Приближённое взвешивание для большого количества компонент: каждая компонента взвешивается
+        отдельно, расстановка с k минами имеет вес (d / (1 - d)) ** k, где d - плотность оставшихся мин
+        :return: float - вероятность мины вне границы
+        """
+        density = min(max(float(remaining) / unknown, 1e-9), 1 - 1e-9) if unknown else 0.5
+        ratio = density / (1 - density)
+        expected = 0.0
+        for cells, solutions in self._components:
+            total = mines_total = 0.0
+            numerators = [0.0] * len(cells)
+            for k, (count, per_cell) in solutions.items():
+                weight = ratio ** k
+                total += count * weight
+                mines_total += k * count * weight
+                for i, mines in enumerate(per_cell):
+                    numerators[i] += mines * weight
+            if not total:
+                continue
+            expected += mines_total / total
+            for cell, numerator in zip(cells, numerators):
+                probabilities[cell] = numerator / total
+        return (remaining - expected) / interior if interior else 0.0
+
+
+class Solver(object):
+    """Инкрементальный решатель позиции на поле"""
+    MAX_COMPONENT_SIZE = 32  # Компоненты большего размера не перебираются, вероятности в них оцениваются
+    # Если за ход изменилось больше 1/RESCAN_RATIO ячеек поля, граница ищется заново по всему полю:
+    # это быстрее, чем перебирать соседей каждой изменившейся ячейки
+    RESCAN_RATIO = 64
+
+    def __init__(self, field):
+        """Инициализация решателя. Ограничения строятся по числам на границе открытой области
+        :param field: Field - игровое поле
+        """
+        self.field = field
+        self.mines = set()
+        self.safe = set()
+        self._constraints = {}  # Индекс открытого числа -> (frozenset неизвестных соседей, оставшиеся мины)
+        self._changed = set()  # Числа, ограничения которых изменились после последней сборки компонент
+        self._components = {}  # Номер компоненты -> (ячейки, числа)
+        self._component_of = {}  # Число -> номер компоненты
+        self._solutions = {}  # Номер компоненты -> расстановки мин
+        self._estimates = {}  # Номер слишком большой компоненты -> оценки вероятностей
+        self._next_component = 0
+        self._touched = set(self._find_frontier())
+
+    def _find_frontier(self):
+        """Найти открытые числа, у которых есть закрытые соседи. Поиск выполняется операциями над байтами
+        всего поля, без цикла по ячейкам, поэтому занимает миллисекунды даже на больших полях
+        :return: list of int - индексы чисел
+        """
+        field = self.field
+        states, size = bytes(field.states), len(field.states)
+        if State.OPEN not in states:  # Новое поле
+            return []
+        closed = int.from_bytes(states.translate(_CLOSED_MASK_TABLE), 'little')
+        near_closed = 0  # Байт 1 в ячейках, у которых есть закрытый сосед
+        for offset in field.neighbor_offsets:
+            near_closed |= closed >> (8 * offset) if offset > 0 else closed << (-8 * offset)
+        numbers = (int.from_bytes(states.translate(_OPEN_MASK_TABLE), 'little') &
+                   int.from_bytes(field.values.tobytes().translate(_NUMBER_MASK_TABLE), 'little'))
+        frontier = (near_closed & numbers).to_bytes(size, 'little')
+        return [match.start() for match in re.finditer(b'\x01', frontier)]
+
+    def update(self, indexes):
+        """Сообщить решателю об изменившихся ячейках (например, результат GameEngine.reveal)
+        :param indexes: list of int - индексы изменившихся ячеек
+        """
+        offsets, states = self.field.neighbor_offsets, self.field.states
+        touched, safe = self._touched, self.safe
+        if len(indexes) * self.RESCAN_RATIO > len(states):
+            # Пересчитываются числа новой границы и все прежние ограничения: у них могли открыться соседи
+            touched.update(self._find_frontier())
+            touched.update(self._constraints)
+            self.safe = set(index for index in safe if states[index] != State.OPEN)
+            return
+        for index in indexes:
+            touched.add(index)
+            touched.update(index + offset for offset in offsets)
+            if states[index] == State.OPEN:
+                safe.discard(index)
+
+    def solve(self):
+        """Решить позицию, пересчитав только затронутые с прошлого вызова ограничения
+        :return: Solution
+        """
+        queue = []
+        touched, self._touched = self._touched, set()
+        for index in touched:
+            if self._rebuild(index):
+                queue.append(index)
+        while True:
+            self._propagate(queue)
+            for component in self._update_components():
+                self._enumerate_component(component, queue)
+            if not queue:
+                break
+
+        estimates = {}
+        for values in self._estimates.values():
+            estimates.update(values)
+        stats = self.field.stats()
+        return Solution(set(self.safe), set(self.mines), self._components.copy(), self._solutions.copy(), estimates,
+                        stats['bombs'] - len(self.mines), stats['closed'] - len(self.mines) - len(self.safe))
+
+    def _rebuild(self, index):
+        """Перестроить ограничение открытого числа
+        :param index: int - индекс ячейки
+        :return: bool - True если у ячейки есть ограничение
+        """
+        field = self.field
+        states, values = field.states, field.values
+        constraint = None
+        if states[index] == State.OPEN and values[index] > 0:
+            unknown, remaining = [], values[index]
+            for offset in field.neighbor_offsets:
+                adjacent = index + offset
+                state = states[adjacent]
+                if state == State.OPEN or state == State.BORDER or adjacent in self.safe:
+                    continue
+                if adjacent in self.mines:
+                    remaining -= 1
+                else:
+                    unknown.append(adjacent)
+            if unknown:
+                constraint = (frozenset(unknown), remaining)
+        if constraint != self._constraints.get(index):
+            self._changed.add(index)
+            if constraint is None:
+                del self._constraints[index]
+            else:
+                self._constraints[index] = constraint
+        return constraint is not None
+
+    def _mark(self, indexes, is_mine, queue):
+        """Запомнить найденные мины или безопасные ячейки и перестроить ограничения соседних чисел
+        :param indexes: iterable of int - индексы ячеек
+        :param is_mine: bool - мины это или безопасные ячейки
+        :param queue: list - очередь ограничений на проверку
+        """
+        known = self.mines if is_mine else self.safe
+        offsets = self.field.neighbor_offsets
+        for index in indexes:
+            if index in known:
+                continue
+            known.add(index)
+            for offset in offsets:
+                adjacent = index + offset
+                if adjacent in self._constraints and self._rebuild(adjacent):
+                    queue.append(adjacent)
+
+    def _propagate(self, queue):
+        """Выводы по одной ячейке и по парам ограничений до тех пор, пока есть новые выводы
+        :param queue: list of int - индексы чисел, ограничения которых нужно проверить
+        """
+        constraints, offsets = self._constraints, self.field.neighbor_offsets
+        while queue:
+            index = queue.pop()
+            if index not in constraints:
+                continue
+            unknown, remaining = constraints[index]
+            if remaining == 0:
+                self._mark(unknown, False, queue)
+                continue
+            if remaining == len(unknown):
+                self._mark(unknown, True, queue)
+                continue
+            # Ограничения, с которыми есть общие неизвестные ячейки, - числа по соседству с ними
+            others = set(cell + offset for cell in unknown for offset in offsets)
+            others.discard(index)
+            for other in others:
+                if other not in constraints:
+                    continue
+                other_unknown, other_remaining = constraints[other]
+                if not (unknown & other_unknown):
+                    continue
+                if self._compare(unknown, remaining, other_unknown, other_remaining, queue) or \
+                        self._compare(other_unknown, other_remaining, unknown, remaining, queue):
+                    queue.append(index)
+                    break
+
+    def _compare(self, first, first_remaining, second, second_remaining, queue):
+        """Вывод по паре ограничений: если мин во втором ограничении сверх первого столько же,
+        сколько ячеек только во втором, то эти ячейки - мины, а ячейки только в первом безопасны
+        :return: bool - удалось ли что-то вывести
+        """
+        only_second = second - first
+        if not only_second or second_remaining - first_remaining != len(only_second):
+            return False
+        self._mark(only_second, True, queue)
+        self._mark(first - second, False, queue)
+        return True
+
+    def _dissolve(self, number):
+        """Удалить компоненту вместе с её расстановками
+        :param number: int - номер компоненты
+        :return: list of int - числа компоненты
+        """
+        cells, keys = self._components.pop(number)
+        self._solutions.pop(number, None)
+        self._estimates.pop(number, None)
+        for key in keys:
+            if self._component_of.get(key) == number:
+                del self._component_of[key]
+        return keys
+
+    def _update_components(self):
+        """Пересобрать компоненты границы, затронутые изменившимися ограничениями
+        :return: list of int - номера новых компонент
+        """
+        constraints, offsets = self._constraints, self.field.neighbor_offsets
+        changed, self._changed = self._changed, set()
+        pending = []  # Числа, которые нужно заново распределить по компонентам
+        for key in changed:
+            if key in self._component_of:
+                pending.extend(self._dissolve(self._component_of[key]))
+            pending.append(key)
+        created, seen = [], set()
+        while pending:
+            start = pending.pop()
+            if start in seen or start not in constraints:
+                continue
+            seen.add(start)
+            stack, keys, cells = [start], [start], set()
+            while stack:
+                key = stack.pop()
+                for cell in constraints[key][0]:
+                    if cell in cells:
+                        continue
+                    cells.add(cell)
+                    for offset in offsets:
+                        other = cell + offset
+                        if other in seen or other not in constraints or cell not in constraints[other][0]:
+                            continue
+                        if other in self._component_of:  # Компонента слилась с другой или распалась
+                            pending.extend(self._dissolve(self._component_of[other]))
+                        seen.add(other)
+                        keys.append(other)
+                        stack.append(other)
+            number = self._next_component
+            self._next_component += 1
+            self._components[number] = (sorted(cells), keys)
+            for key in keys:
+                self._component_of[key] = number
+            created.append(number)
+        return created
+
+    def _enumerate_component(self, number, queue):
+        """Перебрать все расстановки мин в компоненте. Ячейки, которые во всех расстановках
+        безопасны или заняты миной, становятся выводами
+        :param number: int - номер компоненты
+        :param queue: list - очередь ограничений на проверку
+        """
+        if number not in self._components:
+            return
+        cells, keys = self._components[number]
+        constraints = self._constraints
+        if len(cells) > self.MAX_COMPONENT_SIZE:
+            # Слишком большая компонента: оценка по плотности оставшихся мин в ограничениях
+            estimates = {}
+            for key in keys:
+                unknown, remaining = constraints[key]
+                density = float(remaining) / len(unknown)
+                for cell in unknown:
+                    estimates[cell] = max(estimates.get(cell, 0.0), density)
+            self._estimates[number] = estimates
+            return
+        position = dict((cell, n) for n, cell in enumerate(cells))
+        needed = [constraints[key][1] for key in keys]
+        free = [len(constraints[key][0]) for key in keys]
+        cell_constraints = [[] for _ in cells]
+        for n, key in enumerate(keys):
+            for cell in constraints[key][0]:
+                cell_constraints[position[cell]].append(n)
+        solutions = {}
+        assignment = [0] * len(cells)
+
+        def search(n, mines):
+            if n == len(cells):
+                solution = solutions.setdefault(mines, [0, [0] * len(cells)])
+                solution[0] += 1
+                per_cell = solution[1]
+                for i, value in enumerate(assignment):
+                    per_cell[i] += value
+                return
+            for value in (0, 1):
+                valid = True
+                for c in cell_constraints[n]:
+                    needed[c] -= value
+                    free[c] -= 1
+                    if needed[c] < 0 or needed[c] > free[c]:
+                        valid = False
+                if valid:
+                    assignment[n] = value
+                    search(n + 1, mines + value)
+                for c in cell_constraints[n]:
+                    needed[c] += value
+                    free[c] += 1
+
+        search(0, 0)
+        self._solutions[number] = solutions
+        total = sum(count for count, _ in solutions.values())
+        if not total:
+            return
+        for i, cell in enumerate(cells):
+            mines = sum(per_cell[i] for _, per_cell in solutions.values())
+            if mines == 0:
+                self._mark([cell], False, queue)
+            elif mines == total:
+                self._mark([cell], True, queue)
+
+
+# Сколько раз подряд можно безуспешно переносить мину внутри границы открытой области, см. _repair
+FRONTIER_REPAIRS = 8
+
+
+def _solve_from(field, solver, start):
+    """Открывать ячейки, безопасность которых доказывает решатель, пока выводы не кончатся
+    :param field: Field - поле
+    :param solver: Solver - решатель этого поля
+    :param start: int - индекс ячейки первого хода (открывается, если ещё закрыта)
+    :return: Solution - решение позиции, в которой решатель застрял (или поле открыто)
+    """
+    states = field.states
+    if states[start] == State.CLOSE:
+        solver.update(field.reveal(*field.get_coordinates(start)))
+    while True:
+        solution = solver.solve()
+        safe = solution.safe
+        if not safe and solution.probabilities:
+            # Выводы по общему количеству мин есть только в точных вероятностях
+            safe = [index for index, probability in solution.probabilities.items() if probability == 0.0]
+        if not safe:
+            return solution
+        for index in sorted(safe):
+            if states[index] == State.CLOSE:
+                solver.update(field.reveal(*field.get_coordinates(index)))
+
+
+def _find_target(field, solution, rnd, frontier=False):
+    """Выбрать закрытую ячейку вдали от открытой области, куда можно перенести мину.
+    Перенос мины в такую ячейку не меняет открытые числа
+    :param field: Field - поле
+    :param solution: Solution - решение текущей позиции
+    :param rnd: random.Random - генератор случайных чисел
+    :param frontier: bool - если ячеек вдали от открытой области нет, выбрать ячейку на границе
+    :return: int - индекс ячейки или None
+    """
+    values, states, offsets = field.values, field.states, field.neighbor_offsets
+    stride, width, height = field.stride, field.width, field.height
+
+    def is_candidate(index):
+        return states[index] == State.CLOSE and values[index] != -1 and index not in solution.safe \
+            and index not in solution.probabilities and all(states[index + offset] != State.OPEN for offset in offsets)
+
+    for _ in range(64):  # Пока закрытых ячеек много, быстрее угадать случайную
+        index = (rnd.randrange(height) + 1) * stride + rnd.randrange(width) + 1
+        if is_candidate(index):
+            return index
+    candidates = [index for index in field.get_cells_indexes() if is_candidate(index)]
+    if not candidates and frontier:
+        candidates = sorted(index for index in solution.probabilities if values[index] != -1)
+    return rnd.choice(candidates) if candidates else None
+
+
+def _repair(field, start, exclude, rnd, max_repairs):
+    """Решать поле от первого хода, а там, где решатель застревает, переносить мину
+    с границы открытой области в другое место, пока поле не решится до конца.
+    Решатель при этом не сбрасывается: известные ему мины и безопасные ячейки не трогаются,
+    а изменившиеся числа пересчитываются инкрементально.
+    Если закрытых ячеек вдали от открытой области не осталось, мина переносится в другую ячейку границы.
+    Если и это не помогает FRONTIER_REPAIRS раз подряд, мина переносится в уже открытую часть поля,
+    и поле с новой расстановкой решается заново
+    :param field: Field - черновое поле с заложенными минами
+    :param start: int - индекс ячейки первого хода
+    :param exclude: list of int - индексы ячеек, в которые мины не закладываются
+    :param rnd: random.Random - генератор случайных чисел
+    :param max_repairs: int - сколько раз можно переносить мины
+    :return: Field - черновое поле, которое решается без угадывания, или None
+    """
+    solver = Solver(field)
+    stalls = last_opened = 0  # Переносов подряд, после которых не открылось ни одной новой ячейки
+    for _ in range(max_repairs + 1):
+        solution = _solve_from(field, solver, start)
+        stats = field.stats()
+        if stats['opened'] == stats['cells'] - stats['bombs']:
+            return field
+        stalls = stalls + 1 if stats['opened'] == last_opened else 0
+        last_opened = stats['opened']
+        # Застряли: переносим одну из мин границы, о которых решатель не знает
+        values = field.values
+        sources = sorted(index for index in solution.probabilities if values[index] == -1)
+        if not sources:
+            return None  # Закрытая область отгорожена найденными минами
+        source = rnd.choice(sources)
+        target = _find_target(field, solution, rnd, frontier=stalls < FRONTIER_REPAIRS)
+        if target is not None:
+            field.move_bomb(source, target)
+            solver.update([source, target])
+            continue
+        states, excluded = field.states, set(exclude)
+        open_cells = [index for index in field.get_cells_indexes()
+                  if states[index] == State.OPEN and index not in excluded]
+        if not open_cells:
+            return None
+        bombs = field.get_bombs_indexes()
+        bombs.remove(source)
+        bombs.append(rnd.choice(open_cells))
+        field = Field(width=field.width, height=field.height)
+        field.plant_bombs(bombs)
+        solver = Solver(field)
+        stalls = last_opened = 0
+    return None
+
+
+def plant_no_guess_bombs(field, bombs, start, seed=None, generator=None, exclude=(), max_repairs=None,
+                         max_attempts=20):
+    """Заложить мины так, чтобы поле решалось от первого хода без угадывания.
+    Мины закладываются на черновом поле, которое решается решателем. Если решатель застревает,
+    поле не генерируется заново, а исправляется там, где застрял решатель (см. _repair).
+    Новая случайная расстановка нужна, только если исправить поле не удалось.
+    Если за max_attempts расстановок решаемое поле не получилось, остаётся последняя расстановка
+    :param field: Field - поле без мин
+    :param bombs: int - количество мин
+    :param start: int - индекс ячейки первого хода
+    :param seed: int - число для инициализации генератора случайных чисел
+    :param generator: int - версия генератора расстановки мин
+    :param exclude: iterable of int - индексы ячеек, в которые мины не закладываются
+    :param max_repairs: int - сколько раз можно переносить мины на одной расстановке, по умолчанию
+        по количеству мин
+    :param max_attempts: int - количество расстановок
+    :return: bool - True если поле решается без угадывания
+    """
+    exclude = list(exclude) or [start]
+    max_repairs = bombs if max_repairs is None else max_repairs
+    rnd = random.Random(seed)
+    attempt_seed = seed
+    for _ in range(max_attempts):
+        draft = Field(width=field.width, height=field.height)
+        draft.plant_random_bombs(bombs=bombs, seed=attempt_seed, generator=generator, exclude=exclude)
+        solved = _repair(draft, start, exclude, rnd, max_repairs)
+        if solved is not None:
+            draft = solved
+            break
+        attempt_seed = rnd.getrandbits(32)
+    field.plant_bombs(draft.get_bombs_indexes())
+    field.seed = seed
+    field.generator = GENERATOR_VERSION if generator is None else generator
+    return solved is not None
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""Сохранение и загрузка партий в компактном двоичном формате.
+
+Файл состоит из заголовка HEADER, поля в одной из раскладок и истории ходов (MOVE на ход):
+- Layout.PACKED - по 4 бита на значение и 2 бита на состояние ячейки без рамки (6 бит на ячейку).
+  Упаковка и распаковка выполняются операциями над байтами и длинными целыми, без цикла по ячейкам;
+- Layout.RAW - буферы поля как есть: значения и состояния вместе с рамкой по байту на ячейку.
+  Такой файл открывается через mmap, и поле работает прямо поверх страниц файла без копирования
+  (страницы открываются на копирование при записи, поэтому ходы не меняют сам файл).
+Формат версионный: загрузчик читает файлы своей и более ранних версий.
+"""
+import mmap
+import struct
+from array import array
+
+from entities import GENERATOR_VERSION, Field, GameEngine, State
+
+MAGIC = b'MSWP'
+VERSION = 1
+
+# Сигнатура, версия, раскладка, способ расстановки мин, версия генератора, флаги,
+# ширина, высота, количество мин, seed, количество ходов
+HEADER = struct.Struct('<4sBBBBB3xIIIqI')
+# Ход: вид хода (Move), координаты X и Y
+MOVE = struct.Struct('<BII')
+
+_HAS_SEED = 1  # Флаг заголовка: seed указан
+
+# Значение ячейки (-1..8) <-> 4 бита (0..9)
+_VALUE_TO_NIBBLE = bytes(0 if b == 0xFF else b + 1 if b < 9 else 0 for b in range(256))
+_NIBBLE_TO_VALUE = bytes(0xFF if b == 0 else b - 1 if b < 10 else 0 for b in range(256))
+# Выделение полубайтов и пар битов из упакованного байта
+_NIBBLE_TABLES = [bytes((b >> shift) & 0x0F for b in range(256)) for shift in (0, 4)]
+_PAIR_TABLES = [bytes((b >> shift) & 0x03 for b in range(256)) for shift in (0, 2, 4, 6)]
+
+
+class Layout(object):
+    """Класс раскладок поля в файле"""
+    RAW = 0
+    PACKED = 1
+
+
+def _get_rows(buffer, field):
+    """Вырезать из буфера поля ячейки без рамки
+    :param buffer: bytes - буфер поля вместе с рамкой
+    :param field: Field - поле
+    :return: bytes - ячейки по строкам
+    """
+    stride, width = field.stride, field.width
+    return b''.join(buffer[row:row + width] for row in range(stride + 1, stride * (field.height + 1), stride))
+
+
+def _put_rows(buffer, data, width, height):
+    """Разложить ячейки без рамки по строкам буфера поля
+    :param buffer: bytearray - буфер поля вместе с рамкой
+    :param data: bytes - ячейки по строкам
+    :param width: int - ширина поля
+    :param height: int - высота поля
+    """
+    stride = width + 2
+    for y in range(height):
+        row = (y + 1) * stride + 1
+        buffer[row:row + width] = data[y * width:(y + 1) * width]
+
+
+def _pack(data, bits):
+    """Упаковать байты со значениями меньше 2 ** bits по 8 / bits штук в байт
+    :param data: bytes - байты
+    :param bits: int - 2 или 4
+    :return: bytes
+    """
+    per_byte = 8 // bits
+    data += bytes(-len(data) % per_byte)
+    packed = 0
+    for n in range(per_byte):
+        # В каждом байте среза значение меньше 2 ** bits, после сдвига оно не выходит за свой байт
+        packed |= int.from_bytes(data[n::per_byte], 'little') << (n * bits)
+    return packed.to_bytes(len(data) // per_byte, 'little')
+
+
+def _unpack(data, bits, count):
+    """Распаковать байты, упакованные _pack
+    :param data: bytes - упакованные байты
+    :param bits: int - 2 или 4
+    :param count: int - количество значений
+    :return: bytes
+    """
+    tables = _NIBBLE_TABLES if bits == 4 else _PAIR_TABLES
+    result = bytearray(len(data) * len(tables))
+    for n, table in enumerate(tables):
+        result[n::len(tables)] = data.translate(table)
+    return bytes(result[:count])
+
+
+def _packed_size(cells):
+    """Размер поля в раскладке PACKED
+    :param cells: int - количество ячеек
+    :return: tuple - (размер значений, размер состояний) в байтах
+    """
+    return (cells + 1) // 2, (cells + 3) // 4
+
+
+def dumps(engine, layout=Layout.PACKED):
+    """Сохранить партию в байты
+    :param engine: GameEngine - партия
+    :param layout: int - раскладка поля (Layout)
+    :return: bytes
+    """
+    field, seed = engine.field, engine.seed
+    # Версия генератора по умолчанию запоминается, чтобы поле без мин после загрузки расставилось так же
+    generator = GENERATOR_VERSION if engine.generator is None else engine.generator
+    header = HEADER.pack(MAGIC, VERSION, layout, engine.start, generator, _HAS_SEED if seed is not None else 0,
+                         field.width, field.height, engine.bombs, seed or 0, len(engine.history))
+    values, states = field.values.tobytes(), bytes(field.states)
+    if layout == Layout.RAW:
+        body = [values, states]
+    elif layout == Layout.PACKED:
+        body = [_pack(_get_rows(values, field).translate(_VALUE_TO_NIBBLE), 4), _pack(_get_rows(states, field), 2)]
+    else:
+        raise ValueError("Неизвестная раскладка поля: %s" % layout)
+    body.extend(MOVE.pack(*move) for move in engine.history)
+    return header + b''.join(body)
+
+
+def loads(data):
+    """Загрузить партию из байтов.
+    Поле в раскладке RAW работает поверх переданного буфера без копирования, если буфер изменяемый
+    (bytearray, mmap), иначе буфер копируется
+    :param data: bytes-like - сохранённая партия
+    :return: GameEngine
+    """
+    view = memoryview(data)
+    if len(view) < HEADER.size:
+        raise ValueError("Файл слишком короткий")
+    magic, version, layout, start, generator, flags, width, height, bombs, seed, moves = HEADER.unpack_from(view)
+    if magic != MAGIC:
+        raise ValueError("Неизвестный формат файла")
+    if version > VERSION:
+        raise ValueError("Версия формата %s не поддерживается" % version)
+    offset = HEADER.size
+    size = (width + 2) * (height + 2)
+    cells = width * height
+    if layout == Layout.RAW:
+        field_size = 2 * size
+    elif layout == Layout.PACKED:
+        field_size = sum(_packed_size(cells))
+    else:
+        raise ValueError("Неизвестная раскладка поля: %s" % layout)
+    if len(view) - offset < field_size:
+        raise ValueError("Файл повреждён")
+    if layout == Layout.RAW:
+        if view.readonly:
+            view = memoryview(bytearray(view))
+        field = Field(width=width, height=height, values=view[offset:offset + size].cast('b'),
+                      states=view[offset + size:offset + 2 * size])
+        offset += 2 * size
+    else:
+        values_size, states_size = _packed_size(cells)
+        values = bytearray(size)
+        _put_rows(values, _unpack(view[offset:offset + values_size].tobytes(), 4, cells).translate(_NIBBLE_TO_VALUE),
+                  width, height)
+        offset += values_size
+        states = bytearray([State.BORDER]) * size
+        _put_rows(states, _unpack(view[offset:offset + states_size].tobytes(), 2, cells), width, height)
+        offset += states_size
+        field_values = array('b')
+        field_values.frombytes(bytes(values))
+        field = Field(width=width, height=height, values=field_values, states=states)
+    if len(view) < offset + moves * MOVE.size:
+        raise ValueError("Файл обрезан")
+    history = list(MOVE.iter_unpack(view[offset:offset + moves * MOVE.size]))
+    seed = seed if flags & _HAS_SEED else None
+    field.seed = seed
+    field.generator = generator
+    return GameEngine(width=width, height=height, bombs=bombs, seed=seed, generator=generator, start=start,
+                      field=field, history=history)
+
+
+def save(path, engine, layout=Layout.PACKED):
+    """Сохранить партию в файл
+    :param path: str - путь к файлу
+    :param engine: GameEngine - партия
+    :param layout: int - раскладка поля (Layout)
+    """
+    with open(path, 'wb') as f:
+        f.write(dumps(engine, layout))
+
+
+def load(path):
+    """Загрузить партию из файла. Файл в раскладке RAW отображается в память через mmap без копирования
+    :param path: str - путь к файлу
+    :return: GameEngine
+    """
+    with open(path, 'rb') as f:
+        header = f.read(HEADER.size)
+        if len(header) == HEADER.size and header[:4] == MAGIC and header[5] == Layout.RAW:
+            # Отображение живёт, пока на него ссылаются буферы поля, файл можно закрыть
+            return loads(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY))
+        return loads(header + f.read())
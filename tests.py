@@ -1,6 +1,28 @@
 # -*- coding: utf-8 -*-
+import asyncio
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+from itertools import combinations
 from unittest import TestCase, main as run_tests
-from entities import Field
+from entities import Colors, Field, GameEngine, Move, Start, State, Status
+from renderer import BaseRenderer, BitmapRenderer, Renderer, render_bitmap
+from replay import END_RECORD, RECORDS, MoveLog, iter_records, replay
+from simulate import STRATEGIES, play_game, run_games
+from solver import Solver, plant_no_guess_bombs
+import storage
+from benchmarks import compare, measure
+from chunks import CHUNK_SIZE, ChunkedField
+from console import play_infinite, render_text
+from instrumentation import Instrumentation
+import server
+
+if not hasattr(TestCase, 'assertItemsEqual'):  # В Python 3 метод переименован
+    TestCase.assertItemsEqual = TestCase.assertCountEqual
 
 
 def get_cells_coordinates(*cells):
@@ -35,6 +57,16 @@ class FieldTests(TestCase):
         self.assertEqual(x, cell.x)
         self.assertEqual(y, cell.y)
 
+    def test_cell_is_view_over_field_storage(self):
+        """Проверка, что ячейка читает и пишет данные прямо в буферы поля"""
+        field = Field(width=3, height=3)
+        field.get_cell(2, 1).plant_bomb()
+        field.get_cell(0, 2).set_flag()
+        self.assertTrue(field.get_cell(2, 1).has_bomb())
+        self.assertTrue(field.get_cell(0, 2).has_flag())
+        self.assertEqual(field.get_cell(1, 1), field.get_cell(1, 1))
+        self.assertEqual(9, len(field.get_copy_cells_list()))
+
     def test_get_adjacent_cells_from_center_cell(self):
         """Проверка получения всех ячеек вокруг ячейки из центра.
         Сама ячейка не должна входить в последовательность"""
@@ -62,6 +94,33 @@ class FieldTests(TestCase):
         cells_coordinates = get_cells_coordinates(*field.get_adjacent_cells(x, y))
         self.assertItemsEqual(expected_coordinates, cells_coordinates)
 
+    def test_get_adjacent_cells_on_wide_field(self):
+        """Проверка получения соседних ячеек на поле, ширина которого больше высоты"""
+        expected_coordinates = [(2, 0), (2, 1), (3, 1)]
+        x, y = 3, 0
+        field = Field(width=4, height=2)
+        cells_coordinates = get_cells_coordinates(*field.get_adjacent_cells(x, y))
+        self.assertItemsEqual(expected_coordinates, cells_coordinates)
+
+    def test_get_adjacent_cells_on_tall_field(self):
+        """Проверка получения соседних ячеек на поле, высота которого больше ширины"""
+        expected_coordinates = [(0, 2), (1, 2), (1, 3)]
+        x, y = 0, 3
+        field = Field(width=2, height=4)
+        cells_coordinates = get_cells_coordinates(*field.get_adjacent_cells(x, y))
+        self.assertItemsEqual(expected_coordinates, cells_coordinates)
+
+    def test_neighbor_offsets_are_shared_between_fields(self):
+        """Проверка, что таблица соседей строится один раз для размера поля"""
+        self.assertIs(Field(width=5, height=2).neighbor_offsets, Field(width=5, height=7).neighbor_offsets)
+
+    def test_cells_list_excludes_border(self):
+        """Проверка, что в список ячеек не попадает служебная рамка поля"""
+        field = Field(width=4, height=2)
+        cells_coordinates = get_cells_coordinates(*field.get_copy_cells_list())
+        self.assertEqual([(x, y) for y in range(2) for x in range(4)], cells_coordinates)
+        self.assertEqual(8, len(field.get_closed_cells()))
+
     def test_get_cell_with_bombs(self):
         """Проверка правильности получения ячеек с бомбами"""
         expected_coordinates = [(0, 1)]
@@ -80,7 +139,7 @@ class FieldTests(TestCase):
         ]
         expected_cells_with_bombs = [(1, 0)]
         field = Field(width=3, height=3)
-        field.plant_random_bombs(bombs=1, seed=1000)
+        field.plant_random_bombs(bombs=1, seed=1000, generator=1)
         cells_coordinates_and_values = get_cells_coordinates_and_values(*field.get_copy_cells_list())
         cells_with_bombs = get_cells_coordinates(*field.get_cells_with_bombs())
         self.assertItemsEqual(expected_cells_with_bombs, cells_with_bombs)
@@ -95,7 +154,7 @@ class FieldTests(TestCase):
         ]
         expected_cells_with_bombs = [(1, 0), (2, 2)]
         field = Field(width=3, height=3)
-        field.plant_random_bombs(bombs=2, seed=1000)
+        field.plant_random_bombs(bombs=2, seed=1000, generator=1)
         cells_coordinates_and_values = get_cells_coordinates_and_values(*field.get_copy_cells_list())
         cells_with_bombs = get_cells_coordinates(*field.get_cells_with_bombs())
         self.assertItemsEqual(expected_cells_with_bombs, cells_with_bombs)
@@ -110,12 +169,959 @@ class FieldTests(TestCase):
         ]
         expected_cells_with_bombs = [(1, 0), (0, 1), (1, 1), (1, 2), (2, 2)]
         field = Field(width=3, height=3)
-        field.plant_random_bombs(bombs=5, seed=1000)
+        field.plant_random_bombs(bombs=5, seed=1000, generator=1)
         cells_coordinates_and_values = get_cells_coordinates_and_values(*field.get_copy_cells_list())
         cells_with_bombs = get_cells_coordinates(*field.get_cells_with_bombs())
         self.assertItemsEqual(expected_cells_with_bombs, cells_with_bombs)
         self.assertItemsEqual(expected, cells_coordinates_and_values)
 
+    def test_plant_random_bombs_is_reproducible(self):
+        """Проверка, что для одного seed расстановка мин одинакова, а значения ячеек согласованы с минами"""
+        first, second = Field(width=30, height=16), Field(width=30, height=16)
+        first.plant_random_bombs(bombs=99, seed=42)
+        second.plant_random_bombs(bombs=99, seed=42)
+        bombs = get_cells_coordinates(*first.get_cells_with_bombs())
+        self.assertEqual(bombs, get_cells_coordinates(*second.get_cells_with_bombs()))
+        self.assertEqual(99, len(bombs))
+        for cell in first.get_copy_cells_list():
+            if not cell.has_bomb():
+                expected = len([c for c in first.get_adjacent_cells(cell.x, cell.y) if c.has_bomb()])
+                self.assertEqual(expected, cell.value)
+
+    def test_seed_without_random_bombs(self):
+        """Проверка, что у поля без случайной расстановки мин нет seed и версии генератора"""
+        field = Field(width=3, height=3)
+        self.assertIsNone(field.seed)
+        field.plant_bombs([field.get_index(1, 0)])
+        self.assertIsNone(field.seed)
+        self.assertIsNone(field.generator)
+        field.plant_random_bombs(bombs=1, seed=1000, generator=1)
+        self.assertEqual((1000, 1), (field.seed, field.generator))
+
+    def test_plant_random_bombs_maps_positions_past_excluded_cells(self):
+        """Проверка, что позиции мин, выбранные среди неисключённых ячеек, переносятся на те же ячейки,
+        что и при выборе из списка неисключённых ячеек
+        """
+        excluded = [0, 1, 5, 6, 7, 30, 31, 99]
+        field = Field(width=10, height=10)
+        field.plant_random_bombs(bombs=60, seed=3, exclude=[field.get_index(n % 10, n // 10) for n in excluded])
+        allowed = [n for n in range(100) if n not in excluded]
+        positions = random.Random(3).sample(range(len(allowed)), 60)
+        expected = [(allowed[p] % 10, allowed[p] // 10) for p in positions]
+        self.assertItemsEqual(expected, get_cells_coordinates(*field.get_cells_with_bombs()))
+
+    def test_str(self):
+        """Проверка текстового представления поля"""
+        field = Field(width=3, height=3)
+        field.plant_random_bombs(bombs=1, seed=1000, generator=1)
+        self.assertEqual('  012\n0 1x1\n1 111\n2 000\n', str(field))
+
+    def test_plant_random_bombs_skips_excluded_cells(self):
+        """Проверка, что в исключённые ячейки мины не закладываются, даже если свободных ячеек больше нет"""
+        field = Field(width=3, height=3)
+        center = field.get_index(1, 1)
+        field.plant_random_bombs(bombs=8, seed=1, exclude=[center])
+        self.assertEqual(8, field.stats()['bombs'])
+        self.assertEqual(8, field.get_cell(1, 1).value)
+
+    def test_move_bomb(self):
+        """Проверка переноса мины: значения соседей и счётчики пересчитываются"""
+        field = Field(width=3, height=3)
+        field.plant_random_bombs(bombs=1, seed=1000, generator=1)  # Мина в (1, 0)
+        field.move_bomb(field.get_index(1, 0), field.get_index(2, 2))
+        self.assertEqual([(2, 2)], get_cells_coordinates(*field.get_cells_with_bombs()))
+        self.assertEqual(0, field.get_cell(1, 0).value)
+        self.assertEqual(1, field.get_cell(1, 1).value)
+        self.assertEqual(0, field.get_cell(0, 0).value)
+        self.assertEqual(1, field.stats()['bombs'])
+
+    def test_reveal_opens_empty_area(self):
+        """Проверка открытия пустой области: заливка останавливается на ячейках с числами и флагах"""
+        field = Field(width=3, height=3)
+        field.plant_random_bombs(bombs=1, seed=1000, generator=1)  # Мина в (1, 0)
+        field.get_cell(0, 2).set_flag()
+        opened = [field.get_coordinates(index) for index in field.reveal(2, 2)]
+        self.assertItemsEqual([(0, 1), (1, 1), (2, 1), (1, 2), (2, 2)], opened)
+        self.assertTrue(field.get_cell(0, 2).has_flag())
+        self.assertEqual([], field.reveal(2, 2))
+
+    def test_reveal_large_area_without_recursion(self):
+        """Проверка открытия большой пустой области, которая не помещается в предел рекурсии"""
+        field = Field(width=300, height=200)
+        for y in range(200):
+            field.get_cell(150, y).set_flag()  # Стена из флагов делит поле пополам
+        opened = field.reveal(0, 0)
+        self.assertEqual(150 * 200, len(opened))
+        self.assertEqual(150 * 200, len(set(opened)))
+        self.assertFalse(field.get_cell(151, 0).state == State.OPEN)
+
+    def test_reveal_indexes_fills_from_several_cells(self):
+        """Проверка открытия нескольких ячеек одной заливкой: общая область открывается один раз"""
+        field = Field(width=5, height=1)
+        field.plant_bombs([field.get_index(2, 0)])
+        opened = field.reveal_indexes([field.get_index(0, 0), field.get_index(4, 0), field.get_index(0, 0)])
+        self.assertItemsEqual([(0, 0), (1, 0), (3, 0), (4, 0)], [field.get_coordinates(i) for i in opened])
+        self.assertEqual(4, field.stats()['opened'])
+        self.assertEqual(0, field.stats()['exploded'])
+
+    def test_stats_follow_cell_changes(self):
+        """Проверка, что счётчики поля обновляются при открытии ячеек и установке флагов"""
+        field = Field(width=3, height=3)
+        field.plant_random_bombs(bombs=2, seed=1000, generator=1)  # Мины в (1, 0) и (2, 2)
+        field.get_cell(1, 0).set_flag()
+        field.get_cell(0, 2).set_flag()
+        field.reveal(0, 0)
+        self.assertEqual({'cells': 9, 'bombs': 2, 'opened': 1, 'exploded': 0, 'closed': 8,
+                          'flags': 2, 'correct_flags': 1, 'wrong_flags': 1}, field.stats())
+        field.get_cell(0, 2).remove_flag()
+        self.assertEqual(0, field.stats()['wrong_flags'])
+        self.assertFalse(field.is_lose())
+        field.reveal(2, 2)
+        self.assertTrue(field.is_lose())
+
+    def test_is_win(self):
+        """Проверка победы: все закрытые ячейки помечены флагами и содержат мины"""
+        field = Field(width=3, height=3)
+        field.plant_random_bombs(bombs=2, seed=1000, generator=1)  # Мины в (1, 0) и (2, 2)
+        for cell in field.get_copy_cells_list():
+            if not cell.has_bomb():
+                field.reveal(cell.x, cell.y)
+        self.assertFalse(field.is_win())
+        field.get_cell(1, 0).set_flag()
+        field.get_cell(2, 2).set_flag()
+        self.assertTrue(field.is_win())
+        self.assertEqual(7, field.stats()['opened'])
+
+
+class GameEngineTests(TestCase):
+    """Тесткейсы правил игры без интерфейса.
+    Поле 3 на 3 с минами в (1, 0) и (2, 2):
+    | 1 | x | 1 |
+    | 1 | 2 | 2 |
+    | 0 | 1 | x |
+    """
+
+    def create_engine(self):
+        return GameEngine(width=3, height=3, bombs=2, seed=1000, generator=1)
+
+    def test_reveal_bomb_loses(self):
+        """Проверка, что открытие мины завершает игру поражением"""
+        engine = self.create_engine()
+        self.assertEqual(1, len(engine.reveal(0, 0)))
+        self.assertEqual(Status.PLAY, engine.status)
+        engine.reveal(1, 0)
+        self.assertEqual(Status.LOSE, engine.status)
+        self.assertEqual([], engine.reveal(2, 0))
+
+    def test_toggle_flag(self):
+        """Проверка установки и снятия флага, в открытую ячейку флаг не ставится"""
+        engine = self.create_engine()
+        engine.toggle_flag(1, 0)
+        self.assertTrue(engine.field.get_cell(1, 0).has_flag())
+        engine.toggle_flag(1, 0)
+        self.assertFalse(engine.field.get_cell(1, 0).has_flag())
+        engine.reveal(0, 0)
+        self.assertEqual([], engine.toggle_flag(0, 0))
+
+    def test_reveal_of_open_or_flagged_cell_is_not_recorded(self):
+        """Проверка, что открытие открытой ячейки или ячейки с флагом не считается ходом"""
+        engine = self.create_engine()
+        engine.reveal(0, 0)
+        engine.toggle_flag(1, 0)
+        self.assertEqual([], engine.reveal(0, 0))
+        self.assertEqual([], engine.reveal(1, 0))
+        self.assertEqual(2, engine.moves)
+        self.assertEqual([(Move.REVEAL, 0, 0), (Move.FLAG, 1, 0)], engine.history)
+
+    def test_chord_opens_neighbors_of_satisfied_number(self):
+        """Проверка аккорда: открываются соседи числа, у которого стоит нужное количество флагов"""
+        engine = self.create_engine()
+        engine.reveal(0, 0)
+        self.assertEqual([], engine.chord(0, 0))  # Флагов ещё нет
+        engine.toggle_flag(1, 0)
+        opened = [engine.field.get_coordinates(index) for index in engine.chord(0, 0)]
+        self.assertItemsEqual([(0, 1), (1, 1)], opened)
+        self.assertEqual(Status.PLAY, engine.status)
+
+    def test_chord_continues_fill_from_empty_neighbors(self):
+        """Проверка аккорда: пустые соседи сразу продолжают заливку, ход записывается один раз"""
+        field = Field(width=5, height=5)
+        field.plant_bombs([field.get_index(0, 0)])
+        engine = GameEngine(width=5, height=5, bombs=1, field=field)
+        engine.reveal(1, 1)
+        engine.toggle_flag(0, 0)
+        self.assertEqual(23, len(engine.chord(1, 1)))
+        self.assertEqual(Status.WIN, engine.status)
+        self.assertEqual([Move.REVEAL, Move.FLAG, Move.CHORD], [move for move, x, y in engine.history])
+
+    def test_chord_with_wrong_flag_loses(self):
+        """Проверка аккорда с флагом не на мине: открывается мина и игра проиграна"""
+        engine = self.create_engine()
+        engine.reveal(0, 0)
+        engine.toggle_flag(1, 1)
+        engine.chord(0, 0)
+        self.assertEqual(Status.LOSE, engine.status)
+        self.assertEqual(1, engine.field.stats()['exploded'])
+
+    def test_win(self):
+        """Проверка победы после открытия всех ячеек без мин и установки флагов на мины"""
+        engine = self.create_engine()
+        for x, y in [(0, 0), (2, 0), (0, 1), (1, 1), (2, 1), (0, 2), (1, 2)]:
+            engine.reveal(x, y)
+        engine.toggle_flag(1, 0)
+        engine.toggle_flag(2, 2)
+        self.assertEqual(Status.WIN, engine.status)
+
+    def test_safe_start_plants_bombs_after_first_reveal(self):
+        """Проверка безопасного старта: мины закладываются при первом ходе вокруг открытой ячейки"""
+        for seed in range(20):
+            engine = GameEngine(width=9, height=9, bombs=10, seed=seed, start=Start.SAFE)
+            self.assertEqual(0, engine.field.stats()['bombs'])
+            engine.reveal(0, 0)
+            self.assertEqual(10, engine.field.stats()['bombs'])
+            self.assertEqual(Status.PLAY, engine.status)
+            self.assertEqual(0, engine.field.get_cell(0, 0).value)
+
+    def test_no_guess_board_is_solved_by_solver(self):
+        """Проверка, что поле без угадывания решатель открывает целиком от первого хода"""
+        for seed in range(5):
+            engine = GameEngine(width=16, height=16, bombs=40, seed=seed, start=Start.NO_GUESS)
+            field = engine.field
+            solver = Solver(field)
+            solver.update(engine.reveal(8, 8))
+            while engine.status == Status.PLAY:
+                solution = solver.solve()
+                safe = solution.safe or [index for index, probability in solution.probabilities.items()
+                                         if probability == 0.0]
+                self.assertTrue(safe, "Решатель застрял на поле без угадывания")
+                for index in sorted(safe):
+                    solver.update(engine.reveal(*field.get_coordinates(index)))
+                if field.stats()['closed'] == field.stats()['bombs']:
+                    break
+            self.assertEqual(0, field.stats()['exploded'])
+
+    def test_no_guess_generation_is_reproducible(self):
+        """Проверка, что поле без угадывания с одним seed всегда одинаково"""
+        boards = []
+        for _ in range(2):
+            field = Field(width=30, height=16)
+            start = field.get_index(0, 0)
+            self.assertTrue(plant_no_guess_bombs(field, 99, start, seed=3))
+            boards.append(field.get_bombs_indexes())
+        self.assertEqual(boards[0], boards[1])
+
+    def test_simulation_is_reproducible(self):
+        """Проверка, что партия с одним seed всегда играется одинаково"""
+        strategy = STRATEGIES['simple']
+        self.assertEqual(play_game(7, 9, 9, 10, strategy), play_game(7, 9, 9, 10, strategy))
+
+    def test_simulation_does_not_depend_on_workers(self):
+        """Проверка, что результаты пакетного моделирования не зависят от количества процессов"""
+        single = sorted(run_games(100, 20, 9, 9, 10, 'simple', workers=1, chunk_size=3))
+        parallel = sorted(run_games(100, 20, 9, 9, 10, 'simple', workers=2, chunk_size=3))
+        self.assertEqual(single, parallel)
+        self.assertEqual(list(range(100, 120)), [result[0] for result in single])
+
+    def test_solver_strategy_when_random_cells_are_mines(self):
+        """Проверка, что стратегия solver делает ход, даже если все случайные ячейки - известные мины"""
+        class FirstCell(object):
+            """Генератор, который всегда выбирает первую ячейку"""
+            def randrange(self, stop):
+                return 0
+
+            def choice(self, sequence):
+                return sequence[0]
+
+        engine = GameEngine(width=8, height=8, bombs=10, seed=174, start=Start.SAFE)
+        engine.reveal(7, 7)
+        while not engine.is_over():
+            STRATEGIES['solver'](engine, FirstCell())
+
+
+class SolverTests(TestCase):
+    """Тесткейсы решателя.
+    Поле 3 на 3 с минами в (1, 0) и (2, 2):
+    | 1 | x | 1 |
+    | 1 | 2 | 2 |
+    | 0 | 1 | x |
+    """
+
+    def create_engine(self):
+        return GameEngine(width=3, height=3, bombs=2, seed=1000, generator=1)
+
+    def get_coordinates(self, field, indexes):
+        return [field.get_coordinates(index) for index in indexes]
+
+    def test_pair_deduction(self):
+        """Проверка вывода по паре чисел: двойка в (1, 1) и единицы вокруг неё делают (2, 0) безопасной"""
+        engine = self.create_engine()
+        solver = Solver(engine.field)
+        solver.update(engine.reveal(0, 2))
+        solution = solver.solve()
+        self.assertEqual([(2, 0)], self.get_coordinates(engine.field, solution.safe))
+        self.assertEqual(set(), solution.mines)
+        for x, y in [(0, 0), (1, 0), (2, 1), (2, 2)]:
+            self.assertAlmostEqual(0.5, solution.get_probability(engine.field.get_index(x, y)))
+
+    def test_incremental_update(self):
+        """Проверка, что после новых ходов решатель находит все мины и безопасные ячейки"""
+        engine = self.create_engine()
+        solver = Solver(engine.field)
+        solver.update(engine.reveal(0, 2))
+        solver.solve()
+        solver.update(engine.reveal(0, 0))
+        solver.update(engine.reveal(2, 0))
+        solution = solver.solve()
+        self.assertItemsEqual([(1, 0), (2, 2)], self.get_coordinates(engine.field, solution.mines))
+        self.assertEqual([(2, 1)], self.get_coordinates(engine.field, solution.safe))
+
+    def test_update_after_large_reveal_matches_new_solver(self):
+        """Проверка, что после хода, открывшего большую область (граница ищется по всему полю),
+        решатель приходит к тем же выводам, что и новый решатель
+        """
+        for seed in range(5):
+            engine = GameEngine(width=60, height=40, bombs=200, seed=seed, start=Start.SAFE)
+            field = engine.field
+            solver = Solver(field)
+            solver.solve()
+            changed = engine.reveal(30, 20)
+            self.assertGreater(len(changed) * Solver.RESCAN_RATIO, len(field.states))
+            solver.update(changed)
+            solution, expected = solver.solve(), Solver(field).solve()
+            self.assertEqual(expected.safe, solution.safe)
+            self.assertEqual(expected.mines, solution.mines)
+
+    def test_probabilities_match_enumeration(self):
+        """Проверка вероятностей мин перебором всех расстановок, согласных с открытыми числами"""
+        for seed in range(20):
+            engine = GameEngine(width=5, height=4, bombs=5, seed=seed)
+            field = engine.field
+            safe = [index for index in field.get_cells_indexes() if field.values[index] != -1]
+            solver = Solver(field)
+            solver.update(engine.reveal(*field.get_coordinates(safe[seed % len(safe)])))
+            solution = solver.solve()
+            opened = [index for index in field.get_cells_indexes() if field.states[index] == State.OPEN]
+            closed = [index for index in field.get_cells_indexes() if field.states[index] != State.OPEN]
+            counts, total = dict.fromkeys(closed, 0), 0
+            for mines in combinations(closed, field.stats()['bombs']):
+                mines = set(mines)
+                if all(len(mines.intersection(field.get_adjacent_indexes(index))) == field.values[index]
+                       for index in opened):
+                    total += 1
+                    for index in mines:
+                        counts[index] += 1
+            for index in closed:
+                self.assertAlmostEqual(counts[index] / float(total), solution.get_probability(index))
+
+
+class StorageTests(TestCase):
+    """Тесткейсы сохранения и загрузки партий"""
+
+    def create_engine(self):
+        engine = GameEngine(width=30, height=16, bombs=99, seed=5, start=Start.SAFE)
+        engine.reveal(3, 3)
+        engine.toggle_flag(0, 15)
+        return engine
+
+    def assertEnginesEqual(self, expected, actual):
+        self.assertEqual(expected.field.values.tobytes(), actual.field.values.tobytes())
+        self.assertEqual(bytes(expected.field.states), bytes(actual.field.states))
+        self.assertEqual(expected.field.stats(), actual.field.stats())
+        self.assertEqual(expected.history, actual.history)
+        self.assertEqual((expected.seed, expected.bombs, expected.start, expected.status),
+                         (actual.seed, actual.bombs, actual.start, actual.status))
+
+    def test_packed_round_trip(self):
+        """Проверка сохранения в упакованном виде: 6 бит на ячейку и одинаковая партия после загрузки"""
+        engine = self.create_engine()
+        data = storage.dumps(engine, storage.Layout.PACKED)
+        moves = len(engine.history) * storage.MOVE.size
+        self.assertEqual(storage.HEADER.size + 30 * 16 * 6 // 8 + moves, len(data))
+        self.assertEnginesEqual(engine, storage.loads(data))
+
+    def test_raw_file_is_mapped_without_copying(self):
+        """Проверка загрузки через mmap: поле работает поверх файла, а ходы не меняют сам файл"""
+        engine = self.create_engine()
+        handle, path = tempfile.mkstemp(suffix='.msw')
+        os.close(handle)
+        try:
+            storage.save(path, engine, storage.Layout.RAW)
+            loaded = storage.load(path)
+            self.assertEnginesEqual(engine, loaded)
+            self.assertIsInstance(loaded.field.values, memoryview)
+            loaded.reveal(29, 0)
+            engine.reveal(29, 0)
+            self.assertEnginesEqual(engine, loaded)
+            with open(path, 'rb') as f:
+                self.assertEqual(storage.dumps(self.create_engine(), storage.Layout.RAW), f.read())
+        finally:
+            os.remove(path)
+
+    def test_board_without_bombs_is_planted_after_load(self):
+        """Проверка, что партия, сохранённая до первого хода, после загрузки расставляет мины так же"""
+        engine = GameEngine(width=9, height=9, bombs=10, seed=3, start=Start.SAFE)
+        loaded = storage.loads(storage.dumps(engine))
+        engine.reveal(4, 4)
+        loaded.reveal(4, 4)
+        self.assertEnginesEqual(engine, loaded)
+
+    def test_unknown_format(self):
+        """Проверка, что чужие данные не загружаются"""
+        self.assertRaises(ValueError, storage.loads, b'not a saved game' * 4)
+
+    def test_truncated_file(self):
+        """Проверка, что обрезанный файл не загружается с ошибкой ValueError в любой раскладке"""
+        for layout in (storage.Layout.PACKED, storage.Layout.RAW):
+            data = storage.dumps(self.create_engine(), layout)
+            for size in (storage.HEADER.size + 1, len(data) - 1):
+                self.assertRaises(ValueError, storage.loads, data[:size])
+
+
+class ReplayTests(TestCase):
+    """Тесткейсы журнала ходов и воспроизведения"""
+
+    def record_games(self, seeds, start=Start.SAFE):
+        """Сыграть партии стратегией simple с записью в журнал
+        :return: tuple - (список сыгранных партий, байты журнала)
+        """
+        buffer = io.BytesIO()
+        log = MoveLog(buffer)
+        engines = []
+        for seed in seeds:
+            engine = GameEngine(width=9, height=9, bombs=10, seed=seed, start=start, log=log)
+            play_game_moves(engine, seed)
+            engines.append(engine)
+        log.close()
+        return engines, buffer.getvalue()
+
+    def test_replay_reproduces_games(self):
+        """Проверка, что воспроизведение журнала приводит к тем же полям и исходам"""
+        engines, data = self.record_games(range(10))
+        replayed = list(replay(iter_records(io.BytesIO(data))))
+        self.assertEqual(len(engines), len(replayed))
+        for engine, (replayed_engine, valid) in zip(engines, replayed):
+            self.assertTrue(valid)
+            self.assertEqual(engine.history, replayed_engine.history)
+            self.assertEqual(bytes(engine.field.states), bytes(replayed_engine.field.states))
+
+    def test_resumed_game_is_logged_with_previous_moves(self):
+        """Проверка, что партия, загруженная из файла и подключённая к журналу, воспроизводится
+        вместе с ходами, сделанными до сохранения
+        """
+        engine = GameEngine(width=9, height=9, bombs=10, seed=4, start=Start.SAFE)
+        engine.reveal(4, 4)
+        loaded = storage.loads(storage.dumps(engine))
+        buffer = io.BytesIO()
+        log = MoveLog(buffer)
+        loaded.set_log(log)
+        play_game_moves(loaded, 4)
+        log.close()
+        (replayed_engine, valid), = replay(iter_records(io.BytesIO(buffer.getvalue())))
+        self.assertTrue(valid)
+        self.assertEqual(loaded.history, replayed_engine.history)
+
+    def test_records_are_streamed_in_chunks(self):
+        """Проверка чтения журнала маленькими блоками: записи на границах блоков не теряются"""
+        _, data = self.record_games(range(3), start=Start.NO_GUESS)
+        expected = list(iter_records(io.BytesIO(data)))
+        self.assertEqual(expected, list(iter_records(io.BytesIO(data), chunk_size=7)))
+        self.assertEqual(3, len([record for record in expected if record[0] == END_RECORD]))
+
+    def test_unfinished_and_tampered_games(self):
+        """Проверка, что партия без записи конца не проверяется, а несовпадение исхода обнаруживается"""
+        buffer = io.BytesIO()
+        log = MoveLog(buffer)
+        engine = GameEngine(width=3, height=3, bombs=2, seed=1000, generator=1, log=log)
+        engine.reveal(0, 0)
+        log.append(RECORDS[END_RECORD].pack(END_RECORD, Status.WIN, 1))  # На самом деле партия не выиграна
+        GameEngine(width=3, height=3, bombs=2, seed=1000, generator=1, log=log).toggle_flag(1, 0)
+        results = list(replay(iter_records(io.BytesIO(buffer.getvalue()))))
+        self.assertEqual([False, None], [valid for _, valid in results])
+        self.assertEqual([(Move.FLAG, 1, 0)], results[1][0].history)
+
+    def test_simulation_log_does_not_depend_on_workers(self):
+        """Проверка, что журнал пакетного моделирования содержит все партии при любом количестве процессов"""
+        for workers in (1, 2):
+            buffer = io.BytesIO()
+            log = MoveLog(buffer)
+            results = list(run_games(50, 6, 9, 9, 10, 'simple', workers=workers, chunk_size=4, log=log))
+            replayed = list(replay(iter_records(io.BytesIO(buffer.getvalue()))))
+            self.assertEqual(sorted(result[0] for result in results), sorted(e.seed for e, _ in replayed))
+            self.assertTrue(all(valid for _, valid in replayed))
+
+
+class BenchmarkTests(TestCase):
+    """Тесткейсы замеров производительности"""
+
+    def test_measure_excludes_setup(self):
+        """Проверка, что подготовка получает seed замера и не входит в замер"""
+        seeds = []
+        result = measure(lambda n: seeds.append(n) or n, lambda n: None, repeat=3, seed=10)
+        self.assertEqual([10, 11, 12], seeds)
+        self.assertLessEqual(result['min'], result['mean'])
+        self.assertLessEqual(result['mean'], result['max'])
+
+    def test_compare_reports_only_regressions(self):
+        """Проверка сравнения с опорными результатами: отмечаются только замедления больше допустимого"""
+        baseline = {'a': {'min': 1.0}, 'b': {'min': 1.0}, 'c': {'min': 1.0}}
+        results = {'a': {'min': 1.2}, 'b': {'min': 1.5}, 'c': {'min': 0.5}, 'd': {'min': 9.0}}
+        self.assertEqual({'b': 1.5}, compare(results, baseline, tolerance=0.25))
+
+
+class ChunkedFieldTests(TestCase):
+    """Тесткейсы поля из кусков"""
+
+    def test_matches_field_across_chunks(self):
+        """Проверка, что значения и заливка через границы кусков совпадают с обычным полем,
+        а изменённые куски, вытесненные из кэша, загружаются с диска
+        """
+        width, height = CHUNK_SIZE * 2 + 20, CHUNK_SIZE + 30
+        with ChunkedField(seed=5, density=0.05, width=width, height=height, cache_size=4) as chunked:
+            states, values = chunked.view(0, 0, width, height)
+            field = Field(width=width, height=height)
+            field.plant_bombs([field.get_index(n % width, n // width) for n, value in enumerate(values) if value == 0xFF])
+            self.assertEqual([field.get_cell(x, y).value % 256 for y in range(height) for x in range(width)], list(values))
+            x, y = next((x, y) for y in range(height) for x in range(width) if field.get_cell(x, y).value == 0)
+            opened = chunked.reveal(x, y)
+            self.assertItemsEqual([field.get_coordinates(index) for index in field.reveal(x, y)], opened)
+            self.assertGreater(len({(x // CHUNK_SIZE, y // CHUNK_SIZE) for x, y in opened}), 2)
+            self.assertGreater(chunked.spilled_chunks, 0)
+            self.assertEqual(bytes(field.get_cell(x, y).state for y in range(height) for x in range(width)),
+                             chunked.view(0, 0, width, height)[0])
+            self.assertEqual(State.BORDER, chunked.get_state(-1, 0))
+
+    def test_infinite_field_is_reproducible(self):
+        """Проверка бесконечного поля: содержимое зависит только от seed, а не от порядка обращения к кускам"""
+        with ChunkedField(seed=7, safe=(0, 0)) as first, ChunkedField(seed=7, safe=(0, 0), cache_size=1) as second:
+            far = (-CHUNK_SIZE * 1000, CHUNK_SIZE * 3 + 5)
+            second.get_value(*far)
+            self.assertEqual(first.view(-5, -5, 5, 5), second.view(-5, -5, 5, 5))
+            self.assertEqual(first.get_value(*far), second.get_value(*far))
+            self.assertNotEqual(-1, first.get_value(0, 0))
+            self.assertTrue(first.reveal(0, 0))
+            self.assertFalse(first.is_lose())
+        self.assertRaises(ValueError, ChunkedField, seed=7, density=0.01)
+
+    def test_stats_count_opened_mines_separately(self):
+        """Проверка, что открытая мина считается в exploded, а не в opened, как у обычного поля"""
+        with ChunkedField(seed=7, safe=(0, 0)) as field:
+            opened = len(field.reveal(0, 0))
+            x, y = next((x, y) for y in range(-20, 20) for x in range(-20, 20)
+                        if field.get_value(x, y) == -1 and field.get_state(x, y) == State.CLOSE)
+            field.reveal(x, y)
+            self.assertTrue(field.is_lose())
+            self.assertEqual({'opened': opened, 'exploded': 1, 'flags': 0}, field.stats())
+
+
+class InstrumentationTests(TestCase):
+    """Тесткейсы замеров во время игры"""
+
+    def get_targets(self):
+        return [(GameEngine, 'reveal', 'start'), (Field, 'reveal_indexes', None), (BaseRenderer, 'flush', 'end')]
+
+    def test_disabled_instrumentation_leaves_original_methods(self):
+        """Проверка, что после выключения замеров методы классов снова исходные"""
+        originals = [vars(owner)[name] for owner, name, latency in self.get_targets()]
+        instrumentation = Instrumentation()
+        instrumentation.enable(self.get_targets())
+        self.assertIsNot(originals[0], GameEngine.reveal)
+        instrumentation.disable()
+        self.assertEqual(originals, [vars(owner)[name] for owner, name, latency in self.get_targets()])
+        self.assertNotIn('flush', vars(Renderer))
+
+    def test_move_latency_and_dump(self):
+        """Проверка задержки хода от открытия ячейки до перерисовки и записи замеров хода в файл"""
+        path = os.path.join(tempfile.mkdtemp(), 'profile.jsonl')
+        instrumentation = Instrumentation(dump_path=path)
+        instrumentation.enable(self.get_targets())
+        try:
+            canvas = RecordingCanvas()
+            renderer = Renderer(canvas, 40)
+            engine = GameEngine(width=9, height=9, bombs=0)
+            renderer.reset(engine.field)
+            renderer.mark_dirty(engine.reveal(0, 0))
+            canvas.idle_callbacks[0]()
+        finally:
+            instrumentation.disable()
+        self.assertEqual(1, instrumentation.moves)
+        self.assertEqual(81, instrumentation.last_cells)
+        self.assertGreater(instrumentation.last_latency, 0)
+        self.assertEqual(1, instrumentation.probes['Field.reveal_indexes'].calls)
+        with open(path) as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual(81, lines[0]['cells'])
+        self.assertEqual({'GameEngine.reveal', 'Field.reveal_indexes', 'BaseRenderer.flush'}, set(lines[0]['times']))
+        self.assertEqual(1, lines[-1]['moves'])
+
+    def test_move_without_changes_is_not_measured(self):
+        """Проверка, что ход, который ничего не изменил, не превращает следующую перерисовку в задержку хода"""
+        instrumentation = Instrumentation()
+        instrumentation.enable(self.get_targets())
+        try:
+            canvas = RecordingCanvas()
+            renderer = Renderer(canvas, 40)
+            engine = GameEngine(width=9, height=9, bombs=0)
+            renderer.reset(engine.field)
+            renderer.mark_dirty(engine.reveal(0, 0))
+            canvas.idle_callbacks[0]()
+            self.assertEqual([], engine.reveal(0, 0))
+            renderer.set_hints([engine.field.get_index(1, 1)])
+            canvas.idle_callbacks[-1]()
+        finally:
+            instrumentation.disable()
+        self.assertEqual(1, instrumentation.moves)
+
+    def test_replayed_moves_are_measured(self):
+        """Проверка, что ходы воспроизведения журнала проходят через подменённые замерами методы"""
+        buffer = io.BytesIO()
+        log = MoveLog(buffer)
+        engine = GameEngine(width=9, height=9, bombs=10, seed=4, start=Start.SAFE, log=log)
+        engine.reveal(4, 4)
+        engine.reveal(0, 0)
+        log.close()
+        instrumentation = Instrumentation()
+        instrumentation.enable([(GameEngine, 'reveal', None)])
+        try:
+            list(replay(iter_records(io.BytesIO(buffer.getvalue()))))
+        finally:
+            instrumentation.disable()
+        self.assertEqual(2, instrumentation.probes['GameEngine.reveal'].calls)
+
+
+class ServerTests(TestCase):
+    """Тесткейсы сервера общей партии"""
+
+    def test_delta_round_trip_hides_closed_values(self):
+        """Проверка, что изменения и снимок передают состояния ячеек, но не значения закрытых ячеек"""
+        engine = GameEngine(width=40, height=40, bombs=300, seed=3, start=Start.SAFE)
+        changed = engine.reveal(20, 20) + engine.toggle_flag(0, 0)
+        status, cells = server.decode_delta(server.encode_delta(engine.field, engine.status, changed))
+        cells = list(cells)
+        self.assertEqual(engine.status, status)
+        self.assertItemsEqual(changed, [index for index, state, value in cells])
+        for index, state, value in cells:
+            self.assertEqual(engine.field.states[index], state)
+            self.assertEqual(engine.field.values[index] if state == State.OPEN else 0, value)
+        field, bombs, status, moves = server.decode_snapshot(server.encode_snapshot(engine))
+        self.assertEqual((300, engine.status, engine.moves), (bombs, status, moves))
+        self.assertEqual(bytes(engine.field.states), bytes(field.states))
+        self.assertNotIn(-1, field.values)
+
+    def test_delta_columns_update_copy_with_counters(self):
+        """Проверка, что изменения по столбцам переносят ячейки на копию поля, а её счётчики совпадают
+        с пересчётом по буферам
+        """
+        engine = GameEngine(width=40, height=40, bombs=300, seed=3, start=Start.SAFE)
+        engine.reveal(20, 20)
+        copy = server.decode_snapshot(server.encode_snapshot(engine))[0]
+        bomb = engine.field.get_bombs_indexes()[0]
+        changed = engine.toggle_flag(0, 0) + engine.toggle_flag(*engine.field.get_coordinates(bomb))
+        changed += engine.reveal(*engine.field.get_coordinates(engine.field.get_bombs_indexes()[1]))
+        status, indexes, states, values = server.decode_delta_columns(
+            server.encode_delta(engine.field, engine.status, set(changed)))
+        self.assertEqual(Status.LOSE, status)
+        copy.set_cells(indexes, states, values)
+        self.assertEqual(bytes(engine.field.states), bytes(copy.states))
+        recounted = Field(width=copy.width, height=copy.height, values=copy.values, states=copy.states)
+        self.assertEqual(recounted.stats(), copy.stats())
+        # Мина под флагом копии не видна, а открытая мина видна
+        self.assertEqual((1, 0, 2), (copy.stats()['exploded'], copy.stats()['correct_flags'], copy.stats()['flags']))
+
+    def test_moves_of_one_tick_are_sent_in_one_message(self):
+        """Проверка, что ходы одного такта рассылаются одним сообщением, а рассылка при подключении клиента
+        отменяет отложенную
+        """
+        class RecordingWriter(object):
+            def __init__(self):
+                self.frames = []
+                self.transport = self
+
+            def get_write_buffer_size(self):
+                return 0
+
+            def write(self, frame):
+                self.frames.append(frame)
+
+        async def play():
+            engine = GameEngine(width=9, height=9, bombs=10, seed=1, start=Start.SAFE)
+            game_server = server.GameServer(engine, tick=0.01)
+            writer = RecordingWriter()
+            game_server.clients.add(writer)
+            game_server.apply_moves(server.MOVE_RECORD.pack(Move.FLAG, 0, 0))
+            scheduled = game_server._broadcast_scheduled
+            game_server.apply_moves(server.MOVE_RECORD.pack(Move.FLAG, 8, 8))
+            self.assertIs(scheduled, game_server._broadcast_scheduled)
+            await asyncio.sleep(0.05)
+            self.assertEqual(1, len(writer.frames))
+            self.assertEqual(2, server.DELTA_HEADER.unpack_from(writer.frames[0], server.FRAME.size)[2])
+            game_server.apply_moves(server.MOVE_RECORD.pack(Move.FLAG, 0, 0))
+            scheduled = game_server._broadcast_scheduled
+            game_server.broadcast()
+            self.assertTrue(scheduled.cancelled())
+            self.assertEqual(2, len(writer.frames))
+
+        asyncio.run(play())
+
+    def test_close_cancels_scheduled_broadcast(self):
+        """Проверка, что после остановки сервера отложенная рассылка не выполняется"""
+        async def play():
+            engine = GameEngine(width=9, height=9, bombs=10, seed=1, start=Start.SAFE)
+            game_server = server.GameServer(engine, tick=10)
+            await game_server.start()
+            game_server.apply_moves(server.MOVE_RECORD.pack(Move.FLAG, 0, 0))
+            scheduled = game_server._broadcast_scheduled
+            await game_server.close()
+            self.assertTrue(scheduled.cancelled())
+            self.assertIsNone(game_server._broadcast_scheduled)
+
+        asyncio.run(play())
+
+    def test_spectator_follows_player(self):
+        """Проверка, что зритель видит ходы игрока, а ходы зрителя не принимаются"""
+        async def play():
+            engine = GameEngine(width=30, height=16, bombs=99, seed=5, start=Start.SAFE)
+            game_server = server.GameServer(engine, tick=0.001)
+            port = await game_server.start()
+            player = await server.Client.connect('127.0.0.1', port)
+            spectator = await server.Client.connect('127.0.0.1', port, server.Role.SPECTATOR)
+            player.send_moves([(Move.REVEAL, 15, 8), (Move.FLAG, 0, 0)])
+            changed = []
+            while len(changed) < 2:
+                changed += await spectator.receive()
+            spectator.send_moves([(Move.REVEAL, 29, 15)])
+            self.assertIsNone(await spectator.receive())
+            await game_server.close()
+            return engine, spectator
+
+        engine, spectator = asyncio.run(play())
+        self.assertEqual(bytes(engine.field.states), bytes(spectator.field.states))
+        self.assertEqual(State.FLAG, spectator.field.get_cell(0, 0).state)
+        self.assertEqual(engine.field.get_cell(15, 8).value, spectator.field.get_cell(15, 8).value)
+        self.assertNotIn(-1, spectator.field.values)
+
+
+class ConsoleTests(TestCase):
+    """Тесткейсы игры в терминале"""
+
+    def test_render_text(self):
+        """Проверка вывода поля текстом: закрытые ячейки, флаги, цифры и мины после проигрыша"""
+        field = Field(width=3, height=2)
+        field.plant_bombs([field.get_index(2, 0)])
+        field.reveal(0, 1)
+        field.get_cell(2, 1).set_flag()
+        self.assertEqual('   0 .1#\n   1 .1F\n', render_text(field))
+        self.assertEqual('   0 .1*\n   1 .1F\n', render_text(field, bombs_visible=True))
+
+    def test_infinite_game(self):
+        """Проверка игры на бесконечном поле: ходы с отрицательными координатами, вывод части поля вокруг хода"""
+        stdout = io.StringIO()
+        opened = play_infinite(seed=2, stdin=io.StringIO('o 0 0\nf -3 2\nq\n'), stdout=stdout)
+        self.assertEqual(12, opened)
+        output = stdout.getvalue()
+        self.assertIn('X от -33 до 26', output)
+        self.assertIn('   0 #############################2.2####', output)
+        self.assertTrue(output.endswith("Открыто ячеек: 12\n"))
+
+    def test_console_game_does_not_import_tk(self):
+        """Проверка, что игра в терминале запускается без импорта Tk"""
+        code = "import sys, minesweeper; minesweeper.main(sys.argv[1:]); print('tkinter' in sys.modules)"
+        process = subprocess.run([sys.executable, '-c', code, '--console', '--seed', '1'],
+                                 cwd=os.path.dirname(os.path.abspath(__file__)), input='o 4 4\nq\n',
+                                 stdout=subprocess.PIPE, universal_newlines=True)
+        lines = process.stdout.splitlines()
+        self.assertEqual(0, process.returncode)
+        self.assertEqual('False', lines[-1])
+        self.assertEqual(19, len(lines))
+        self.assertIn('.', lines[9])
+
+
+def play_game_moves(engine, seed):
+    """Доиграть партию стратегией simple
+    :param engine: GameEngine - партия
+    :param seed: int - seed случайных ходов стратегии
+    """
+    rnd = random.Random(seed)
+    while not engine.is_over():
+        STRATEGIES['simple'](engine, rnd)
+
+
+class RecordingCanvas(object):
+    """Холст, который не рисует, а запоминает созданные элементы и их параметры.
+    Окно холста имеет размер width x height и сдвинуто на left, top относительно начала поля
+    """
+
+    def __init__(self, width=400, height=400):
+        self.width, self.height = width, height
+        self.left = self.top = 0
+        self.scrollregion = (0, 0, 0, 0)
+        self.items = {}
+        self.idle_callbacks = []
+
+    def _create(self, kind, *coordinates, **options):
+        item = len(self.items) + 1
+        self.items[item] = dict(options, kind=kind, coordinates=coordinates)
+        return item
+
+    def __getattr__(self, name):
+        if name.startswith('create_'):
+            return lambda *args, **kwargs: self._create(name[len('create_'):], *args, **kwargs)
+        raise AttributeError(name)
+
+    def delete(self, tag):
+        self.items = {}
+
+    def coords(self, item, *coordinates):
+        self.items[item]['coordinates'] = coordinates
+
+    def itemconfig(self, item, **options):
+        self.items[item].update(options)
+
+    def config(self, scrollregion):
+        self.scrollregion = scrollregion
+
+    def canvasx(self, x):
+        return self.left + x
+
+    def canvasy(self, y):
+        return self.top + y
+
+    def winfo_width(self):
+        return self.width
+
+    def winfo_height(self):
+        return self.height
+
+    def xview_moveto(self, fraction):
+        self.left = max(0, min(fraction * self.scrollregion[2], self.scrollregion[2] - self.width))
+
+    def yview_moveto(self, fraction):
+        self.top = max(0, min(fraction * self.scrollregion[3], self.scrollregion[3] - self.height))
+
+    def after_idle(self, callback):
+        self.idle_callbacks.append(callback)
+        return len(self.idle_callbacks)
+
+    def after_cancel(self, callback_id):
+        pass
+
+    def visible_items(self, kind):
+        return [item for item in self.items.values() if item['kind'] == kind and item.get('state') != 'hidden']
+
+
+class RecordingImage(object):
+    """Изображение, которое запоминает, сколько раз и какими данными его перерисовывали"""
+
+    def __init__(self, master=None):
+        self.blits = []
+
+    def configure(self, **options):
+        self.blits.append(options)
+
+
+def get_pixel(data, width, x, y):
+    """Цвет пикселя картинки PPM в виде '#rrggbb'"""
+    header_size = data.index(b'\n') + 1
+    offset = header_size + (y * width + x) * 3
+    return '#' + ''.join('%02x' % b for b in data[offset:offset + 3])
+
+
+class RendererTests(TestCase):
+    """Тесткейсы отрисовщика поля"""
+
+    def test_changes_are_flushed_once_without_new_items(self):
+        """Проверка, что изменения ячеек копятся и применяются одним проходом к существующим элементам"""
+        canvas = RecordingCanvas()
+        renderer = Renderer(canvas, 40)
+        field = Field(width=3, height=3)
+        field.plant_random_bombs(bombs=1, seed=1000, generator=1)  # Мина в (1, 0)
+        renderer.reset(field)
+        items_count = len(canvas.items)
+        renderer.mark_dirty(field.reveal(0, 2))
+        renderer.mark_dirty(field.reveal(2, 0))
+        self.assertEqual(1, len(canvas.idle_callbacks))
+        canvas.idle_callbacks[0]()
+        self.assertEqual(items_count, len(canvas.items))
+        texts = sorted(item['text'] for item in canvas.visible_items('text'))
+        self.assertEqual(['', '', '', '', '', '1', '1', '1', '1'], texts)
+
+    def test_only_visible_cells_have_items(self):
+        """Проверка, что элементы есть только у видимых ячеек и переиспользуются при прокрутке"""
+        canvas = RecordingCanvas(width=400, height=400)
+        renderer = Renderer(canvas, 40)
+        field = Field(width=1000, height=1000)
+        field.get_cell(505, 505).set_flag()
+        renderer.reset(field)
+        self.assertEqual(11 * 11, len(canvas.visible_items('rectangle')) - 1)  # Без фона поля
+        items_count = len(canvas.items)
+        canvas.xview_moveto(0.5)
+        canvas.yview_moveto(0.5)
+        renderer.update_viewport()
+        self.assertEqual(items_count + 2, len(canvas.items))  # Добавились только элементы флага
+        self.assertEqual(1, len(canvas.visible_items('polygon')))
+        self.assertEqual((505, 505), renderer.cell_at(200, 200))
+
+    def test_zoom_keeps_point_under_cursor(self):
+        """Проверка, что при изменении масштаба ячейка под указателем остаётся под ним"""
+        canvas = RecordingCanvas(width=400, height=400)
+        renderer = Renderer(canvas, 40)
+        renderer.reset(Field(width=100, height=100))
+        canvas.xview_moveto(0.5)
+        canvas.yview_moveto(0.5)
+        renderer.update_viewport()
+        self.assertEqual((55, 55), renderer.cell_at(200, 200))
+        renderer.set_cell_size(20, 200, 200)
+        self.assertEqual((55, 55), renderer.cell_at(200, 200))
+        self.assertEqual(21 * 21, len(canvas.visible_items('rectangle')) - 1)
+
+    def test_reset_reuses_items_of_previous_field(self):
+        """Проверка, что новое поле того же размера не создаёт новых элементов холста"""
+        canvas = RecordingCanvas()
+        renderer = Renderer(canvas, 40)
+        field = Field(width=5, height=5)
+        field.get_cell(1, 1).set_flag()
+        renderer.reset(field)
+        items_count = len(canvas.items)
+        renderer.reset(Field(width=5, height=5), 20)
+        self.assertEqual(items_count, len(canvas.items))
+        self.assertEqual(0, len(canvas.visible_items('polygon')))
+        self.assertEqual(25, len(canvas.visible_items('rectangle')) - 1)
+
+    def test_render_bitmap(self):
+        """Проверка картинки поля: цвет ячейки по состоянию и значению, сетка между ячейками"""
+        field = Field(width=3, height=2)
+        field.plant_bombs([field.get_index(1, 0)])
+        field.reveal(0, 1)
+        field.get_cell(2, 0).set_flag()
+        data = render_bitmap(field, (0, 0, 3, 2), 1, hints=[field.get_index(2, 1)])
+        self.assertTrue(data.startswith(b'P6 3 2 255\n'))
+        self.assertEqual([Colors.CLOSED_CELL, Colors.CLOSED_CELL, Colors.FLAG_POLYGON,
+                          Colors.NUMBERS[1], Colors.CLOSED_CELL, Colors.HINT],
+                         [get_pixel(data, 3, x, y) for y in range(2) for x in range(3)])
+        data = render_bitmap(field, (1, 0, 3, 2), 4, bombs_visible=True)
+        self.assertTrue(data.startswith(b'P6 8 8 255\n'))
+        self.assertEqual(Colors.FLAG_LINE, get_pixel(data, 8, 4, 2))  # Сетка
+        self.assertEqual(Colors.BOMB, get_pixel(data, 8, 2, 2))
+
+    def test_bitmap_renderer_blits_visible_area_once(self):
+        """Проверка, что картинка одна, покрывает видимую область и перерисовывается один раз за пакет"""
+        canvas = RecordingCanvas(width=400, height=400)
+        renderer = BitmapRenderer(canvas, 2)
+        renderer.image_factory = RecordingImage
+        field = Field(width=1000, height=1000)
+        renderer.reset(field)
+        self.assertEqual(1, len(canvas.items))
+        image = renderer.image
+        self.assertEqual(1, len(image.blits))
+        self.assertEqual((201 * 2, 201 * 2), (image.blits[0]['width'], image.blits[0]['height']))
+        renderer.mark_dirty(field.reveal(0, 0))
+        renderer.set_hints([field.get_index(5, 5)])
+        canvas.idle_callbacks[0]()
+        self.assertEqual(2, len(image.blits))
+        renderer.mark_dirty([field.get_index(900, 900)])  # Ячейка вне видимой области
+        canvas.idle_callbacks[1]()
+        self.assertEqual(2, len(image.blits))
+        self.assertEqual((100, 100), renderer.cell_at(200, 200))
+
 
 if __name__ == '__main__':
     run_tests()